@@ -1,19 +1,17 @@
 import pandas as pd
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.exclusions import EXCLUSION_RULES, SCREENING_MISSING_RULE, apply_exclusions
 
 #%% Step 1: Load the CSV file into a DataFrame
 # Replace 'data_031224_day/CH_Aviation_Justice_031224_0830.csv' with the correct path to your CSV file
 df_test = pd.read_csv('data_031224_day/CH_Aviation_Justice_031224_0830.csv', skiprows=[1, 2])
 
 #%% Step 2: Filter data
-df_test = df_test[(df_test['DistributionChannel'] != 'preview') & (df_test['Finished'] != False)]
-df_test = df_test[(df_test['screened_out'] != "true")]
-df_test = df_test[(df_test['screened_out'] != "true_trap1")]
-df_test = df_test[(df_test['screened_out'] != "true_trap2")]
-df_test = df_test[(df_test['screened_out'] != "true_trap3")]
-df_test = df_test[(df_test['Q_TerminateFlag'] != "QuotaMet")]
-df_test = df_test[(df_test['Q_TerminateFlag'] != "Screened")]
-df_test = df_test[(df_test['screened_out'] != "true_region")]
-df_test = df_test[(df_test['screened_out'].notna())]
+# also drops responses that have not reached the screening questions yet
+df_test, exclusion_counts = apply_exclusions(df_test, "CH", EXCLUSION_RULES + [SCREENING_MISSING_RULE])
 
 #%% Step 3: Count rows where the column 'flying_plan' is equal to 'no'
 flying_plan_no_count = df_test[df_test['flying_plan'] == 'no'].shape[0]
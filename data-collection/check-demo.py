@@ -1,27 +1,11 @@
 import pandas as pd
+import sys
+import os
 from datetime import datetime
 
-# %% define target proportions
-
-quotas = {
-    "Demographic Variable": [
-        "gender", "gender", 
-        "age", "age", "age", "age", "age", "age", 
-        "flying_plan", 
-        "ch_region", "ch_region", "ch_region", "ch_region"
-    ],
-    "Category": [
-        "male", "female", 
-        "18y_24y", "25y_34y", "35y_44y", "45y_54y", "55y_64y", "65y_above", 
-        "no", 
-        "german", "french", "italian", "romansch"
-    ],
-    "US quota": [0.49, 0.51, 0.12, 0.18, 0.18, 0.16, 0.17, 0.19, 0.2, None, None, None, None],
-    "CH quota": [0.5, 0.5, 0.09, 0.18, 0.19, 0.18, 0.18, 0.18, 0.2, 0.73, 0.27, None, None],
-    "CN quota": [0.51, 0.49, 0.12, 0.2, 0.18, 0.16, 0.34, None, 0.3, None, None, None, None]
-}
-
-df_quotas = pd.DataFrame(quotas)
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.cube import CUBE_FILE, DemographicCube
+from functions.quotas import country_variables, load_state, quota_table, save_state, update_counts
 
 # %% import data
 
@@ -33,83 +17,39 @@ files = {
     "CN": "data/Aviation_Justice_CN_111224_1532.csv"
 }
 
-dataframes = {}
-
-for country, file_name in files.items():
-    # read the file, skipping the first two rows
-    df = pd.read_csv(file_name, skiprows=[1, 2])
-    
-    # store the processed dataframe in the dictionary
-    dataframes[country] = df
-
-# %% filter data
-
-for country, df in dataframes.items():
-    # filter out rows where DistributionChannel is 'preview' or screened_out is True
-    df = df[(df['DistributionChannel'] != 'preview') & (df['Finished'] != False)]
-    df = df[(df['screened_out'] != "true")]
-    df = df[(df['screened_out'] != "true_trap1")]
-    df = df[(df['screened_out'] != "true_trap2")]
-    df = df[(df['screened_out'] != "true_trap3")]
-    df = df[(df['Q_TerminateFlag'] != "QuotaMet")]
-    df = df[(df['Q_TerminateFlag'] != "Screened")]
-
-    if country == "CH":
-        df = df[(df['screened_out'] != "true_region")]
-    
-    # update the dataframe in the dictionary
-    dataframes[country] = df
-
-# %% check data 
-
-us_df = dataframes["US"]
-ch_df = dataframes["CH"]
-cn_df = dataframes["CN"]
+# once the exports are preprocessed, the quotas are checked on the clean,
+# deduplicated respondents by summing the cells of data/demographic_cube.csv,
+# without reading any responses. While the cube is missing or older than an
+# export, the exports are counted instead
+use_cube = True
+
+# running counts per country, variable and category; each run reads only the
+# rows appended to the exports since the previous one. Set incremental to
+# False to recount the full exports
+state_file = "data/quota_state.json"
+incremental = True
+
+cube_current = os.path.exists(CUBE_FILE) and all(
+    os.path.getmtime(CUBE_FILE) >= os.path.getmtime(file_name) for file_name in files.values()
+)
+
+# %% update counts
+
+if use_cube and cube_current:
+    state = DemographicCube.load(CUBE_FILE).quota_state()
+else:
+    state = load_state(state_file) if incremental else {}
+    for country, file_name in files.items():
+        # previews, incompletes, screened out, failed traps, and (for CH)
+        # out-of-region respondents are not counted
+        state[country] = update_counts(file_name, country, state.get(country), country_variables(country))
+    save_state(state_file, state)
 
 # %% compare demographics
 
-def calculate_proportions(df, demographic_var):
-    """Calculate proportions for each quota variable."""
-    proportions = {}
-    for category in df_quotas[df_quotas["Demographic Variable"] == demographic_var]["Category"]:
-        # calculate proportion for each category, defaulting to 0 if not present
-        proportions[category] = round(df[demographic_var].value_counts(normalize=True).get(category, 0), 2)
-    return proportions
-
-for country, df in dataframes.items():
-    # calculate proportions for each demographic variable
-    gender_data = calculate_proportions(df, "gender")
-    age_data = calculate_proportions(df, "age")
-    region_data = (
-        calculate_proportions(df, "ch_region") if country == "CH" else {}
-    )
-    flying_data = calculate_proportions(df, "plan")
-
-    # for China (CN), after calculating, aggregate 55y_64y and 65y_above
-    if country == "CN":
-        # sum the proportions for 55y_64y and 65y_above
-        combined_data["55y_64y"] = round(
-            combined_data.get("55y_64y", 0) + combined_data.get("65y_above", 0), 2
-        )
-        # set the 65y_above category to None
-        combined_data["65y_above"] = None
-
-    # combine all proportions into one dictionary
-    combined_data = {**gender_data, **age_data, **region_data, **flying_data}
-
-    # map the proportions to the 'Category' column in df_quotas
-    df_quotas[f"{country} data"] = df_quotas["Category"].map(combined_data)
-
-#%% add sample size
-sample_size_row = {
-"Demographic Variable": "sample_size",
-"Category": "sample_size",
-"US data": len(us_df),
-"CH data": len(ch_df),
-"CN data": len(cn_df)
-}
-
-df_quotas = pd.concat([df_quotas, pd.DataFrame([sample_size_row])], ignore_index=True)
+# target proportions next to the observed ones and the sample sizes; for
+# China (CN), 55y_64y and 65y_above are reported together
+df_quotas = quota_table({country: state[country] for country in files})
 
 # %% save quota check to file
 today_date = datetime.today().strftime('%d%m%y')
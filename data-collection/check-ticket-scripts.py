@@ -0,0 +1,51 @@
+import pandas as pd
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.surcharges import COUNTRY_CURRENCIES, LOOKUP_KEYS
+from functions.ticket_scripts import QUALTRICS_DIR, input_space, script_path, verify_ticket_script
+
+# runs the ticket scripts under node over every combination of the embedded
+# data they read, and compares the price, surcharge and total they show with
+# the add_cost lookup preprocessing uses; exits with 1 on any difference. By
+# default the scripts generated by data-collection/wtp-tickets.py --scripts
+# are checked; --fielded checks the scripts used in the survey against what
+# preprocessing assumes they showed (functions.surcharges.no_surcharge_shown
+# and TEXT_LIMIT_COUNTRIES). Run from the repo root
+#
+#   python data-collection/check-ticket-scripts.py
+#   python data-collection/check-ticket-scripts.py --fielded
+#   python data-collection/check-ticket-scripts.py --countries ch --out data/ticket_mismatches.csv
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the Qualtrics ticket scripts against the add_cost lookup.")
+    parser.add_argument("--lookup", default="data/add_cost_lookup.csv", help="written by data-collection/wtp-tickets.py")
+    parser.add_argument("--dir", default=QUALTRICS_DIR, help="folder of the wtp_ticket_lookup_<country>.js scripts")
+    parser.add_argument("--fielded", action="store_true", help="check the scripts used in the survey instead")
+    parser.add_argument("--countries", nargs="+", default=list(COUNTRY_CURRENCIES))
+    parser.add_argument("--node", default="node")
+    parser.add_argument("--out", help="also write the mismatching cases to this csv")
+    args = parser.parse_args(argv)
+
+    lookup = pd.read_csv(args.lookup, index_col=LOOKUP_KEYS)
+
+    mismatches = []
+    for country in args.countries:
+        path = script_path(country, args.dir, args.fielded)
+        country_mismatches = verify_ticket_script(path, country, lookup, args.node, args.fielded)
+        print(f"{country}: {len(input_space(country))} cases, {len(country_mismatches)} mismatches ({path})")
+        if len(country_mismatches):
+            print(country_mismatches.head(10).to_string(index=False))
+        mismatches.append(country_mismatches.assign(country=country))
+
+    mismatches = pd.concat(mismatches, ignore_index=True)
+    if args.out:
+        mismatches.to_csv(args.out, index=False)
+    return 1 if len(mismatches) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+// template of wtp_ticket_lookup_<country>.js: data-collection/wtp-tickets.py
+// --scripts replaces __TICKET_TABLE__ with the country's lookup table, edit
+// this file and rerun it rather than editing the generated scripts. The
+// scripts used in the fielded survey are wtp_ticket_values_<country>.js
+Qualtrics.SurveyEngine.addOnload(function()
+{
+  // ticket prices, currency label, limit fields and add_cost per condition,
+  // keyed by treatment|route_length|red_amt|income|charged
+  var table = __TICKET_TABLE__;
+
+  // Get embedded data values
+  var treatment = Qualtrics.SurveyEngine.getEmbeddedData('treatment');
+  var income = Qualtrics.SurveyEngine.getEmbeddedData('income');
+  var red_amt = Qualtrics.SurveyEngine.getEmbeddedData('red_amt');
+  var route_length = Qualtrics.SurveyEngine.getEmbeddedData('route_length');
+  var planned_flight = parseInt(Qualtrics.SurveyEngine.getEmbeddedData('planned_flight'));
+  var flight_tour = parseInt(Qualtrics.SurveyEngine.getEmbeddedData('flight_tour'));
+  var limit_high = parseInt(Qualtrics.SurveyEngine.getEmbeddedData(table.limit_fields[red_amt]));
+
+  var ticket_cost = table.ticket_cost[route_length];
+
+  // charged: over the flight limit (limitarian) or flying for tourism
+  // (prioritarian); income only sets the surcharge under egalitarian
+  var charged = false;
+  if (treatment === "limit") {
+    charged = planned_flight > limit_high;
+  } else if (treatment === "prior") {
+    charged = flight_tour > 0;
+  }
+  var key = [treatment, route_length, red_amt, treatment === "egal" ? income : "all", charged].join("|");
+
+  // control respondents see the ticket without a surcharge
+  var add_cost = treatment === "control" ? 0 : table.add_cost[key];
+
+  var total_cost = ticket_cost + add_cost;
+
+  console.log("Ticket cost: ", ticket_cost);
+  console.log("Additional cost: ", add_cost);
+  console.log("Route length: ", route_length);
+  console.log("Treatment: ", treatment);
+  console.log("Income group: ", income);
+  console.log("Reduction amount: ", red_amt);
+
+  // Save variables
+  Qualtrics.SurveyEngine.setEmbeddedData("ticket_cost", ticket_cost);
+  Qualtrics.SurveyEngine.setEmbeddedData("add_cost", add_cost);
+  Qualtrics.SurveyEngine.setEmbeddedData("total_cost", total_cost);
+
+  // Populate table with dynamic data
+  function money(amount) {
+    return table.currency_prefix + amount + table.currency_suffix;
+  }
+  document.getElementById("ticketPriceCell").textContent = money(ticket_cost);
+  document.getElementById("emissionsReductionCell").textContent = red_amt;
+  document.getElementById("additionalCostCell").textContent = money(add_cost);
+  document.getElementById("totalCostCell").textContent = money(total_cost);
+});
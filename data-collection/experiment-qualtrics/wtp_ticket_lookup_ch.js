@@ -0,0 +1,123 @@
+// generated by data-collection/wtp-tickets.py --scripts from wtp_ticket_lookup.template.js,
+// edit the template and rerun it rather than this file
+Qualtrics.SurveyEngine.addOnload(function()
+{
+  // ticket prices, currency label, limit fields and add_cost per condition,
+  // keyed by treatment|route_length|red_amt|income|charged
+  var table = {
+    "currency_prefix": "CHF ",
+    "currency_suffix": "",
+    "ticket_cost": {
+      "short": 130,
+      "long": 350
+    },
+    "limit_fields": {
+      "15%": "limit_15_high",
+      "30%": "limit_30_high",
+      "45%": "limit_45_high"
+    },
+    "add_cost": {
+      "egal|long|15%|high|false": 100,
+      "egal|long|15%|low|false": 24,
+      "egal|long|15%|mid|false": 58,
+      "egal|long|30%|high|false": 115,
+      "egal|long|30%|low|false": 27,
+      "egal|long|30%|mid|false": 67,
+      "egal|long|45%|high|false": 132,
+      "egal|long|45%|low|false": 31,
+      "egal|long|45%|mid|false": 77,
+      "egal|short|15%|high|false": 31,
+      "egal|short|15%|low|false": 7,
+      "egal|short|15%|mid|false": 18,
+      "egal|short|30%|high|false": 36,
+      "egal|short|30%|low|false": 8,
+      "egal|short|30%|mid|false": 21,
+      "egal|short|45%|high|false": 41,
+      "egal|short|45%|low|false": 10,
+      "egal|short|45%|mid|false": 24,
+      "limit|long|15%|all|false": 0,
+      "limit|long|15%|all|true": 139,
+      "limit|long|30%|all|false": 0,
+      "limit|long|30%|all|true": 160,
+      "limit|long|45%|all|false": 0,
+      "limit|long|45%|all|true": 184,
+      "limit|short|15%|all|false": 0,
+      "limit|short|15%|all|true": 43,
+      "limit|short|30%|all|false": 0,
+      "limit|short|30%|all|true": 50,
+      "limit|short|45%|all|false": 0,
+      "limit|short|45%|all|true": 57,
+      "prior|long|15%|all|false": 0,
+      "prior|long|15%|all|true": 153,
+      "prior|long|30%|all|false": 0,
+      "prior|long|30%|all|true": 176,
+      "prior|long|45%|all|false": 0,
+      "prior|long|45%|all|true": 203,
+      "prior|short|15%|all|false": 0,
+      "prior|short|15%|all|true": 48,
+      "prior|short|30%|all|false": 0,
+      "prior|short|30%|all|true": 55,
+      "prior|short|45%|all|false": 0,
+      "prior|short|45%|all|true": 63,
+      "prop|long|15%|all|false": 77,
+      "prop|long|15%|all|true": 77,
+      "prop|long|30%|all|false": 88,
+      "prop|long|30%|all|true": 88,
+      "prop|long|45%|all|false": 101,
+      "prop|long|45%|all|true": 101,
+      "prop|short|15%|all|false": 24,
+      "prop|short|15%|all|true": 24,
+      "prop|short|30%|all|false": 27,
+      "prop|short|30%|all|true": 27,
+      "prop|short|45%|all|false": 31,
+      "prop|short|45%|all|true": 31
+    }
+  };
+
+  // Get embedded data values
+  var treatment = Qualtrics.SurveyEngine.getEmbeddedData('treatment');
+  var income = Qualtrics.SurveyEngine.getEmbeddedData('income');
+  var red_amt = Qualtrics.SurveyEngine.getEmbeddedData('red_amt');
+  var route_length = Qualtrics.SurveyEngine.getEmbeddedData('route_length');
+  var planned_flight = parseInt(Qualtrics.SurveyEngine.getEmbeddedData('planned_flight'));
+  var flight_tour = parseInt(Qualtrics.SurveyEngine.getEmbeddedData('flight_tour'));
+  var limit_high = parseInt(Qualtrics.SurveyEngine.getEmbeddedData(table.limit_fields[red_amt]));
+
+  var ticket_cost = table.ticket_cost[route_length];
+
+  // charged: over the flight limit (limitarian) or flying for tourism
+  // (prioritarian); income only sets the surcharge under egalitarian
+  var charged = false;
+  if (treatment === "limit") {
+    charged = planned_flight > limit_high;
+  } else if (treatment === "prior") {
+    charged = flight_tour > 0;
+  }
+  var key = [treatment, route_length, red_amt, treatment === "egal" ? income : "all", charged].join("|");
+
+  // control respondents see the ticket without a surcharge
+  var add_cost = treatment === "control" ? 0 : table.add_cost[key];
+
+  var total_cost = ticket_cost + add_cost;
+
+  console.log("Ticket cost: ", ticket_cost);
+  console.log("Additional cost: ", add_cost);
+  console.log("Route length: ", route_length);
+  console.log("Treatment: ", treatment);
+  console.log("Income group: ", income);
+  console.log("Reduction amount: ", red_amt);
+
+  // Save variables
+  Qualtrics.SurveyEngine.setEmbeddedData("ticket_cost", ticket_cost);
+  Qualtrics.SurveyEngine.setEmbeddedData("add_cost", add_cost);
+  Qualtrics.SurveyEngine.setEmbeddedData("total_cost", total_cost);
+
+  // Populate table with dynamic data
+  function money(amount) {
+    return table.currency_prefix + amount + table.currency_suffix;
+  }
+  document.getElementById("ticketPriceCell").textContent = money(ticket_cost);
+  document.getElementById("emissionsReductionCell").textContent = red_amt;
+  document.getElementById("additionalCostCell").textContent = money(add_cost);
+  document.getElementById("totalCostCell").textContent = money(total_cost);
+});
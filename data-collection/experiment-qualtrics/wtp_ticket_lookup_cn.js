@@ -0,0 +1,123 @@
+// generated by data-collection/wtp-tickets.py --scripts from wtp_ticket_lookup.template.js,
+// edit the template and rerun it rather than this file
+Qualtrics.SurveyEngine.addOnload(function()
+{
+  // ticket prices, currency label, limit fields and add_cost per condition,
+  // keyed by treatment|route_length|red_amt|income|charged
+  var table = {
+    "currency_prefix": "",
+    "currency_suffix": "元",
+    "ticket_cost": {
+      "short": 1000,
+      "long": 2140
+    },
+    "limit_fields": {
+      "15%": "limit_high",
+      "30%": "limit_high",
+      "45%": "limit_high"
+    },
+    "add_cost": {
+      "egal|long|15%|high|false": 823,
+      "egal|long|15%|low|false": 194,
+      "egal|long|15%|mid|false": 479,
+      "egal|long|30%|high|false": 946,
+      "egal|long|30%|low|false": 224,
+      "egal|long|30%|mid|false": 550,
+      "egal|long|45%|high|false": 1087,
+      "egal|long|45%|low|false": 257,
+      "egal|long|45%|mid|false": 633,
+      "egal|short|15%|high|false": 257,
+      "egal|short|15%|low|false": 61,
+      "egal|short|15%|mid|false": 149,
+      "egal|short|30%|high|false": 295,
+      "egal|short|30%|low|false": 70,
+      "egal|short|30%|mid|false": 172,
+      "egal|short|45%|high|false": 339,
+      "egal|short|45%|low|false": 80,
+      "egal|short|45%|mid|false": 197,
+      "limit|long|15%|all|false": 0,
+      "limit|long|15%|all|true": 1147,
+      "limit|long|30%|all|false": 0,
+      "limit|long|30%|all|true": 1319,
+      "limit|long|45%|all|false": 0,
+      "limit|long|45%|all|true": 1516,
+      "limit|short|15%|all|false": 0,
+      "limit|short|15%|all|true": 356,
+      "limit|short|30%|all|false": 0,
+      "limit|short|30%|all|true": 410,
+      "limit|short|45%|all|false": 0,
+      "limit|short|45%|all|true": 471,
+      "prior|long|15%|all|false": 0,
+      "prior|long|15%|all|true": 1262,
+      "prior|long|30%|all|false": 0,
+      "prior|long|30%|all|true": 1451,
+      "prior|long|45%|all|false": 0,
+      "prior|long|45%|all|true": 1668,
+      "prior|short|15%|all|false": 0,
+      "prior|short|15%|all|true": 392,
+      "prior|short|30%|all|false": 0,
+      "prior|short|30%|all|true": 451,
+      "prior|short|45%|all|false": 0,
+      "prior|short|45%|all|true": 518,
+      "prop|long|15%|all|false": 631,
+      "prop|long|15%|all|true": 631,
+      "prop|long|30%|all|false": 725,
+      "prop|long|30%|all|true": 725,
+      "prop|long|45%|all|false": 834,
+      "prop|long|45%|all|true": 834,
+      "prop|short|15%|all|false": 196,
+      "prop|short|15%|all|true": 196,
+      "prop|short|30%|all|false": 225,
+      "prop|short|30%|all|true": 225,
+      "prop|short|45%|all|false": 259,
+      "prop|short|45%|all|true": 259
+    }
+  };
+
+  // Get embedded data values
+  var treatment = Qualtrics.SurveyEngine.getEmbeddedData('treatment');
+  var income = Qualtrics.SurveyEngine.getEmbeddedData('income');
+  var red_amt = Qualtrics.SurveyEngine.getEmbeddedData('red_amt');
+  var route_length = Qualtrics.SurveyEngine.getEmbeddedData('route_length');
+  var planned_flight = parseInt(Qualtrics.SurveyEngine.getEmbeddedData('planned_flight'));
+  var flight_tour = parseInt(Qualtrics.SurveyEngine.getEmbeddedData('flight_tour'));
+  var limit_high = parseInt(Qualtrics.SurveyEngine.getEmbeddedData(table.limit_fields[red_amt]));
+
+  var ticket_cost = table.ticket_cost[route_length];
+
+  // charged: over the flight limit (limitarian) or flying for tourism
+  // (prioritarian); income only sets the surcharge under egalitarian
+  var charged = false;
+  if (treatment === "limit") {
+    charged = planned_flight > limit_high;
+  } else if (treatment === "prior") {
+    charged = flight_tour > 0;
+  }
+  var key = [treatment, route_length, red_amt, treatment === "egal" ? income : "all", charged].join("|");
+
+  // control respondents see the ticket without a surcharge
+  var add_cost = treatment === "control" ? 0 : table.add_cost[key];
+
+  var total_cost = ticket_cost + add_cost;
+
+  console.log("Ticket cost: ", ticket_cost);
+  console.log("Additional cost: ", add_cost);
+  console.log("Route length: ", route_length);
+  console.log("Treatment: ", treatment);
+  console.log("Income group: ", income);
+  console.log("Reduction amount: ", red_amt);
+
+  // Save variables
+  Qualtrics.SurveyEngine.setEmbeddedData("ticket_cost", ticket_cost);
+  Qualtrics.SurveyEngine.setEmbeddedData("add_cost", add_cost);
+  Qualtrics.SurveyEngine.setEmbeddedData("total_cost", total_cost);
+
+  // Populate table with dynamic data
+  function money(amount) {
+    return table.currency_prefix + amount + table.currency_suffix;
+  }
+  document.getElementById("ticketPriceCell").textContent = money(ticket_cost);
+  document.getElementById("emissionsReductionCell").textContent = red_amt;
+  document.getElementById("additionalCostCell").textContent = money(add_cost);
+  document.getElementById("totalCostCell").textContent = money(total_cost);
+});
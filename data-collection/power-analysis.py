@@ -0,0 +1,33 @@
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.power import DEFAULT_MAX_SIMS, power_grid
+
+# simulation-based power analysis of the justice x emissions interaction, the
+# python counterpart of power-analysis.R: each grid cell simulates stacked
+# data sets, fits the random-intercept model to every replicate, and stops
+# once the power interval is tight enough
+#
+#   python data-collection/power-analysis.py --n 100 200 400 --effects 0.05 0.1 0.2
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate power over a grid of sample sizes and effect sizes.")
+    parser.add_argument("--n", type=int, nargs="+", default=[100, 200, 400], help="participants")
+    parser.add_argument("--effects", type=float, nargs="+", default=[0.05, 0.1, 0.2],
+                        help="justice x emissions interaction coefficients")
+    parser.add_argument("--noise", type=float, nargs="+", default=[1.0], help="residual sd")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--ci-width", type=float, default=0.02,
+                        help="stop a cell once its 95%% power interval is narrower than this")
+    parser.add_argument("--max-sims", type=int, default=DEFAULT_MAX_SIMS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--out", default="data/power_grid.csv")
+    args = parser.parse_args()
+
+    results = power_grid(args.n, args.effects, args.noise, seed=args.seed, workers=args.workers,
+                         alpha=args.alpha, ci_width=args.ci_width, max_sims=args.max_sims)
+    print(results.to_string(index=False))
+    results.to_csv(args.out, index=False)
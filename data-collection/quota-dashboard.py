@@ -0,0 +1,30 @@
+import asyncio
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.quota_server import QuotaDashboard
+
+# local quota dashboard for fieldwork: watches the export directory, counts the
+# rows appended to the newest export of each country, and pushes the quota
+# comparison to the browser; /quotas.json serves the same table to scripts
+#
+#   python data-collection/quota-dashboard.py --dir data --port 8050
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a live quota check for the exports in a directory.")
+    parser.add_argument("--dir", default="data", help="directory the Qualtrics exports are downloaded to")
+    parser.add_argument("--state", default="data/quota_dashboard_state.json",
+                        help="running counts of the dashboard, apart from those of check-demo.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between checks of the exports")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="deviation from a quota that is highlighted")
+    args = parser.parse_args()
+
+    dashboard = QuotaDashboard(args.dir, args.state, args.interval, args.tolerance)
+    try:
+        asyncio.run(dashboard.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,42 @@
+import pandas as pd
+import numpy as np
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.preprocessing import COUNTRIES
+from functions.surcharges import LOOKUP_KEYS
+from functions.synthetic import DEFAULT_SYNTHETIC_CHUNKSIZE, EXPORT_NAMES, write_synthetic_export
+
+# synthetic Qualtrics exports for stress-testing the pipeline: one file per
+# country under the names of the real exports, with the same header rows and
+# screening columns, so `raw_dir` in config.yaml can point the pipeline at them
+#
+#   python data-collection/synthetic-exports.py --n 1000000
+#   snakemake --cores 3 --config raw_dir=raw-data-synthetic
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic Qualtrics exports for all countries.")
+    parser.add_argument("--n", type=int, default=1_000_000, help="responses per country")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out-dir", default="raw-data-synthetic")
+    parser.add_argument("--columns", type=int,
+                        help="pad every export with page timers up to this many columns")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_SYNTHETIC_CHUNKSIZE)
+    parser.add_argument("--lookup", default="data/add_cost_lookup.csv",
+                        help="add_cost lookup of wtp-tickets.py, used to fill in the displayed ticket costs")
+    args = parser.parse_args()
+
+    lookup = None
+    if os.path.exists(args.lookup):
+        lookup = pd.read_csv(args.lookup, index_col=LOOKUP_KEYS)
+    else:
+        print(f"{args.lookup} not found, writing exports without total_cost", file=sys.stderr)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    seeds = np.random.SeedSequence(args.seed).spawn(len(COUNTRIES))
+    for country, seed in zip(COUNTRIES, seeds):
+        out_file = os.path.join(args.out_dir, EXPORT_NAMES[country])
+        write_synthetic_export(out_file, country, args.n, seed, args.chunksize, lookup, args.columns)
+        print(f"wrote {args.n:,} synthetic {country} responses to {out_file}")
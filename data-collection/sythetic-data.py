@@ -1,114 +1,71 @@
-import pandas as pd 
 import numpy as np
-import plotly.express as px
-
-#%% reset working directory
+import sys
 import os
-print(os.getcwd())
-wd = '/Users/kristiinajoon/Documents/Projects/aviation-budget'
-os.chdir(wd)
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.synthetic import pilot_panel
+
+# synthetic pilot panel for the power analysis, written to
+# data/synthetic_<n>.csv; run from the repo root. --plots shows a histogram
+# of each variable (needs plotly, which is only imported then)
+#
+#   python data-collection/sythetic-data.py --n 1000
+#   python data-collection/sythetic-data.py --plots
+
+# columns of the pilot panel, named as in the power analysis
+columns_to_plot = ['planned_flights',
+                   'control_wtc',
+                   'control_flights',
+                   'treatment_wtc',
+                   'treatment_flights']
 
-#%% ############################# read data ##################################
+# %% ######################### synthetic data ################################
 
-df = pd.read_csv('data/survey-02-10-24.csv')
+def synthetic_panel(n=1000, seed=42, max_flights=30, max_likert=6):
+    """Return the synthetic pilot panel with the change in flights between control and treatment."""
+    # populate the df with random data, all columns drawn at once from a seeded
+    # generator for reproducibility
+    rng = np.random.default_rng(seed)
+    df = pilot_panel(rng, n, max_flights=max_flights, max_likert=max_likert)
 
-pd.set_option('display.max_columns', None)
-columns = df.columns.tolist()
-df = df.drop([0, 1]) # remove first two rows
-df['ID'] = range(1, len(df) + 1)
+    # delta_flights
+    df['change_flights'] = df['control_flights'] - df['treatment_flights']
+    return df
 
-# rename columns for power analysis 
-df.rename(columns={
-    'flights_plan': 'planned_flights',
-    'c_red_flight_scale': 'control_wtc',
-    'c_red_flight_plan': 'control_flights', 
-    't_g_red_flight_scale': 'treatment_wtc', 
-    't_g_red_flight_plan': 'treatment_flights'
-    }, 
-    inplace=True)
 
-# %% ######################### synthetic data ################################
+# %% ####################### check generated data ############################
 
-df = pd.DataFrame(columns=[
-    'ID', 
-    'planned_flights', 
-    'control_wtc', 
-    'control_flights', 
-    'treatment_wtc', 
-    'treatment_flights',
-    'treatment'
-])
-
-# set sample size 
-n = 1000
-max_flights = 30
-max_likert = 6
-
-### populate the df with random data
-# set see for reproducibility
-np.random.seed(42)
-df['ID'] = np.arange(1, n+1)
-df['planned_flights'] = np.random.randint(0, max_flights + 1, size=n)
-df['control_wtc'] = np.random.randint(1, max_likert + 1, size=n)
-df['treatment'] = np.random.choice([1, 2, 3, 4], size=n)
-
-# generate control and treatment flights
-# 90% of the time the control flights should not exceed planned flights
-# 10% of the time generate random flights
-
-control_flights = []
-treatment_flights = []
-treatment_wtc = []
-
-# generate control flights
-# 90% chance that less or equal to planned flights
-for flights in df['planned_flights']:
-    if np.random.rand() < 0.9: 
-        control_flights.append(np.random.randint(0, flights + 2))
-    else:
-        control_flights.append(np.random.randint(0, max_flights + 1))
-
-# generate treatment flights and treatment wtc
-for index in range(len(df)):
-    # 60% chance for treatment flights to be less than control flights
-    if np.random.rand() < 0.6:
-        treatment_flights.append(np.random.randint(0, control_flights[index] + 1))
-    else:
-        treatment_flights.append(np.random.randint(0, max_flights + 1))
-
-    # 60% chance for treatment wtc to be greater than control wtc
-    if np.random.rand() < 0.6:
-        treatment_wtc.append(np.random.randint(df['control_wtc'].iloc[index], max_likert + 1))
-    else:
-        treatment_wtc.append(np.random.randint(1, max_likert + 1))
-
-
-# assign to df
-df['control_flights'] = control_flights
-df['treatment_flights'] = treatment_flights
-df['treatment_wtc'] = treatment_wtc
+def plot_histograms(df):
+    """Show a histogram of each generated column."""
+    import plotly.express as px
 
-# %% ####################### check generated data ############################
+    for column in columns_to_plot:
+        fig = px.histogram(df, x=column, title=f'Histogram of {column}',
+                           labels={column: column},
+                           color_discrete_sequence=['blue'],  # You can choose your color
+                           marginal='rug')  # Add a rug plot for additional insights
+        fig.show()
 
-columns_to_plot = ['planned_flights', 
-                   'control_wtc', 
-                   'control_flights', 
-                   'treatment_wtc', 
-                   'treatment_flights']
 
-# Create histograms for each column
-for column in columns_to_plot:
-    fig = px.histogram(df, x=column, title=f'Histogram of {column}', 
-                       labels={column: column}, 
-                       color_discrete_sequence=['blue'],  # You can choose your color
-                       marginal='rug')  # Add a rug plot for additional insights
-    fig.show()
+# %% ########################### save to file #################################
 
-# %% ######################### calculate estimators ###########################
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic pilot panel for the power analysis.")
+    parser.add_argument("--n", type=int, default=1000, help="sample size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-flights", type=int, default=30)
+    parser.add_argument("--max-likert", type=int, default=6)
+    parser.add_argument("--plots", action="store_true", help="show a histogram of each column (needs plotly)")
+    parser.add_argument("--out", help="output csv, data/synthetic_<n>.csv by default")
+    args = parser.parse_args(argv)
 
-# delta_flights
-df['change_flights'] = df['control_flights'] - df['treatment_flights']
+    df = synthetic_panel(args.n, args.seed, args.max_flights, args.max_likert)
+    if args.plots:
+        plot_histograms(df)
+
+    df.to_csv(args.out or f"data/synthetic_{args.n}.csv", index=False)
 
-# %% ########################### save to file #################################
 
-df.to_csv('data/synthetic_1000.csv', index=False)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import yaml
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.surcharges import DEFAULT_SWEEP_CHUNKSIZE, TICKET_COSTS, grid_size, sweep, sweep_dimensions
+
+# sweep mode of wtp-tickets.py: evaluates the surcharges over the Cartesian
+# grid of load factors, income splits, purpose and frequency shares, and
+# exchange rates in a yaml file, streaming the rows to one parquet file
+#
+#   python data-collection/wtp-tickets-sweep.py data-collection/surcharge-sweep.yaml
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep the ticket surcharges over a scenario grid.")
+    parser.add_argument("grid", nargs="?", default="data-collection/surcharge-sweep.yaml")
+    parser.add_argument("--query", help="override the filter expression of the grid file")
+    parser.add_argument("--out", help="override the output file of the grid file")
+    args = parser.parse_args()
+
+    with open(args.grid) as f:
+        spec = yaml.safe_load(f)
+
+    dims = sweep_dimensions(spec["stringency_costs"], spec["nr_passengers"], spec["grid"])
+    out_file = args.out or spec.get("out_file", "data/surcharge_sweep.parquet")
+    query = args.query or spec.get("query")
+
+    print(f"evaluating {grid_size(dims):,} scenarios x {len(TICKET_COSTS)} currencies")
+    n_rows = sweep(
+        dims,
+        out_file,
+        query=query,
+        chunksize=spec.get("chunksize") or DEFAULT_SWEEP_CHUNKSIZE,
+        workers=spec.get("workers"),
+    )
+    print(f"wrote {n_rows:,} rows to {out_file}")
@@ -1,5 +1,21 @@
 import pandas as pd
-from sympy import symbols, Eq, solve 
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.surcharges import add_cost_lookup, surcharge_table, wide_tables
+from functions.ticket_scripts import QUALTRICS_DIR, write_ticket_scripts
+
+# surcharges shown in the WTP ticket scenarios, written per flight type and
+# currency to data/cost_pp_*.csv, as a tidy table, and as the add_cost lookup
+# of preprocessing; run by the ticket_surcharges rule or by hand. With
+# --scripts it also writes ticket scripts generated from the lookup
+# (wtp_ticket_lookup_*.js, the fielded wtp_ticket_values_*.js are left as they
+# were run); check them with data-collection/check-ticket-scripts.py
+#
+#   python data-collection/wtp-tickets.py
+#   python data-collection/wtp-tickets.py --scripts data-collection/experiment-qualtrics
 
 # %% #################### define parameters #######################
 flight_types = ['short', 'long']
@@ -45,79 +61,73 @@ income = pd.DataFrame(income)
 purpose = pd.DataFrame(purpose)
 frequency = pd.DataFrame(frequency)
 
-# constants for flying behaviour relative to low income group's flying
-low_mid_ratio = income['mid'][0] / income['low'][0]
-low_high_ratio = income['high'][0] / income['low'][0]
-
 # currency conversion rates as of 04.10.24
 eur_to_usd = 1.1
 eur_to_chf = 0.94
 eur_to_cny = 7.74
 
 # %% ######################## calculate ###########################
+# one scenario per flight type and stringency level, all allocation rules and
+# currencies are computed in a single batch
+
+def ticket_surcharges():
+    """Return the surcharge of every scenario, allocation rule, group and currency."""
+    scenarios = pd.concat([
+        stringency_costs[flight_type].assign(
+            flight_type=flight_type,
+            passengers=nr_passengers[flight_type],
+            low=income['low'],
+            mid=income['mid'],
+            high=income['high'],
+            tourism=purpose['tourism'],
+            frequent=frequency['frequent'],
+        )
+        for flight_type in flight_types
+    ], ignore_index=True)
+
+    return surcharge_table(
+        scenarios,
+        rates={'usd': eur_to_usd, 'chf': eur_to_chf, 'cny': eur_to_cny}
+    )
 
-cost_pp = {}
-
-for flight_type in flight_types:
-    stringency_df = stringency_costs[flight_type]
-    num_passengers = nr_passengers[flight_type]
-    
-    cost_pp_type = dict()
-
-    nr_low = round(income['low'][0]*num_passengers)
-    nr_mid = round(income['mid'][0]*num_passengers)
-    nr_high = round(income['high'][0]*num_passengers)
-
-    # proportional
-    cost_pp_type['proportional'] = stringency_df['costs'] / num_passengers
-
-    # prioritarian
-    cost_pp_type['tourism'] = stringency_df['costs'] / (num_passengers * purpose['tourism'])
-    cost_pp_type['non_tourism'] = stringency_df['costs'] * 0
 
-    # limitarian   
-    cost_pp_type['frequent'] = stringency_df['costs'] / (num_passengers * frequency['frequent'])
-    cost_pp_type['non_frequent'] = stringency_df['costs'] * 0
+# %% ####################### write to file ########################
+# write six files, one for each currency and flight type, the tidy table, and
+# the add_cost lookup used to attach the displayed surcharge in preprocessing
 
-    # egalitarian
-    # find egalitarian constant
-    x = symbols('x')
-    equation = Eq(nr_low * x + nr_mid * x * low_mid_ratio + nr_high * x * low_high_ratio, 1)
-    constant = solve(equation, x)[0].evalf()
+def main(out_lookup="data/add_cost_lookup.csv", out_surcharges="data/ticket_surcharges.csv", script_dir=None):
+    surcharges = ticket_surcharges()
 
-    # calculate costs per passenger
-    cost_pp_type['low'] = (stringency_df['costs'] * constant).astype(float)
-    cost_pp_type['mid'] = (stringency_df['costs'] * constant * low_mid_ratio).astype(float)
-    cost_pp_type['high'] = (stringency_df['costs'] * constant * low_high_ratio).astype(float)
+    # check cost_pp_short in eur
+    print(surcharges[(surcharges['flight_type'] == 'short') & (surcharges['currency'] == 'usd')]
+          .pivot(index='stringency', columns='group', values='cost_eur'))
 
-    # Save the DataFrame to the dictionary with the flight type as the key
-    cost_pp[f'cost_pp_{flight_type}'] = pd.DataFrame(cost_pp_type)
+    # tables per flight type and currency (usd, chf, and cny)
+    cost_pp_converted = wide_tables(surcharges)
 
-# check cost_pp_short
-print(cost_pp['cost_pp_short'])
+    # check conversion for short haul flights in usd
+    print(cost_pp_converted[('short', 'usd')])
 
-# %% ######################### convert ###########################
-#convert to usd, chf, and cny
+    for (flight_type, currency), df in cost_pp_converted.items():
+        file_name = f"data/cost_pp_{flight_type}_{currency}.csv"
+        df.to_csv(file_name, index=False)
 
-# Create a dictionary to store converted costs
-cost_pp_converted = {}
+    surcharges.to_csv(out_surcharges, index=False)
+    lookup = add_cost_lookup(surcharges)
+    lookup.to_csv(out_lookup)
 
-# Loop through each flight type in cost_pp
-for flight_type, df in cost_pp.items():
-    cost_pp_converted[flight_type] = {
-        'usd': round(df * eur_to_usd),
-        'chf': round(df * eur_to_chf),
-        'cny': round(df * eur_to_cny)
-    }
+    # the ticket scripts of the survey are filled in from the same lookup
+    if script_dir is not None:
+        write_ticket_scripts(lookup, script_dir)
 
-# check conversion for short haul flights in usd
-print(cost_pp_converted['cost_pp_short']['usd'])
 
-# %% ####################### write to file ########################
-# write six files, one for each currency and flight type
-
-for flight_type, conversions in cost_pp_converted.items():
-    for currency, df in conversions.items():
-        file_name = f"data/{flight_type}_{currency}.csv"
-        df.to_csv(file_name, index=False)
+if __name__ == "__main__":
+    if 'snakemake' in dir():
+        main(snakemake.output['lookup'], snakemake.output['surcharges'])
+    else:
+        parser = argparse.ArgumentParser(description="Compute the WTP ticket surcharges and the add_cost lookup.")
+        parser.add_argument("--scripts", metavar="DIR",
+                            help=f"also write the ticket scripts generated from the lookup to DIR, e.g. {QUALTRICS_DIR}")
+        args = parser.parse_args()
+        main(script_dir=args.scripts)
 # %%
@@ -0,0 +1,60 @@
+import sys
+import os
+import json
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.benchmark import (BENCHMARK_DIR, BENCHMARK_STEPS, FIXTURE_DIR, compare_benchmarks,
+                                 latest_benchmark, run_benchmark, save_benchmark)
+
+# time the python preprocessing and CJO steps end to end on synthetic exports
+# of growing size, and compare throughput and memory with the previous run
+#
+#   python scripts/benchmark.py                                    # 1k to 100k, 200 columns
+#   python scripts/benchmark.py --respondents 1000 10000 100000 1000000 --columns 200 3000
+#   python scripts/benchmark.py --check                            # exit 1 on a slowdown
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the python preprocessing and CJO steps.")
+    parser.add_argument("--respondents", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="responses per size, split over the three countries")
+    parser.add_argument("--columns", type=int, nargs="+", default=[200], help="columns of every export")
+    parser.add_argument("--steps", nargs="+", choices=list(BENCHMARK_STEPS), default=list(BENCHMARK_STEPS))
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size, the fastest is kept")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="where the synthetic exports are kept between runs")
+    parser.add_argument("--out-dir", default=BENCHMARK_DIR)
+    parser.add_argument("--baseline", help="benchmark json to compare with, by default the previous one in --out-dir")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="flag a throughput drop or memory growth larger than this fraction")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 when a regression is flagged")
+    args = parser.parse_args()
+
+    # steps read what the earlier ones wrote, so a subset keeps pipeline order
+    steps = {step: script for step, script in BENCHMARK_STEPS.items() if step in args.steps}
+    result = run_benchmark(os.getcwd(), sorted(args.respondents), sorted(args.columns), seed=args.seed,
+                           repeat=args.repeat, fixture_dir=args.fixtures, steps=steps)
+    path = save_benchmark(result, args.out_dir)
+    print(f"wrote {path}")
+
+    for scaling in result["scaling"]:
+        print(f"{scaling['step']} ({scaling['columns']} columns): wall time ~ respondents^{scaling['exponent']}")
+    failed = [r for r in result["results"] if r["status"] != "ok"]
+    for r in failed:
+        print(f"{r['step']} failed at {r['respondents']:,} x {r['columns']}:\n{r['error']}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        baseline = latest_benchmark(args.out_dir, exclude=path)
+    regressions = []
+    if baseline is None:
+        print("no earlier benchmark to compare with")
+    else:
+        comparison = compare_benchmarks(result, baseline, args.threshold)
+        print(f"compared with {baseline['run']} ({baseline.get('commit')}):")
+        print(comparison.to_string(index=False))
+        regressions = comparison[comparison["regression"].notna()] if len(comparison) else comparison
+    if args.check and (len(regressions) or failed):
+        sys.exit(1)
@@ -1,81 +1,113 @@
 import pandas as pd
-import numpy as np
-import pingouin as pg
+import yaml
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.items import ITEM_MATRIX, ItemMatrix
+from functions.reliability import reliability_table
+from functions.profiling import PROFILE_LOG, stage
+
+# reliability of the justice items: ICC(3,1) and cronbach's alpha per country
+# and principle, written to data/cjo_reliability.csv; --plots also draws the
+# score checks (needs seaborn, which is only imported then)
+#
+#   python scripts/cjo/cjo_icc.py
+#   python scripts/cjo/cjo_icc.py --plots
 
 # %%
 ############### read data ###############
 
-df = pd.read_csv("data/cjo_icc_input.csv")
-df = df[df['country'].isin(['US'])]
+def load_items(profile=None):
+    """Memory-map the respondent x item int8 matrix written by scripts/cjo/preprocessing.py."""
+    with stage("read", "cjo_icc", profile) as timing:
+        items = ItemMatrix(ITEM_MATRIX)
+        timing.rows_out = len(items)
+    return items
 
-# %% 
-############## prep data ################
-
-df_long = df.melt(id_vars=['id'], 
-                        value_vars=['justice_general_1', 'justice_tax_1', 'justice_subsidy_1',
-                                    'justice_general_2', 'justice_tax_2', 'justice_subsidy_2',
-                                    'justice_general_3', 'justice_tax_3', 'justice_subsidy_3',
-                                    'justice_general_4', 'justice_tax_4', 'justice_subsidy_4'],
-                        var_name='variable', value_name='score')
-
-# Extract set number from variable name (1, 2, 3, or 4)
-df_long['principle'] = df_long['variable'].str.extract(r'(\d+)')
 
-std = df_long.groupby('id')['score'].std()
-
-# %% 
+# %%
+############## prep data ################
 
-############# test plots ###############
+def long_format(items):
+    """Return the scores in long format and the spread of each respondent's scores.
 
-import seaborn as sns
-sns.boxplot(data=df_long, x="principle", y="score")
+    The principle (1, 2, 3, or 4) and context of each item are taken from
+    the matrix layout.
+    """
+    df_long = items.long()
+    std = pd.DataFrame(items.scores(), index=pd.Index(items.ids, name='id')).std(axis=1)
+    return df_long, std
 
-df_long.groupby('id')['score'].std().hist(bins=25)
 
 # %%
-############## run icc #################
 
-icc_results = []
-
-for principle in df_long['principle'].unique():
-    df_subset = df_long[df_long['principle'] == principle]
-    icc = pg.intraclass_corr(
-        data=df_subset, 
-        targets='id', 
-        raters='variable', 
-        ratings='score'
-    )
-    icc_3_1 = icc[icc['Type'] == 'ICC3'].copy()
-    icc_3_1['principle'] = principle
-    icc_results.append(icc_3_1)
+############# test plots ###############
 
+def plot_checks(df_long, std, out_file="output/cjo_item_scores.png"):
+    """Plot the scores per principle and the spread of each respondent's scores."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-icc_results = pd.concat(icc_results)
+    fig, (ax_scores, ax_std) = plt.subplots(1, 2, figsize=(10, 4))
+    sns.boxplot(data=df_long, x="principle", y="score", ax=ax_scores)
+    std.hist(bins=25, ax=ax_std)
+    ax_std.set_xlabel("sd of the 12 scores")
+    fig.tight_layout()
+    fig.savefig(out_file, dpi=150)
+    plt.close(fig)
 
-print(icc_results[['principle', 'ICC', 'CI95%']])
 
 # %%
-########## cronbach's alpha #############
-
-# check if the items under one primciples are measuring the same thing
-# whether there's internal consistency 
-
-def cronbach_alpha(df):
-    # df should be a dataframe where each column is a measurement/item for a principle
-    item_scores = df.values
-    item_variances = item_scores.var(axis=0, ddof=1)
-    total_score_var = item_scores.sum(axis=1).var(ddof=1)
-    n_items = df.shape[1]
-    
-    return (n_items / (n_items - 1)) * (1 - item_variances.sum() / total_score_var)
-
-# Example usage per principle:
-alpha_results = {}
-for principle in df_long['principle'].unique():
-    # Pivot to create one column per variable (item) for each principle
-    df_pivot = df_long[df_long['principle'] == principle].pivot(index='id', columns='variable', values='score')
-    alpha_results[principle] = cronbach_alpha(df_pivot)
-
-alpha_results
+########## icc and cronbach's alpha ##########
+
+# ICC(3,1) across the three contexts of each principle, and cronbach's alpha
+# to check whether the items under one principle measure the same thing
+# (internal consistency); one id x item array per country and principle, of
+# the respondents who rated all three of its items, with F-based and
+# bootstrap confidence intervals. The respondent resamples are drawn from the
+# seed one block at a time and shared by all countries and principles; with
+# more than one worker the blocks are spread over a process pool
+
+def reliability(items, resamples=5000, seed=42, workers=1, profile=None):
+    """Return ICC(3,1) and alpha with their intervals per country and principle."""
+    with stage("reliability", "cjo_icc", profile) as timing:
+        arrays = items.item_arrays()
+        table = reliability_table(arrays, resamples=resamples, seed=seed, workers=workers)
+        timing.rows_in, timing.rows_out = len(items), len(table)
+    return table.rename(columns={'group': 'country'})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reliability of the justice items per country and principle.")
+    parser.add_argument("--resamples", type=int, default=5000, help="bootstrap resamples, 0 skips the intervals")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, help="processes for the bootstrap, cjo_workers in config.yaml by default")
+    parser.add_argument("--plots", action="store_true", help="also plot the score checks (needs seaborn)")
+    parser.add_argument("--out", default="data/cjo_reliability.csv")
+    args = parser.parse_args(argv)
+
+    with open("config.yaml") as f:
+        config = yaml.safe_load(f)
+    profile = PROFILE_LOG if config.get("profile_stages", True) else None
+    workers = args.workers or config.get("cjo_workers", 1)
+
+    items = load_items(profile)
+    if args.plots:
+        plot_checks(*long_format(items))
+
+    table = reliability(items, args.resamples, args.seed, workers, profile)
+    columns = ['country', 'principle', 'icc3', 'alpha']
+    if args.resamples:
+        columns = ['country', 'principle', 'icc3', 'icc3_boot_low', 'icc3_boot_high',
+                   'alpha', 'alpha_boot_low', 'alpha_boot_high']
+    print(table[columns])
+
+    table.to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    main()
 
 # %%
@@ -0,0 +1,86 @@
+import yaml
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.tables import read_table
+from functions.lpa import DEFAULT_MAX_CLASSES, DEFAULT_RESTARTS, assign_classes, lpa_grid
+from functions.profiling import PROFILE_LOG, stage
+
+# latent profile analysis of the justice principle means: fit statistics of
+# the model x class count grid to output/lpa_fit_stats_grid.csv, and the
+# profiles of the selected class counts to data/lpa_classes.csv
+#
+#   python scripts/cjo/justice_lpa.py
+#   python scripts/cjo/justice_lpa.py --models EEI VVV --restarts 50
+
+lpa_columns = ['utilitarian', 'egalitarian', 'sufficientarian', 'limitarian']
+
+# %% read data
+
+def load_subsets(columnar=None, profile=None):
+    """Read the LPA input; return it with the arrays of all respondents and of the CH subset, as in justice_lpa.R."""
+    with stage("read", "cjo_lpa", profile) as timing:
+        lpa_data = read_table("data/lpa_input.csv", columns=['id', 'country'] + lpa_columns, fmt=columnar)
+        timing.rows_out = len(lpa_data)
+
+    subsets = {
+        "all": lpa_data[lpa_columns].to_numpy(dtype=float),
+        "ch": lpa_data.loc[lpa_data['country'] == "CH", lpa_columns].to_numpy(dtype=float),
+    }
+    return lpa_data, subsets
+
+
+# %% fit the model x class count grid
+
+# every cell (subset, covariance model, class count) keeps the best of its
+# restarts, each started from a k-means solution warm-started from the one
+# with one class fewer; with more than one worker the cells run in a process
+# pool
+
+def main(argv=None):
+    with open("config.yaml") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Fit latent profile models of the justice principle means.")
+    # covariance structures (mclust names), class counts 1..m, and k-means
+    # restarts per cell; EEI is the model of justice_lpa.R
+    parser.add_argument("--models", nargs="+", default=config.get("lpa_models", ["EEI"]))
+    parser.add_argument("--max-classes", type=int, default=config.get("lpa_max_classes", DEFAULT_MAX_CLASSES))
+    parser.add_argument("--restarts", type=int, default=config.get("lpa_restarts", DEFAULT_RESTARTS))
+    parser.add_argument("--seed", type=int, default=config.get("lpa_seed", 43))
+    # class counts whose assignments are written, as in justice_lpa.R
+    parser.add_argument("--selected", type=int, nargs="+", default=config.get("lpa_selected_classes", [3, 5]))
+    parser.add_argument("--workers", type=int, default=config.get("lpa_workers", 1))
+    args = parser.parse_args(argv)
+
+    columnar = config.get("columnar_format")
+    profile  = PROFILE_LOG if config.get("profile_stages", True) else None
+
+    lpa_data, subsets = load_subsets(columnar, profile)
+
+    with stage("fit grid", "cjo_lpa", profile) as timing:
+        fit_stats, fits = lpa_grid(subsets, args.models, args.max_classes, args.restarts, args.seed,
+                                   workers=args.workers)
+        timing.rows_in, timing.rows_out = len(lpa_data), len(fit_stats)
+
+    print(fit_stats[['subset', 'model', 'G', 'BIC', 'entropy', 'min_proportion', 'distinct_starts', 'replicated']]
+          .to_string(index=False))
+
+    os.makedirs("output", exist_ok=True)
+    fit_stats.to_csv("output/lpa_fit_stats_grid.csv", index=False)
+
+    # %% class assignments of the selected class counts, first model
+
+    model = args.models[0]
+    for k in [k for k in args.selected if k <= args.max_classes]:
+        lpa_data[f'justice_class_{k}'] = assign_classes(subsets["all"], fits[("all", model, k)], model)
+
+    lpa_data.to_csv("data/lpa_classes.csv", index=False)
+
+
+if __name__ == "__main__":
+    main()
+
+# %%
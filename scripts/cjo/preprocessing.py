@@ -1,129 +1,128 @@
 import pandas as pd
+import yaml
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.schema import apply_schema
+from functions.tables import columnar_path, read_table, write_columnar
+from functions.items import ITEM_MATRIX, JUSTICE_ITEMS, write_item_matrix
+from functions.profiling import PROFILE_LOG, stage
+
+# justice items of the clean data for the CJO steps: data/cjo_icc_input.csv,
+# the principle means for the LPA in data/lpa_input.csv, and the int8 item
+# matrix data/justice_items.npy
+#
+#   python scripts/cjo/preprocessing.py
+
+# %% import data
+
+# clean data written by scripts/preprocessing/00_preprocessing_basics.py, in
+# id order; its exclusions and duplicate checks and its ids are reused here
+CLEAN_FILES = {
+    "US": "data/data_clean_us.csv",
+    "CH": "data/data_clean_ch.csv",
+    "CN": "data/data_clean_cn.csv"
+}
 
-# %% import data 
 
-files = {
-    "US": "raw-data/Aviation_Justice_US_111224_1531.csv",
-    "CH": "raw-data/Aviation_Justice_CH_111224_1531.csv",
-    "CN": "raw-data/Aviation_Justice_CN_111224_1532.csv"
-}
+def read_countries(files=CLEAN_FILES, columnar=None, profile=None):
+    """Read the ids and justice items of every country's clean data."""
+    dataframes = {}
+
+    for country, file_name in files.items():
+        # only the ids and the justice items are needed; the typed copy is
+        # read if there is one, the csv is cast to the survey schema so the
+        # justice items become small nullable ints either way
+        with stage(f"read {country}", "cjo_preprocessing", profile) as timing:
+            df = read_table(file_name, columns=JUSTICE_ITEMS + ["id"], fmt=columnar)
+            df, issues = apply_schema(df)
+            timing.rows_out = len(df)
+        if len(issues):
+            print(f"{country}: values outside the survey schema\n{issues}")
 
+        # store the processed dataframe in the dictionary
+        dataframes[country] = df
+    return dataframes
 
-dataframes = {}
-
-for country, file_name in files.items():
-    # read the file, skipping the first two rows
-    df = pd.read_csv(file_name, skiprows=[1, 2])
-    
-    # store the processed dataframe in the dictionary
-    dataframes[country] = df
-
-# %% filter out previews, incompletes, screened out, and failed traps
-
-for country, df in dataframes.items():
-    # filter out rows where DistributionChannel is 'preview' or screened_out is True
-    df = df[(df['DistributionChannel'] != 'preview') & (df['Finished'] != False)]
-    df = df[(df['screened_out'] != "true")]
-    df = df[(df['screened_out'] != "true_trap1")]
-    df = df[(df['screened_out'] != "true_trap2")]
-    df = df[(df['screened_out'] != "true_trap3")]
-    df = df[(df['Q_TerminateFlag'] != "QuotaMet")]
-    df = df[(df['Q_TerminateFlag'] != "Screened")]
-
-    if country == "CH":
-        df = df[(df['screened_out'] != "true_region")]
-    
-    # update the dataframe in the dictionary
-    dataframes[country] = df
-
-# %% add response IDs
-
-# Get the total number of rows across all dataframes
-total_rows = sum(len(df) for df in dataframes.values())
-
-# Initialize an ID counter
-id_counter = 1
-
-# Assign unique IDs across all countries
-for country, df in dataframes.items():
-    # Create a new 'ID' column starting from the current id_counter
-    df['id'] = range(id_counter, id_counter + len(df))
-    
-    # Update the ID counter for the next dataframe
-    id_counter += len(df)
-
-    # Update the dataframe in the dictionary
-    dataframes[country] = df
-
-us_df = dataframes["US"]
-ch_df = dataframes["CH"]
-cn_df = dataframes["CN"]
-
-# %% clean data for LPA 
-
-# make justice columns numeric
-columns_to_num = ['justice_general_1', 
-                  'justice_general_2', 
-                  'justice_general_3', 
-                  'justice_general_4',
-                  'justice_tax_1', 
-                  'justice_tax_2', 
-                  'justice_tax_3',
-                  'justice_tax_4',
-                  'justice_subsidy_1',
-                  'justice_subsidy_2',
-                  'justice_subsidy_3',
-                  'justice_subsidy_4',
-                  ]
-
-for country, df in dataframes.items():
-    for col in columns_to_num:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    dataframes[country] = df
-
-lpa_data = []
-
-for country, df in dataframes.items():
-    cols = ['justice_general_1', 'justice_general_2', 'justice_general_3', 'justice_general_4',
-            'justice_tax_1', 'justice_tax_2', 'justice_tax_3', 'justice_tax_4',
-            'justice_subsidy_1', 'justice_subsidy_2', 'justice_subsidy_3', 'justice_subsidy_4', 'id']
-    
-    # create a new dataframe and add a 'country' column
-    df_selected = df[cols].copy()
-    df_selected['country'] = country
-    
-    # Append the new dataframe to the list
-    lpa_data.append(df_selected)
-
-lpa_data = pd.concat(lpa_data, ignore_index=True)
+
+# %% clean data for LPA
 
 justice_columns = {
-    'utilitarian': ['justice_general_1', 'justice_tax_1', 'justice_subsidy_1'], 
-    'egalitarian': ['justice_general_2', 'justice_tax_2', 'justice_subsidy_2'], 
-    'sufficientarian': ['justice_general_3', 'justice_tax_3', 'justice_subsidy_3'], 
+    'utilitarian': ['justice_general_1', 'justice_tax_1', 'justice_subsidy_1'],
+    'egalitarian': ['justice_general_2', 'justice_tax_2', 'justice_subsidy_2'],
+    'sufficientarian': ['justice_general_3', 'justice_tax_3', 'justice_subsidy_3'],
     'limitarian': ['justice_general_4', 'justice_tax_4', 'justice_subsidy_4']
 }
 
-# convert columns to numeric types
-for just_columns in justice_columns.values():
-    for col in just_columns:
-        lpa_data[col] = pd.to_numeric(lpa_data[col], errors='coerce')
-
-# get mean for each key and append to dataframe
-for key, just_columns in justice_columns.items():
-    lpa_data[key] = lpa_data[just_columns].mean(axis=1).round(3)
-
-lpa_input = lpa_data[[
-    'id', 
-    "country",
-    'utilitarian',
-    'egalitarian',
-    'sufficientarian',
-    'limitarian',
-]]
-
-lpa_data.to_csv("data/cjo_icc_input.csv")
-lpa_input.to_csv("data/lpa_input.csv")
+
+def lpa_tables(dataframes):
+    """Return the justice items of all countries, and their means per principle as the LPA input."""
+    # justice columns are already numeric from the survey schema
+    lpa_data = []
+
+    for country, df in dataframes.items():
+        cols = ['justice_general_1', 'justice_general_2', 'justice_general_3', 'justice_general_4',
+                'justice_tax_1', 'justice_tax_2', 'justice_tax_3', 'justice_tax_4',
+                'justice_subsidy_1', 'justice_subsidy_2', 'justice_subsidy_3', 'justice_subsidy_4', 'id']
+
+        # create a new dataframe and add a 'country' column
+        df_selected = df[cols].copy()
+        df_selected['country'] = country
+
+        # Append the new dataframe to the list
+        lpa_data.append(df_selected)
+
+    lpa_data = pd.concat(lpa_data, ignore_index=True)
+
+    # get mean for each key and append to dataframe
+    for key, just_columns in justice_columns.items():
+        lpa_data[key] = lpa_data[just_columns].mean(axis=1).round(3)
+
+    lpa_input = lpa_data[[
+        'id',
+        "country",
+        'utilitarian',
+        'egalitarian',
+        'sufficientarian',
+        'limitarian',
+    ]]
+    return lpa_data, lpa_input
+
+
+def write_tables(lpa_data, lpa_input, columnar=None, profile=None):
+    """Write the CJO inputs, the item matrix, and their typed copies if `columnar` is set."""
+    with stage("write", "cjo_preprocessing", profile) as timing:
+        lpa_data.to_csv("data/cjo_icc_input.csv")
+        lpa_input.to_csv("data/lpa_input.csv")
+
+        # respondent x item int8 matrix for the python cjo steps, see functions/items.py
+        write_item_matrix(lpa_data, ITEM_MATRIX)
+
+        # typed copies for the python cjo steps
+        if columnar is not None:
+            lpa_data['country'] = lpa_data['country'].astype("category")
+            write_columnar(lpa_data, columnar_path("data/cjo_icc_input.csv", columnar))
+            write_columnar(lpa_data[lpa_input.columns], columnar_path("data/lpa_input.csv", columnar))
+        timing.rows_out = len(lpa_data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepare the justice items of the clean data for the CJO steps.")
+    parser.parse_args(argv)
+
+    with open("config.yaml") as f:
+        config = yaml.safe_load(f)
+    columnar = config.get("columnar_format")
+    profile  = PROFILE_LOG if config.get("profile_stages", True) else None
+
+    dataframes = read_countries(CLEAN_FILES, columnar, profile)
+    lpa_data, lpa_input = lpa_tables(dataframes)
+    write_tables(lpa_data, lpa_input, columnar, profile)
+
+
+if __name__ == "__main__":
+    main()
 
 # %%
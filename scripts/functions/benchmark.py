@@ -0,0 +1,239 @@
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from functions.preprocessing import COUNTRIES
+from functions.profiling import PROFILE_LOG, read_log
+from functions.surcharges import LOOKUP_KEYS
+from functions.synthetic import EXPORT_NAMES, write_synthetic_export
+
+# scripts timed end to end, in pipeline order; each reads what the previous
+# one wrote
+BENCHMARK_STEPS = {
+    "preprocessing": "scripts/preprocessing/00_preprocessing_basics.py",
+    "cjo_preprocessing": "scripts/cjo/preprocessing.py",
+    "cjo_icc": "scripts/cjo/cjo_icc.py",
+}
+
+BENCHMARK_DIR = "output/benchmark"
+FIXTURE_DIR = ".cache/benchmark"
+
+
+def write_fixture(directory, respondents, columns, seed, lookup):
+    """Write synthetic exports of `respondents` responses in total, split over the countries.
+
+    The exports are reused when `directory` already holds a complete set, as
+    the larger ones take longer to write than to preprocess.
+    """
+    done = os.path.join(directory, ".complete")
+    if os.path.exists(done):
+        return directory
+    os.makedirs(directory, exist_ok=True)
+    seeds = np.random.SeedSequence(seed).spawn(len(COUNTRIES))
+    for country, country_seed in zip(COUNTRIES, seeds):
+        n = respondents // len(COUNTRIES)
+        write_synthetic_export(os.path.join(directory, EXPORT_NAMES[country]), country, n, country_seed,
+                               lookup=lookup, columns=columns)
+    open(done, "w").close()
+    return directory
+
+
+def prepare_workdir(repo, raw_dir, config):
+    """Return a scratch copy of the repo layout whose config points at `raw_dir`."""
+    workdir = tempfile.mkdtemp(prefix="aviation-benchmark-")
+    for name in ["scripts", "data-collection"]:
+        os.symlink(os.path.join(repo, name), os.path.join(workdir, name))
+    os.symlink(os.path.abspath(raw_dir), os.path.join(workdir, "raw-data"))
+    os.makedirs(os.path.join(workdir, "data", "interim"))
+    with open(os.path.join(workdir, "config.yaml"), "w") as f:
+        yaml.safe_dump({**config, "raw_dir": "raw-data", "preprocess_cache": False,
+                        "profile_stages": True}, f)
+    return workdir
+
+
+def run_step(script, workdir, run):
+    """Run one script in `workdir`; return its wall time, CPU time, peak RSS and exit status.
+
+    CPU time and peak RSS come from `wait4`, so they cover the script and
+    the worker processes it waited for.
+    """
+    env = {**os.environ, "PIPELINE_RUN_ID": run}
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, script], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # read stderr before waiting, so a chatty script cannot fill the pipe
+    stderr = process.stderr.read()
+    process.stderr.close()
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # kilobytes on linux, bytes on macos
+    peak = usage.ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+    return {
+        "status": "ok" if process.returncode == 0 else "error",
+        "wall_s": round(wall, 4),
+        "cpu_s": round(usage.ru_utime + usage.ru_stime, 4),
+        "peak_rss_mb": round(peak, 1),
+        "error": None if process.returncode == 0 else stderr.decode(errors="replace")[-2000:],
+    }
+
+
+def scaling_exponents(results):
+    """Return the slope of log wall time on log respondents of every step and column count.
+
+    1 means linear scaling; steps with fewer than two successful sizes are left out.
+    """
+    df = pd.DataFrame(results)
+    df = df[(df["status"] == "ok") & (df["wall_s"] > 0)]
+    exponents = []
+    for (step, columns), group in df.groupby(["step", "columns"]):
+        if group["respondents"].nunique() < 2:
+            continue
+        slope = np.polyfit(np.log(group["respondents"]), np.log(group["wall_s"]), 1)[0]
+        exponents.append({"step": step, "columns": int(columns), "exponent": round(float(slope), 3)})
+    return exponents
+
+
+def _git_commit(repo):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(repo, respondents, columns, seed=42, repeat=1, fixture_dir=FIXTURE_DIR, config=None,
+                  steps=BENCHMARK_STEPS, keep=False):
+    """Time the benchmark steps on synthetic exports of every size in `respondents` x `columns`.
+
+    Each step is run `repeat` times per size and the fastest run is kept,
+    with the stages it recorded through `functions.profiling.stage`.
+    Returns a json-ready dict.
+    """
+    if config is None:
+        with open(os.path.join(repo, "config.yaml")) as f:
+            config = yaml.safe_load(f)
+    started = datetime.now()
+    run = started.strftime("%Y%m%dT%H%M%S")
+    lookup_dir = tempfile.mkdtemp(prefix="aviation-benchmark-lookup-")
+    try:
+        # the add_cost lookup of wtp-tickets.py fills in the displayed ticket costs
+        os.symlink(os.path.join(repo, "scripts"), os.path.join(lookup_dir, "scripts"))
+        os.makedirs(os.path.join(lookup_dir, "data"))
+        subprocess.run([sys.executable, os.path.join(repo, "data-collection", "wtp-tickets.py")], cwd=lookup_dir,
+                       stdout=subprocess.DEVNULL, check=True)
+        lookup = pd.read_csv(os.path.join(lookup_dir, "data", "add_cost_lookup.csv"), index_col=LOOKUP_KEYS)
+
+        results = []
+        for n_columns in columns:
+            for n in respondents:
+                raw_dir = write_fixture(os.path.join(fixture_dir, f"n{n}_c{n_columns}_s{seed}"), n, n_columns,
+                                        seed, lookup)
+                workdir = prepare_workdir(repo, raw_dir, config)
+                shutil.copy(os.path.join(lookup_dir, "data", "add_cost_lookup.csv"), os.path.join(workdir, "data"))
+                try:
+                    for step, script in steps.items():
+                        best = None
+                        for i in range(repeat):
+                            step_run = f"{run}-{step}-n{n}-c{n_columns}-{i}"
+                            timing = run_step(script, workdir, step_run)
+                            timing["stages"] = [
+                                {key: record[key] for key in ["stage", "wall_s", "cpu_s", "peak_rss_mb",
+                                                              "rows_in", "rows_out", "bytes_read", "bytes_written"]}
+                                for record in read_log(os.path.join(workdir, PROFILE_LOG))
+                                if record["run"] == step_run
+                            ]
+                            if best is None or timing["status"] == "ok" and timing["wall_s"] < best["wall_s"]:
+                                best = timing
+                            if timing["status"] != "ok":
+                                break
+                        results.append({
+                            "step": step, "respondents": n, "columns": n_columns,
+                            "rows_per_s": round(n / best["wall_s"], 1) if best["status"] == "ok" else None,
+                            **best,
+                        })
+                        print(f"{step:<18} {n:>9,} x {n_columns:>5} {best['status']:>5} {best['wall_s']:9.2f}s "
+                              f"{best['peak_rss_mb']:8.0f} MB", file=sys.stderr)
+                        if best["status"] != "ok":
+                            # the later steps read what this one did not write
+                            break
+                finally:
+                    if not keep:
+                        shutil.rmtree(workdir)
+    finally:
+        shutil.rmtree(lookup_dir)
+
+    return {
+        "run": run,
+        "started": started.isoformat(timespec="seconds"),
+        "commit": _git_commit(repo),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": seed,
+        "results": results,
+        "scaling": scaling_exponents(results),
+    }
+
+
+def save_benchmark(result, directory=BENCHMARK_DIR):
+    """Write a benchmark result as `benchmark_<run>.json` and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"benchmark_{result['run']}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def latest_benchmark(directory=BENCHMARK_DIR, exclude=None):
+    """Return the most recent saved benchmark in `directory`, other than `exclude`, or None."""
+    if not os.path.isdir(directory):
+        return None
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith("benchmark_") and name.endswith(".json")
+    )
+    paths = [path for path in paths if exclude is None or os.path.abspath(path) != os.path.abspath(exclude)]
+    if not paths:
+        return None
+    with open(paths[-1]) as f:
+        return json.load(f)
+
+
+def compare_benchmarks(current, baseline, threshold=0.2):
+    """Return the steps whose throughput or peak memory got worse than `baseline` by more than `threshold`.
+
+    Sizes are matched on step, respondents and columns; sizes only in one
+    of the two runs are skipped. A step that ran in the baseline but fails
+    now is always reported.
+    """
+    key = lambda r: (r["step"], r["respondents"], r["columns"])
+    previous = {key(r): r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = previous.get(key(result))
+        if before is None or before["status"] != "ok":
+            continue
+        row = {"step": result["step"], "respondents": result["respondents"], "columns": result["columns"],
+               "rows_per_s": result["rows_per_s"], "baseline_rows_per_s": before["rows_per_s"],
+               "peak_rss_mb": result["peak_rss_mb"], "baseline_peak_rss_mb": before["peak_rss_mb"]}
+        if result["status"] != "ok":
+            row["regression"] = "failed"
+        elif result["rows_per_s"] < before["rows_per_s"] * (1 - threshold):
+            row["regression"] = "throughput"
+        elif result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + threshold):
+            row["regression"] = "memory"
+        else:
+            row["regression"] = None
+        rows.append(row)
+    return pd.DataFrame(rows)
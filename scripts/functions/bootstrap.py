@@ -0,0 +1,116 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+DEFAULT_RESAMPLES = 5000
+# replicates evaluated at once, bounds the (block, n) resample counts in memory
+DEFAULT_BLOCK = 1000
+
+
+def resample_entropy(seed=None):
+    """Return the entropy every block of resamples is drawn from; without a seed it is drawn once, fresh."""
+    return np.random.SeedSequence(seed).entropy
+
+
+def resample_indices(n_max, block_index, size, entropy):
+    """Draw one block of respondent resamples, as a (size, n_max) array of seeded integers.
+
+    Each block is drawn from its own child of the seed, so workers draw the
+    blocks they evaluate themselves and only one block is in memory at a
+    time; the same draws serve every group, as a group of `n` respondents
+    uses `group_indices(draws, n)`, so groups of the same size (e.g. the
+    principles of a country without skipped items) share their resamples,
+    and a rerun with the same seed and block size reproduces every
+    interval, whatever the number of workers.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(block_index,)))
+    return rng.integers(0, np.iinfo(np.uint32).max, size=(size, n_max), dtype=np.uint32, endpoint=True)
+
+
+def group_indices(draws, n):
+    """Return the resample indices of a group of `n` respondents from the shared draws."""
+    # the modulo bias is below n / 2**32, negligible for survey sizes
+    return (draws[:, :n] % n).astype(np.intp)
+
+
+def resample_counts(indices, n):
+    """Return how often each of `n` respondents is drawn in each resample, as a (resamples, n) array."""
+    offsets = np.arange(len(indices))[:, None] * n
+    counts = np.bincount((indices + offsets).ravel(), minlength=len(indices) * n)
+    return counts.reshape(len(indices), n).astype(float)
+
+
+def _share(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+# shared arrays attached in each worker, keyed like the inputs
+_shared = {}
+
+
+def _attach(specs):
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key] = (shm, np.ndarray(shape, np.dtype(dtype), buffer=shm.buf))
+
+
+def _replicates(statistic, arrays, entropy, start, stop, block):
+    n_max = max(len(x) for x in arrays.values())
+    out = {group: [] for group in arrays}
+    for i in range(start, stop, block):
+        draws = resample_indices(n_max, i // block, min(i + block, stop) - i, entropy)
+        for group, x in arrays.items():
+            n = len(x)
+            out[group].append(statistic(resample_counts(group_indices(draws, n), n), x))
+    return {group: np.concatenate(blocks) for group, blocks in out.items()}
+
+
+def _run_block(statistic, groups, entropy, start, stop, block):
+    arrays = {group: _shared[group][1] for group in groups}
+    return start, _replicates(statistic, arrays, entropy, start, stop, block)
+
+
+def bootstrap_groups(statistic, arrays, resamples=DEFAULT_RESAMPLES, seed=None, workers=1, block=DEFAULT_BLOCK):
+    """Evaluate `statistic` on every resample of every group, spreading replicates over processes.
+
+    `arrays` maps each group to an array with one row per respondent and
+    `statistic(counts, x)` maps the (block, n) resample counts of a group
+    and its array to one result per resample, so resamples are weighted
+    sums rather than copies of the data; it must be a module-level function
+    so the workers can import it. The input arrays are placed in shared
+    memory once, and each worker draws and evaluates a contiguous range of
+    whole blocks of replicates for all groups.
+    """
+    entropy = resample_entropy(seed)
+    if workers <= 1:
+        return _replicates(statistic, arrays, entropy, 0, resamples, block)
+
+    shared = [_share(np.ascontiguousarray(x)) for x in arrays.values()]
+    specs = dict(zip(arrays, (spec for _, spec in shared)))
+    # ranges start on block boundaries, so the blocks are the same as in one process
+    step = block * -(-resamples // (block * workers))
+    results = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(specs,)) as pool:
+            futures = [
+                pool.submit(_run_block, statistic, list(arrays), entropy, start, min(start + step, resamples), block)
+                for start in range(0, resamples, step)
+            ]
+            for future in futures:
+                start, out = future.result()
+                results[start] = out
+    finally:
+        for shm, _ in shared:
+            shm.close()
+            shm.unlink()
+    starts = sorted(results)
+    return {group: np.concatenate([results[s][group] for s in starts]) for group in arrays}
+
+
+def percentile_ci(replicates, level=0.95):
+    """Return the percentile interval of bootstrap replicates along their first axis."""
+    tail = (1 - level) / 2 * 100
+    return np.nanpercentile(replicates, [tail, 100 - tail], axis=0)
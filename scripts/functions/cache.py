@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+CACHE_DIR = ".cache/preprocessing"
+DIGEST_INDEX = os.path.join(CACHE_DIR, "digests.json")
+
+# code that decides what the clean data looks like: the preprocessing script,
+# exclusion rules, typo fixes, the survey schema, the reader, the surcharge
+# lookup and the columnar and wave store writers
+FUNCTIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+PREPROCESSING_CODE = [
+    os.path.join(FUNCTIONS_DIR, name)
+    for name in ["cube.py", "exclusions.py", "items.py", "preprocessing.py", "quality.py", "qualtrics.py",
+                 "respondents.py", "schema.py", "surcharges.py", "tables.py", "waves.py"]
+] + [os.path.join(os.path.dirname(FUNCTIONS_DIR), "preprocessing", "00_preprocessing_basics.py")]
+
+
+def _load_index():
+    try:
+        with open(DIGEST_INDEX) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # a temporary file of its own, parallel jobs save the index at the same time
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, DIGEST_INDEX)
+
+
+def _hash_file(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_digest(path):
+    """Return the sha256 of a file's bytes.
+
+    Digests are remembered by path, size and mtime, so a file is only rehashed
+    when it was rewritten; a re-download with identical bytes is hashed once
+    and then maps to the same digest.
+    """
+    stat = os.stat(path)
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    index = _load_index()
+    entry = index.get(os.path.abspath(path))
+    if entry is not None and entry["stamp"] == stamp:
+        return entry["digest"]
+    digest = _hash_file(path)
+    index[os.path.abspath(path)] = {"stamp": stamp, "digest": digest}
+    _save_index(index)
+    return digest
+
+
+def cache_key(inputs, settings=None, code=PREPROCESSING_CODE):
+    """Return a key for the content of `inputs`, the preprocessing code and `settings`."""
+    h = hashlib.sha256()
+    for path in list(inputs) + list(code):
+        h.update(file_digest(path).encode())
+    h.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def restore_outputs(key, outputs):
+    """Restore cached outputs for `key`, returning False if nothing is cached.
+
+    Outputs that already hold the cached bytes are left alone, so their
+    mtimes do not change.
+    """
+    entry = os.path.join(CACHE_DIR, key)
+    cached = {name: os.path.join(entry, name) for name in outputs}
+    if not all(os.path.exists(path) for path in cached.values()):
+        return False
+    for name, out in outputs.items():
+        if os.path.exists(out) and _hash_file(out) == _hash_file(cached[name]):
+            continue
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        shutil.copy2(cached[name], out)
+    return True
+
+
+def store_outputs(key, outputs):
+    """Copy freshly written outputs into the cache under `key`."""
+    entry = os.path.join(CACHE_DIR, key)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=CACHE_DIR, prefix=key + ".")
+    for name, out in outputs.items():
+        shutil.copy2(out, os.path.join(tmp, name))
+    shutil.rmtree(entry, ignore_errors=True)
+    try:
+        os.replace(tmp, entry)
+    except OSError:
+        # another job stored the same key first
+        shutil.rmtree(tmp, ignore_errors=True)
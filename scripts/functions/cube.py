@@ -0,0 +1,131 @@
+import os
+
+import pandas as pd
+
+from functions.qualtrics import DEFAULT_CHUNKSIZE
+
+# demographic and quota dimensions counted in the cube; personal_income is
+# left out, its brackets differ by country (see functions/schema.py)
+CUBE_DIMENSIONS = ["gender", "age", "ch_region", "flying_plan", "flying_ever", "education", "income"]
+
+CUBE_FILE = "data/demographic_cube.csv"
+# cube of the respondents of one partition of the clean store
+PARTITION_CUBE = "cube.csv"
+
+
+def count_cells(df, dimensions=CUBE_DIMENSIONS):
+    """Count the rows of `df` in every non-empty combination of `dimensions`, missing answers as their own cell.
+
+    Dimensions that are not columns of `df` are kept as empty columns, so
+    cubes of exports with other columns can be added up.
+    """
+    present = [d for d in dimensions if d in df.columns]
+    if present:
+        cells = df.groupby(present, dropna=False, observed=True).size().rename("n").reset_index()
+        cells[present] = cells[present].astype("string")
+    else:
+        cells = pd.DataFrame({"n": [len(df)]} if len(df) else {"n": []})
+    for d in dimensions:
+        if d not in present:
+            cells[d] = pd.Series(pd.NA, index=cells.index, dtype="string")
+    cells["n"] = cells["n"].astype("int64")
+    return cells[list(dimensions) + ["n"]]
+
+
+def count_file(path, dimensions=CUBE_DIMENSIONS, chunksize=DEFAULT_CHUNKSIZE):
+    """Return the cells of a clean csv, reading only the dimension columns in chunks."""
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [d for d in dimensions if d in header]
+    chunks = pd.read_csv(path, usecols=usecols, dtype="string", chunksize=chunksize,
+                         keep_default_na=False, na_values=[""])
+    return add_cells([count_cells(chunk, dimensions) for chunk in chunks], dimensions)
+
+
+def add_cells(frames, keys=CUBE_DIMENSIONS):
+    """Sum the counts of cell frames over `keys`, dropping the cells that end up empty."""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame({k: pd.Series(dtype="string") for k in keys} | {"n": pd.Series(dtype="int64")})
+    cells = pd.concat(frames, ignore_index=True)
+    cells = cells.groupby(list(keys), dropna=False, sort=False).n.sum().reset_index()
+    return cells[cells["n"] > 0].reset_index(drop=True)
+
+
+class DemographicCube:
+    """Respondent counts by country, wave and the demographic dimensions.
+
+    Only non-empty cells are stored. With the default dimensions most
+    combinations are rare, so the cube is not much smaller than the data
+    for a survey of this size (806 cells for 2,819 respondents), but it is
+    bounded by the number of combinations, a few thousand per country,
+    however many respondents there are; fewer dimensions keep it smaller.
+    Marginals, cross-tabs and quota shares are sums over its cells, without
+    reading the respondent-level data again.
+    """
+
+    def __init__(self, cells, dimensions=CUBE_DIMENSIONS):
+        self.dimensions = list(dimensions)
+        self.cells = cells[["country", "wave"] + self.dimensions + ["n"]].reset_index(drop=True)
+
+    @classmethod
+    def from_cells(cls, country, wave, cells, dimensions=CUBE_DIMENSIONS):
+        """Return the cube of one country and wave from the output of `count_cells`."""
+        return cls(cells.assign(country=country, wave=wave), dimensions)
+
+    @classmethod
+    def load(cls, path=CUBE_FILE):
+        cells = pd.read_csv(path, dtype="string", keep_default_na=False, na_values=[""])
+        cells["n"] = cells["n"].astype("int64")
+        return cls(cells, [c for c in cells.columns if c not in ("country", "wave", "n")])
+
+    def save(self, path=CUBE_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.cells.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+    def __len__(self):
+        return int(self.cells["n"].sum())
+
+    def add(self, other):
+        """Return the cube with the respondents of `other` added, e.g. those of a new wave."""
+        keys = ["country", "wave"] + self.dimensions
+        return DemographicCube(add_cells([self.cells, other.cells], keys), self.dimensions)
+
+    def slice(self, **selection):
+        """Return the cells matching `selection`, e.g. `slice(country="CH", age=["55y_64y", "65y_above"])`."""
+        mask = pd.Series(True, index=self.cells.index)
+        for column, values in selection.items():
+            values = [values] if isinstance(values, str) or not hasattr(values, "__iter__") else list(values)
+            mask &= self.cells[column].isin(values)
+        return DemographicCube(self.cells[mask], self.dimensions)
+
+    def counts(self, by, dropna=True):
+        """Return the number of respondents per combination of `by`, summed over all other columns."""
+        by = [by] if isinstance(by, str) else list(by)
+        return self.cells.groupby(by, dropna=dropna, observed=True)["n"].sum()
+
+    def crosstab(self, rows, columns, **selection):
+        """Return the counts of `rows` x `columns` as a table, over the cells matching `selection`."""
+        rows = [rows] if isinstance(rows, str) else list(rows)
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        return self.slice(**selection).counts(rows + columns).unstack(columns, fill_value=0)
+
+    def shares(self, dimension, by=("country",), **selection):
+        """Return the share of every category of `dimension` within each group of `by`, over non-missing answers."""
+        by = [by] if isinstance(by, str) else list(by)
+        counts = self.slice(**selection).counts(by + [dimension])
+        return counts / counts.groupby(level=by).transform("sum") if by else counts / counts.sum()
+
+    def quota_state(self, variables=None):
+        """Return the counts per country in the form of `functions.quotas.update_counts`, for `quota_table`."""
+        from functions.quotas import QUOTA_VARIABLES, country_variables
+
+        state = {}
+        for country, cells in self.cells.groupby("country", sort=False):
+            country_cube = DemographicCube(cells, self.dimensions)
+            counts = {}
+            for variable in country_variables(country, variables or QUOTA_VARIABLES):
+                if variable in self.dimensions:
+                    counts[variable] = {str(c): int(n) for c, n in country_cube.counts(variable).items()}
+            state[country] = {"n": len(country_cube), "counts": {v: c for v, c in counts.items() if c}}
+        return state
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+# exclusion rules in the order they are reported: (name, column, excluded
+# values, countries the rule applies to or None for all countries); a value
+# of None matches missing entries
+EXCLUSION_RULES = [
+    ("preview",     "DistributionChannel", ["preview"],     None),
+    ("unfinished",  "Finished",            [False],         None),
+    ("screened",    "screened_out",        ["true"],        None),
+    ("trap1",       "screened_out",        ["true_trap1"],  None),
+    ("trap2",       "screened_out",        ["true_trap2"],  None),
+    ("trap3",       "screened_out",        ["true_trap3"],  None),
+    ("quota_met",   "Q_TerminateFlag",     ["QuotaMet"],    None),
+    ("terminated",  "Q_TerminateFlag",     ["Screened"],    None),
+    ("region",      "screened_out",        ["true_region"], ["CH"]),
+]
+
+# used during fieldwork, where responses still in progress have no screening outcome yet
+SCREENING_MISSING_RULE = ("screening_missing", "screened_out", [None], None)
+
+
+def _codes(col):
+    """Return the categorical codes and levels of a column, reusing them if already categorical."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.codes.to_numpy(), col.cat.categories
+    codes, levels = pd.factorize(col, use_na_sentinel=True)
+    return codes, pd.Index(levels)
+
+
+def _rule_mask(codes, levels, values):
+    """Flag the rows whose code matches one of the excluded values."""
+    match = [levels.get_loc(v) for v in values if v is not None and v in levels]
+    if None in values:
+        match.append(-1)
+    return np.isin(codes, match)
+
+
+def exclusion_mask(df, country, rules=EXCLUSION_RULES):
+    """Return a boolean keep-mask for `df` and the number of rows excluded by each rule.
+
+    Each excluded row is counted under the first rule it fails, so the counts
+    add up to the total attrition. Rules for other countries and columns
+    missing from `df` exclude nothing but are still reported.
+    """
+    n = len(df)
+    excluded = np.zeros(n, dtype=bool)
+    counts = {}
+    coded = {}
+    for name, column, values, countries in rules:
+        if (countries is not None and country not in countries) or column not in df.columns:
+            counts[name] = 0
+            continue
+        if column not in coded:
+            coded[column] = _codes(df[column])
+        mask = _rule_mask(*coded[column], values)
+        counts[name] = int((mask & ~excluded).sum())
+        excluded |= mask
+    return ~excluded, pd.Series(counts, name=country, dtype="int64")
+
+
+def apply_exclusions(df, country, rules=EXCLUSION_RULES):
+    """Drop excluded responses in one pass, returning the kept rows and per-rule counts."""
+    keep, counts = exclusion_mask(df, country, rules)
+    return df.loc[keep], counts
@@ -0,0 +1,120 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from functions.reliability import CONTEXTS, PRINCIPLES
+
+# principle labels of the justice items, in item order
+PRINCIPLE_NAMES = {"1": "utilitarian", "2": "egalitarian", "3": "sufficientarian", "4": "limitarian"}
+
+# item `justice_{context}_{principle}` is column `principle * 3 + context`,
+# so the items of a principle are adjacent columns, sliced without copying
+# into the respondent x item arrays of `reliability.item_arrays`
+JUSTICE_ITEMS = [f"justice_{context}_{principle}" for principle in PRINCIPLES for context in CONTEXTS]
+
+# int8 stand-in for a missing answer, the items are 1-7 Likert ratings
+MISSING = -128
+
+ITEM_MATRIX = "data/justice_items.npy"
+
+
+def _sidecar(path, name):
+    return os.path.splitext(path)[0] + name
+
+
+def write_item_matrix(df, path=ITEM_MATRIX, group="country"):
+    """Write the justice items of `df` as a respondent x 12 int8 array, with its ids and metadata.
+
+    Rows are stored group by group in order of first appearance, so a group
+    is a contiguous block of rows. Next to `path` (a .npy file) go the
+    respondent ids (`_ids.npy`) and a json sidecar with the item order, the
+    principle of every column, the missing value sentinel and the row range
+    of each group.
+    """
+    groups = pd.unique(df[group])
+    df = pd.concat([df[df[group] == g] for g in groups])
+    values = df[JUSTICE_ITEMS].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.int8, shape=values.shape)
+    matrix[:] = np.where(np.isnan(values), MISSING, values).astype(np.int8)
+    matrix.flush()
+    del matrix
+    np.save(_sidecar(path, "_ids.npy"), df["id"].to_numpy(dtype=np.int64))
+
+    sizes = df[group].value_counts().reindex(groups).to_numpy()
+    starts = np.concatenate([[0], np.cumsum(sizes)])
+    meta = {
+        "items": JUSTICE_ITEMS,
+        "principles": [item.rsplit("_", 1)[1] for item in JUSTICE_ITEMS],
+        "contexts": [item.split("_")[1] for item in JUSTICE_ITEMS],
+        "principle_names": PRINCIPLE_NAMES,
+        "missing": MISSING,
+        "group": group,
+        "groups": {str(g): [int(start), int(stop)] for g, start, stop in zip(groups, starts[:-1], starts[1:])},
+    }
+    with open(_sidecar(path, ".json"), "w") as f:
+        json.dump(meta, f, indent=1)
+
+
+class ItemMatrix:
+    """The justice item matrix written by `write_item_matrix`, memory-mapped read-only.
+
+    Slicing a group or a principle only maps the pages it touches; values
+    are converted to float with NaN for missing answers on request.
+    """
+
+    def __init__(self, path=ITEM_MATRIX):
+        self.items = np.load(path, mmap_mode="r")
+        self.ids = np.load(_sidecar(path, "_ids.npy"), mmap_mode="r")
+        with open(_sidecar(path, ".json")) as f:
+            self.meta = json.load(f)
+        self.groups = {g: slice(*bounds) for g, bounds in self.meta["groups"].items()}
+
+    def __len__(self):
+        return len(self.items)
+
+    def scores(self, rows=slice(None)):
+        """Return the items of `rows` as floats, NaN where unanswered."""
+        x = self.items[rows].astype(float)
+        x[x == self.meta["missing"]] = np.nan
+        return x
+
+    def group_of(self):
+        """Return the group label of every row."""
+        labels = np.empty(len(self), dtype=object)
+        for g, rows in self.groups.items():
+            labels[rows] = g
+        return labels
+
+    def item_arrays(self):
+        """Return the respondent x item array of every group and principle, as `item_arrays` does.
+
+        Each array keeps the respondents who rated all items of the principle.
+        """
+        arrays = {}
+        for g, rows in self.groups.items():
+            items = self.items[rows].reshape(-1, len(PRINCIPLES), len(CONTEXTS))
+            for p, principle in enumerate(PRINCIPLES):
+                x = items[:, p]
+                arrays[(g, principle)] = x[(x != self.meta["missing"]).all(axis=1)].astype(float)
+        return arrays
+
+    def principle_means(self, decimals=3):
+        """Return the mean rating of every respondent per principle (the LPA input), NaN-aware."""
+        x = self.scores().reshape(len(self), len(PRINCIPLES), len(CONTEXTS))
+        answered = (~np.isnan(x)).sum(axis=2)
+        with np.errstate(invalid="ignore"):
+            means = np.nansum(x, axis=2) / answered
+        return pd.DataFrame(np.round(means, decimals), columns=[PRINCIPLE_NAMES[p] for p in PRINCIPLES])
+
+    def long(self):
+        """Return the ratings in long format (id, principle, context, score) without string parsing."""
+        n, k = self.items.shape
+        column = np.tile(np.arange(k), n)
+        return pd.DataFrame({
+            "id": np.repeat(self.ids, k),
+            "principle": pd.Categorical.from_codes(column // len(CONTEXTS), categories=PRINCIPLES),
+            "context": pd.Categorical.from_codes(column % len(CONTEXTS), categories=CONTEXTS),
+            "score": self.scores().ravel(),
+        })
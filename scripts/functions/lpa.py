@@ -0,0 +1,263 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# mclust names of the covariance structures, and the tidyLPA arguments they
+# correspond to: EEI (variances = "equal", covariances = "zero") is what
+# justice_lpa.R fits
+MODELS = {
+    "EEI": ("equal", "zero"),
+    "VVI": ("varying", "zero"),
+    "EEE": ("equal", "equal"),
+    "VVV": ("varying", "varying"),
+}
+
+DEFAULT_MAX_CLASSES = 8
+DEFAULT_RESTARTS = 20
+# added to the variances, keeps a class that collapses onto one point finite
+REG_COVAR = 1e-6
+# EM stops once the log-likelihood changes by at most TOL relative to itself;
+# starts ending within REPLICATION_TOLS of these steps of the best fit count
+# as replicating it, since EM stops short of the optimum by about that much
+TOL = 1e-6
+REPLICATION_TOLS = 10
+
+
+def kmeans(x, centres, max_iter=100):
+    """Run Lloyd's k-means from `centres`; return the converged centres and labels."""
+    centres = centres.copy()
+    labels = None
+    for _ in range(max_iter):
+        new = _nearest(x, centres)
+        if labels is not None and np.array_equal(new, labels):
+            break
+        labels = new
+        sums = np.zeros_like(centres)
+        np.add.at(sums, labels, x)
+        counts = np.bincount(labels, minlength=len(centres))
+        filled = counts > 0
+        centres[filled] = sums[filled] / counts[filled, None]
+    return centres, labels
+
+
+def _sq_distances(x, centres):
+    # (k, n): reductions over the few classes then run along contiguous rows
+    return (centres ** 2).sum(axis=1)[:, None] - 2 * centres @ x.T + (x ** 2).sum(axis=1)
+
+
+def _nearest(x, centres):
+    return _sq_distances(x, centres).argmin(axis=0)
+
+
+def kmeans_chain(x, max_classes, rng):
+    """Return k-means centres for 1..`max_classes` classes, each warm-started from the previous one.
+
+    The solution for k classes starts from the k - 1 converged centres plus
+    one new centre drawn k-means++ style (proportional to the squared
+    distance to the nearest centre), so neighbouring class counts share
+    their starting points and only the new class has to be placed.
+    """
+    centres = x.mean(axis=0, keepdims=True)
+    chain = [centres]
+    for _ in range(1, max_classes):
+        distances = np.maximum(_sq_distances(x, centres).min(axis=0), 0)
+        total = distances.sum()
+        pick = rng.choice(len(x), p=distances / total) if total > 0 else rng.integers(len(x))
+        centres, _ = kmeans(x, np.vstack([centres, x[pick]]))
+        chain.append(centres)
+    return chain
+
+
+# the EM steps work on the transposed data, (d, n), and (k, n)
+# responsibilities, so that sums over classes and indicators are taken
+# along contiguous rows
+
+def _log_densities(xt, means, covariances, model):
+    # (k, n) log normal densities of every row under every class
+    d = len(xt)
+    if model[-1] == "I":
+        # diagonal covariances, stored as (k, d) variances
+        precision = 1 / covariances
+        quad = (precision @ xt ** 2 - 2 * (means * precision) @ xt
+                + (means ** 2 * precision).sum(axis=1)[:, None])
+        return -0.5 * (d * np.log(2 * np.pi) + np.log(covariances).sum(axis=1)[:, None] + quad)
+    chol = np.linalg.cholesky(covariances)
+    z = np.linalg.inv(chol) @ (xt[None] - means[:, :, None])
+    log_det = np.log(np.diagonal(chol, axis1=1, axis2=2)).sum(axis=1)
+    return -0.5 * (d * np.log(2 * np.pi) + (z ** 2).sum(axis=1)) - log_det[:, None]
+
+
+def _m_step(xt, resp, model):
+    d, n = xt.shape
+    nk = resp.sum(axis=1) + 10 * np.finfo(float).eps
+    weights = nk / n
+    means = resp @ xt.T / nk[:, None]
+    if model[-1] == "I":
+        variances = resp @ (xt ** 2).T / nk[:, None] - means ** 2
+        if model[0] == "E":
+            variances = np.broadcast_to((weights[:, None] * variances).sum(axis=0), variances.shape)
+        return weights, means, np.maximum(variances, 0) + REG_COVAR
+    diff = xt[None] - means[:, :, None]
+    covariances = (diff * resp[:, None, :]) @ diff.transpose(0, 2, 1) / nk[:, None, None]
+    if model[0] == "E":
+        covariances[:] = (weights[:, None, None] * covariances).sum(axis=0)
+    return weights, means, covariances + REG_COVAR * np.eye(d)
+
+
+def _e_step(xt, weights, means, covariances, model):
+    weighted = _log_densities(xt, means, covariances, model) + np.log(weights)[:, None]
+    top = weighted.max(axis=0)
+    log_norm = top + np.log(np.exp(weighted - top).sum(axis=0))
+    return np.exp(weighted - log_norm), log_norm.sum()
+
+
+def _fit(xt, centres, model, tol=TOL, max_iter=500):
+    resp = (_nearest(xt.T, centres) == np.arange(len(centres))[:, None]).astype(float)
+    params = _m_step(xt, resp, model)
+    loglik = -np.inf
+    converged = False
+    for _ in range(max_iter):
+        resp, new = _e_step(xt, *params, model)
+        params = _m_step(xt, resp, model)
+        if abs(new - loglik) <= tol * abs(new):
+            loglik, converged = new, True
+            break
+        loglik = new
+    return {"weights": params[0], "means": params[1], "covariances": params[2],
+            "loglik": loglik, "converged": converged}
+
+
+def fit_gmm(x, centres, model="EEI", tol=TOL, max_iter=500):
+    """Fit a Gaussian mixture by EM, starting from the k-means partition around `centres`.
+
+    Returns the weights, means and covariances (variances for the diagonal
+    models), the log-likelihood, and whether EM converged.
+    """
+    return _fit(np.ascontiguousarray(x.T), centres, model, tol, max_iter)
+
+
+def posterior(x, fit, model):
+    """Return the class probabilities of every row under a fitted mixture, as an (n, k) array."""
+    xt = np.ascontiguousarray(np.asarray(x, dtype=float).T)
+    return _e_step(xt, fit["weights"], fit["means"], fit["covariances"], model)[0].T
+
+
+def n_parameters(model, k, d):
+    """Return the number of free parameters of a mixture, counted as mclust does."""
+    variance = {"EEI": d, "VVI": k * d, "EEE": d * (d + 1) // 2, "VVV": k * d * (d + 1) // 2}[model]
+    return (k - 1) + k * d + variance
+
+
+def fit_statistics(x, fit, model):
+    """Return the tidyLPA fit indices of one mixture, plus the size of the smallest class.
+
+    Information criteria are on the -2 log-likelihood scale (lower is
+    better), except ICL, which keeps the mclust sign as in tidyLPA's table.
+    """
+    n, d = x.shape
+    k = len(fit["weights"])
+    p = n_parameters(model, k, d)
+    loglik = fit["loglik"]
+    prob = posterior(x, fit, model)
+    classes = prob.argmax(axis=1)
+    log_prob = np.log(np.clip(prob, np.finfo(float).tiny, None))
+    entropy = 1.0 if k == 1 else 1 + (prob * log_prob).sum() / (n * np.log(k))
+    assigned = prob[np.arange(n), classes]
+    sizes = np.bincount(classes, minlength=k)
+    # average posterior probability of the respondents assigned to each class
+    avg_prob = np.bincount(classes, weights=assigned, minlength=k)[sizes > 0] / sizes[sizes > 0]
+    return {
+        "LogLik": loglik,
+        "parameters": p,
+        "AIC": -2 * loglik + 2 * p,
+        "AWE": -2 * loglik + 2 * p * (1.5 + np.log(n)),
+        "BIC": -2 * loglik + p * np.log(n),
+        "SABIC": -2 * loglik + p * np.log((n + 2) / 24),
+        "ICL": 2 * loglik - p * np.log(n) + 2 * np.log(assigned).sum(),
+        "entropy": entropy,
+        "prob_min": avg_prob.min(),
+        "prob_max": avg_prob.max(),
+        "min_proportion": round(sizes.min() / n * 100, 1),
+        "n": n,
+    }
+
+
+# data of every subset, set once per worker
+_data = {}
+
+
+def _init(data):
+    _data.update(data)
+
+
+def _fit_cell(subset, model, starts):
+    # every restart of one subset x model x class count; the best fit by
+    # log-likelihood is kept
+    x = _data[subset]
+    xt = np.ascontiguousarray(x.T)
+    fits = [_fit(xt, centres, model) for centres in starts]
+    logliks = np.array([fit["loglik"] for fit in fits])
+    best = fits[int(np.nanargmax(logliks))]
+    stats = fit_statistics(x, best, model)
+    stats["distinct_starts"] = len(fits)
+    stats["converged"] = sum(fit["converged"] for fit in fits)
+    # distinct starts reaching the best log-likelihood, up to the convergence
+    # tolerance; one out of several means a local optimum is possible, one out
+    # of one only that every k-means chain found the same centres
+    window = REPLICATION_TOLS * TOL * abs(best["loglik"])
+    stats["replicated"] = int((np.abs(logliks - best["loglik"]) <= window).sum())
+    return stats, best
+
+
+def lpa_grid(data, models=("EEI",), max_classes=DEFAULT_MAX_CLASSES, restarts=DEFAULT_RESTARTS,
+             seed=None, workers=1):
+    """Fit every subset x covariance model x 1..`max_classes` classes, and tabulate the fit statistics.
+
+    `data` maps a subset name to its respondent x indicator array; rows
+    with missing values are dropped. Each restart is one k-means chain
+    (`kmeans_chain`), shared by all models, whose centres start EM for each
+    class count. The cells run in a process pool. Returns the table, one
+    row per subset, model and class count, and the best fit of every cell.
+    """
+    data = {subset: np.asarray(x, dtype=float) for subset, x in data.items()}
+    data = {subset: x[~np.isnan(x).any(axis=1)] for subset, x in data.items()}
+    seeds = np.random.SeedSequence(seed).spawn(len(data))
+    chains = {
+        subset: [kmeans_chain(x, max_classes, np.random.default_rng(s)) for s in subset_seed.spawn(restarts)]
+        for (subset, x), subset_seed in zip(data.items(), seeds)
+    }
+    cells = [(subset, model, k) for subset in data for model in models for k in range(1, max_classes + 1)]
+    # restarts whose chains found the same centres are fitted once (always at k = 1)
+    jobs = [
+        (subset, model, list({chain[k - 1].tobytes(): chain[k - 1] for chain in chains[subset]}.values()))
+        for subset, model, k in cells
+    ]
+    if workers <= 1:
+        _init(data)
+        results = [_fit_cell(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init, initargs=(data,)) as pool:
+            # largest class counts first, they take longest
+            order = sorted(range(len(jobs)), key=lambda i: -cells[i][2])
+            futures = {i: pool.submit(_fit_cell, *jobs[i]) for i in order}
+            results = [futures[i].result() for i in range(len(jobs))]
+
+    rows = [{"subset": subset, "model": model, "G": k, "starts": restarts, **stats}
+            for (subset, model, k), (stats, _) in zip(cells, results)]
+    fits = {cell: fit for cell, (_, fit) in zip(cells, results)}
+    return pd.DataFrame(rows), fits
+
+
+def assign_classes(x, fit, model):
+    """Return the most likely class (numbered from 1, by decreasing size) of every row, NaN where `x` is incomplete."""
+    x = np.asarray(x, dtype=float)
+    complete = ~np.isnan(x).any(axis=1)
+    classes = posterior(x[complete], fit, model).argmax(axis=1)
+    # number the classes by size so the labels do not depend on the restart
+    order = np.argsort(-np.bincount(classes, minlength=len(fit["weights"])), kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    out = np.full(len(x), np.nan)
+    out[complete] = rank[classes] + 1
+    return pd.array(out, dtype="Int64")
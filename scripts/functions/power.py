@@ -0,0 +1,143 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# design of power-analysis.R: every participant rates each justice framing
+# under each emissions reduction, `repeats` times (control and treatment
+# condition, and replicate blocks)
+JUSTICE_LEVELS = 4
+EMISSIONS_LEVELS = 3
+
+DEFAULT_BATCH_ELEMENTS = 5_000_000
+DEFAULT_MIN_SIMS = 200
+DEFAULT_MAX_SIMS = 5000
+
+
+def design_matrix(interaction=True, justice=JUSTICE_LEVELS, emissions=EMISSIONS_LEVELS, repeats=2):
+    """Return the fixed-effects design of one participant, treatment-coded like lme4 factors.
+
+    Rows are the participant's ratings in (repeat, justice, emissions)
+    order; columns are the intercept, the main effects and, with
+    `interaction`, the justice x emissions terms.
+    """
+    j, e = np.meshgrid(np.arange(justice), np.arange(emissions), indexing="ij")
+    j, e = np.tile(j.ravel(), repeats), np.tile(e.ravel(), repeats)
+    dummies_j = (j[:, None] == np.arange(1, justice)).astype(float)
+    dummies_e = (e[:, None] == np.arange(1, emissions)).astype(float)
+    columns = [np.ones((len(j), 1)), dummies_j, dummies_e]
+    if interaction:
+        columns.append((dummies_j[:, :, None] * dummies_e[:, None, :]).reshape(len(j), -1))
+    return np.hstack(columns)
+
+
+def simulate_wtc(rng, sims, n, effect, noise=1.0, participant_sd=1.0,
+                 justice=JUSTICE_LEVELS, emissions=EMISSIONS_LEVELS, repeats=2):
+    """Simulate `sims` stacked data sets of the power-analysis.R design, as a (sims, n, cells) array.
+
+    wtc = 1 + 0.5 justice + 0.3 emissions + `effect` justice x emissions,
+    plus a normal random intercept per participant and normal noise, with
+    the levels numbered from 1 as in the R script.
+    """
+    j, e = np.meshgrid(np.arange(1, justice + 1), np.arange(1, emissions + 1), indexing="ij")
+    mean = np.tile((1 + 0.5 * j + 0.3 * e + effect * j * e).ravel(), repeats)
+    intercepts = rng.normal(0, participant_sd, size=(sims, n, 1))
+    return mean + intercepts + rng.normal(0, noise, size=(sims, n, len(mean)))
+
+
+def _max_loglik(y, design):
+    # ML fit of y ~ design + (1 | participant) for a (sims, n, m) batch where
+    # every participant has the same design: the fixed effects are the pooled
+    # OLS estimates and the variance components follow from the within- and
+    # between-participant residual sums of squares
+    sims, n, m = y.shape
+    hat = design @ np.linalg.pinv(design)
+    resid = y - (y.mean(axis=1) @ hat.T)[:, None, :]
+    means = resid.mean(axis=2)
+    ss_between = m * (means ** 2).sum(axis=1)
+    ss_within = ((resid - means[:, :, None]) ** 2).sum(axis=(1, 2))
+
+    sigma2 = ss_within / (n * (m - 1))
+    lambda1 = ss_between / n
+    # the participant variance is estimated at zero when the between-participant
+    # spread is below the residual variance
+    boundary = lambda1 < sigma2
+    pooled = (ss_within + ss_between) / (n * m)
+    sigma2 = np.where(boundary, pooled, sigma2)
+    lambda1 = np.where(boundary, pooled, lambda1)
+    return -0.5 * (n * m * np.log(2 * np.pi) + n * (m - 1) * np.log(sigma2) + n * np.log(lambda1)
+                   + ss_within / sigma2 + ss_between / lambda1)
+
+
+def interaction_lr_test(y, repeats=2, justice=JUSTICE_LEVELS, emissions=EMISSIONS_LEVELS):
+    """Return the likelihood-ratio p-values of the justice x emissions interaction for a stacked batch.
+
+    Both models are fit by maximum likelihood with a random intercept per
+    participant, as simr's `fixed(..., "lr")` test does with lmer.
+    """
+    # imported here, scipy.stats is slow to import
+    from scipy.stats import chi2
+
+    full = design_matrix(True, justice, emissions, repeats)
+    reduced = design_matrix(False, justice, emissions, repeats)
+    lr = 2 * (_max_loglik(y, full) - _max_loglik(y, reduced))
+    return chi2.sf(np.maximum(lr, 0), full.shape[1] - reduced.shape[1])
+
+
+def wilson_interval(successes, trials, level=0.95):
+    """Return the Wilson score interval of a binomial proportion."""
+    from scipy.stats import norm
+
+    z = norm.ppf(1 - (1 - level) / 2)
+    p = successes / trials
+    centre = (p + z ** 2 / (2 * trials)) / (1 + z ** 2 / trials)
+    half = z * np.sqrt(p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)) / (1 + z ** 2 / trials)
+    return centre - half, centre + half
+
+
+def power_cell(n, effect, noise=1.0, seed=None, alpha=0.05, repeats=2, ci_width=0.02,
+               min_sims=DEFAULT_MIN_SIMS, max_sims=DEFAULT_MAX_SIMS, batch_elements=DEFAULT_BATCH_ELEMENTS):
+    """Estimate the power to detect the interaction for one sample size, effect size and noise level.
+
+    Replicates are simulated and tested in stacked batches of about
+    `batch_elements` ratings. Simulation stops once the 95% Wilson interval
+    of the power is narrower than `ci_width` (after at least `min_sims`
+    replicates) or after `max_sims` replicates.
+    """
+    rng = np.random.default_rng(seed)
+    m = JUSTICE_LEVELS * EMISSIONS_LEVELS * repeats
+    batch = max(1, batch_elements // (n * m))
+    sims = significant = 0
+    while sims < max_sims:
+        size = min(batch, max_sims - sims)
+        y = simulate_wtc(rng, size, n, effect, noise, repeats=repeats)
+        significant += int((interaction_lr_test(y, repeats) < alpha).sum())
+        sims += size
+        low, high = wilson_interval(significant, sims)
+        if sims >= min_sims and high - low < ci_width:
+            break
+    low, high = wilson_interval(significant, sims)
+    return {"n": n, "effect": effect, "noise": noise, "sims": sims,
+            "power": significant / sims, "ci_low": low, "ci_high": high}
+
+
+def _power_cell(args):
+    kwargs, seed = args
+    return power_cell(seed=seed, **kwargs)
+
+
+def power_grid(sample_sizes, effects, noises=(1.0,), seed=None, workers=None, **kwargs):
+    """Estimate the power over the grid of sample sizes, effect sizes and noise levels.
+
+    Grid cells run in a process pool, each with its own generator spawned
+    from `seed`; `kwargs` are passed to `power_cell`.
+    """
+    cells = [dict(n=n, effect=effect, noise=noise, **kwargs)
+             for n, effect, noise in itertools.product(sample_sizes, effects, noises)]
+    seeds = np.random.SeedSequence(seed).spawn(len(cells))
+    if workers == 1:
+        results = map(_power_cell, zip(cells, seeds))
+        return pd.DataFrame(list(results))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return pd.DataFrame(list(pool.map(_power_cell, zip(cells, seeds))))
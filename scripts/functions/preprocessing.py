@@ -0,0 +1,183 @@
+import itertools
+import sys
+
+import pandas as pd
+
+from functions.cube import CUBE_DIMENSIONS
+from functions.exclusions import apply_exclusions
+from functions.quality import SPEEDER_QUANTILE
+from functions.qualtrics import DEFAULT_CHUNKSIZE, iter_qualtrics, read_header, select_columns
+from functions.schema import apply_schema, summarize_issues
+from functions.respondents import DEDUP_KEYS, key_columns, key_hashes
+from functions.surcharges import LOOKUP_KEYS, attach_add_cost, no_surcharge_shown
+
+# response ids are numbered consecutively across countries in this order
+COUNTRIES = ["US", "CH", "CN"]
+
+
+def preprocessing_settings(config):
+    """Return the config settings that change the clean data, as keyed by the preprocessing cache.
+
+    Shared by 00_preprocessing_basics.py and the Snakefile's raw digest, so
+    both change with the same settings.
+    """
+    return {
+        "columns": config.get("preprocess_columns"),
+        "patterns": config.get("preprocess_column_patterns", []),
+        "columnar": config.get("columnar_format"),
+        "keys": config.get("dedup_keys") or DEDUP_KEYS,
+        "cube": config.get("cube_dimensions") or CUBE_DIMENSIONS,
+        "speeders": config.get("speeder_quantile", SPEEDER_QUANTILE),
+        "fielded": config.get("add_cost_fielded", False),
+    }
+
+
+def fix_typos(df, country):
+    """Fix known typos in the Qualtrics exports of one country."""
+    if country == "US":
+        df["personal_income"] = df["personal_income"].replace("15k_35k", "15k_25k")
+    else:
+        df = df.rename(columns={"recent_flights": "flying_recent_number"})
+    return df
+
+
+def _mismatch_issues(mismatches):
+    value = [f"{r:g} reconstructed, {d:g} displayed"
+             for r, d in zip(mismatches["reconstructed"], mismatches["displayed"])]
+    return pd.DataFrame({"column": "add_cost", "value": value, "n": mismatches["n"].to_numpy()})
+
+
+def _not_shown_issues(df):
+    # reported apart from the mismatches: the lookup and the R analyses give
+    # these respondents 0, so they are not a disagreement about the value
+    n = int(no_surcharge_shown(df).sum()) if len(df) else 0
+    return pd.DataFrame({"column": "add_cost_not_shown", "value": "", "n": [n] if n else []})
+
+
+def preprocess_country(country, file_name, out_file, columns=None, patterns=(),
+                       chunksize=DEFAULT_CHUNKSIZE, lookup_file=None, skip_ids=None, key_file=None,
+                       keys=DEDUP_KEYS, fielded=False):
+    """Stream one raw export, drop excluded responses, fix typos, and write it without ids.
+
+    With `lookup_file` (written by wtp-tickets.py) the surcharge shown to
+    each respondent is attached as `add_cost`, as the fielded scripts showed
+    it with `fielded` (see `attach_add_cost`). Responses whose ResponseId is
+    in `skip_ids` (e.g. ingested from an earlier wave) are dropped before
+    anything else. With `key_file`, the respondent key hashes of the kept
+    rows (see `key_hashes`) are written there in the same row order, for
+    `flag_duplicates`; the key columns themselves only reach `out_file` if
+    requested. Returns the number of rows excluded per rule plus the number
+    of rows kept, and the values that fall outside the survey schema or
+    disagree with the displayed surcharge.
+    """
+    lookup = None
+    if lookup_file is not None:
+        lookup = pd.read_csv(lookup_file, index_col=LOOKUP_KEYS)
+    read_columns = columns
+    extra = []
+    if key_file is not None and columns is not None:
+        extra = [col for col in key_columns(keys) if col not in columns]
+        read_columns = list(columns) + extra
+    header_written = False
+    country_counts = []
+    issues = []
+    n_kept = 0
+    chunks = iter_qualtrics(file_name, read_columns, patterns, chunksize)
+    # an export without responses still gets its header and zero counts
+    empty = pd.DataFrame(columns=select_columns(read_header(file_name), read_columns, patterns))
+    for chunk in itertools.chain(chunks, [empty]):
+        if header_written and chunk is empty:
+            break
+        if skip_ids is not None:
+            chunk = chunk[~chunk["ResponseId"].isin(skip_ids)]
+        df, counts = apply_exclusions(chunk, country)
+        country_counts.append(counts)
+        df = fix_typos(df.copy(), country)
+        df, chunk_issues = apply_schema(df)
+        issues.append(chunk_issues)
+        if lookup is not None:
+            df, mismatches = attach_add_cost(df, country, lookup, fielded)
+            issues.append(_mismatch_issues(mismatches))
+            issues.append(_not_shown_issues(df))
+        n_kept += len(df)
+
+        if key_file is not None:
+            key_hashes(df, keys).to_csv(key_file, mode='a' if header_written else 'w',
+                                        header=not header_written, index=False)
+            df = df.drop(columns=[col for col in extra if col in df.columns])
+        df.to_csv(out_file, mode='a' if header_written else 'w',
+                  header=not header_written, index=False)
+        header_written = True
+
+    kept = pd.Series({"kept": n_kept})
+    return pd.concat([sum(country_counts), kept]).rename(country), summarize_issues(issues)
+
+
+def report_issues(issues, country):
+    """Print the values of one country that fall outside the survey schema or the surcharge lookup."""
+    for row in issues.itertuples(index=False):
+        if row.column == "add_cost_not_shown":
+            print(f"{country}: {row.n} response(s) were shown no surcharge value by the fielded ticket script "
+                  "(control, or long-haul prioritarian without tourism flights)", file=sys.stderr)
+            continue
+        if row.column == "add_cost":
+            print(f"{country}: add_cost differs from the survey for {row.n} response(s): {row.value}",
+                  file=sys.stderr)
+            continue
+        print(f"{country}: {row.column} has {row.n} value(s) outside the schema: {row.value!r}",
+              file=sys.stderr)
+
+
+def id_offsets(n_kept):
+    """Return the first response id of each country given its number of kept rows."""
+    offsets = {}
+    id_counter = 1
+    for country in COUNTRIES:
+        offsets[country] = id_counter
+        id_counter += n_kept[country]
+    return offsets
+
+
+def assign_ids(in_file, out_file, first_id, chunksize=DEFAULT_CHUNKSIZE, drop=None):
+    """Copy a filtered country file to `out_file`, numbering rows from `first_id`.
+
+    Values are passed through as text so the copy matches what was filtered.
+    Rows flagged in the boolean array `drop` (e.g. duplicates) are left out
+    and get no id.
+    """
+    header_written = False
+    id_counter = first_id
+    position = 0
+    with pd.read_csv(in_file, chunksize=chunksize, dtype=str, na_filter=False) as reader:
+        for df in reader:
+            if drop is not None:
+                keep = ~drop[position:position + len(df)]
+                position += len(df)
+                df = df[keep]
+            df['id'] = range(id_counter, id_counter + len(df))
+            id_counter += len(df)
+
+            df.to_csv(out_file, mode='a' if header_written else 'w',
+                      header=not header_written, index=False)
+            header_written = True
+
+
+def read_key_hashes(key_file, keys=DEDUP_KEYS):
+    """Read the key hashes written by `preprocess_country`."""
+    dtypes = {"ResponseId": "string", **{key: "UInt64" for key in keys}}
+    header = pd.read_csv(key_file, nrows=0).columns
+    return pd.read_csv(key_file, dtype={col: dtypes[col] for col in header if col in dtypes})
+
+
+def flag_duplicates(index, key_file, country, wave=None, partition=None):
+    """Check the kept rows of one export against the respondent index; return the duplicate mask and report."""
+    return index.claim(read_key_hashes(key_file, index.keys), country, wave, partition)
+
+
+def add_duplicates(counts, n_duplicates):
+    """Move the duplicates of one export from its kept rows to a `duplicate` rule, reported just before kept."""
+    kept = counts["kept"]
+    counts = counts.drop("kept")
+    counts["duplicate"] = n_duplicates
+    counts["kept"] = kept - n_duplicates
+    return counts
@@ -0,0 +1,194 @@
+import csv
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# stage records of the python and R scripts, one json object per line
+PROFILE_LOG = "output/profile/stages.jsonl"
+# per-rule snakemake benchmarks, appended after every successful run
+RULE_LOG = "output/profile/rules.jsonl"
+
+
+def run_id():
+    """Return the id shared by all jobs of one pipeline run, set by the Snakefile.
+
+    Run outside snakemake, the first call sets it to the current time in the
+    environment, so every later stage of the process and the workers it
+    starts record the same id.
+    """
+    if not os.environ.get("PIPELINE_RUN_ID"):
+        os.environ["PIPELINE_RUN_ID"] = datetime.now().strftime("%Y%m%dT%H%M%S")
+    return os.environ["PIPELINE_RUN_ID"]
+
+
+def _io_bytes():
+    # bytes read and written by this process, including page-cache hits; only
+    # available on linux
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+class Stage:
+    """Counters of one profiled stage; set `rows_in` and `rows_out` inside the block."""
+
+    def __init__(self, name, rule):
+        self.name = name
+        self.rule = rule
+        self.rows_in = None
+        self.rows_out = None
+
+
+def append_record(record, log=PROFILE_LOG):
+    os.makedirs(os.path.dirname(log) or ".", exist_ok=True)
+    with open(log, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def stage(name, rule=None, log=PROFILE_LOG):
+    """Record wall time, CPU time, peak RSS, rows and bytes of the enclosed block.
+
+    The record is appended to `log` when the block exits, also on errors;
+    `log=None` disables profiling. Peak RSS is the peak of the process so
+    far, so the first stage that exceeds the previous peak is the one to
+    look at.
+    """
+    record = Stage(name, rule)
+    if log is None:
+        yield record
+        return
+    read0, written0 = _io_bytes()
+    cpu0 = time.process_time()
+    wall0 = time.perf_counter()
+    started = datetime.now().isoformat(timespec="seconds")
+    status = "error"
+    try:
+        yield record
+        status = "ok"
+    finally:
+        read1, written1 = _io_bytes()
+        append_record({
+            "run": run_id(),
+            "rule": rule or "local",
+            "stage": name,
+            "lang": "python",
+            "started": started,
+            "status": status,
+            "wall_s": round(time.perf_counter() - wall0, 4),
+            "cpu_s": round(time.process_time() - cpu0, 4),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "rows_in": record.rows_in,
+            "rows_out": record.rows_out,
+            "bytes_read": None if read0 is None else read1 - read0,
+            "bytes_written": None if written0 is None else written1 - written0,
+        }, log)
+
+
+def read_log(path):
+    """Return the records of a profile log as a list of dicts, skipping torn lines."""
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return records
+
+
+def collect_benchmarks(directory, log=RULE_LOG, since=0.0):
+    """Append the snakemake benchmarks written since `since` (a timestamp) to the rule log.
+
+    Benchmark files are named after their rule (`{rule}.tsv`, with the
+    wildcards appended); snakemake reports io in MB, converted here to bytes
+    so rule and stage records share one schema.
+    """
+    if not os.path.isdir(directory):
+        return
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        if not entry.name.endswith(".tsv") or entry.stat().st_mtime < since:
+            continue
+        with open(entry.path, newline="") as f:
+            rows = list(csv.DictReader(f, delimiter="\t"))
+        for row in rows:
+            append_record({
+                "run": run_id(),
+                "rule": entry.name[:-len(".tsv")],
+                "stage": "rule",
+                "lang": "snakemake",
+                "started": datetime.fromtimestamp(entry.stat().st_mtime).isoformat(timespec="seconds"),
+                "status": "ok",
+                "wall_s": _float(row.get("s")),
+                "cpu_s": _float(row.get("cpu_time")),
+                "peak_rss_mb": _float(row.get("max_rss")),
+                "rows_in": None,
+                "rows_out": None,
+                "bytes_read": _bytes(row.get("io_in")),
+                "bytes_written": _bytes(row.get("io_out")),
+            }, log)
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # snakemake writes NA when a value could not be measured
+        return None
+
+
+def _bytes(mb):
+    mb = _float(mb)
+    return None if mb is None else int(mb * 1024 ** 2)
+
+
+def profile_summary(records, threshold=1.25, min_seconds=1.0):
+    """Rank rules and stages by wall time in their latest run, against their earlier runs.
+
+    Records of the same rule and stage within a run are summed (e.g. a stage
+    run once per chunk). `baseline_s` is the median wall time over the
+    earlier runs; a stage is flagged as a regression when its latest run
+    took more than `threshold` times the baseline and at least
+    `min_seconds`.
+    """
+    columns = ["rule", "stage", "lang", "runs", "wall_s", "cpu_s", "peak_rss_mb",
+               "rows_in", "rows_out", "bytes_read", "bytes_written", "baseline_s", "change", "regression"]
+    if not records:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(records)
+    # missing counters (e.g. io outside linux) stay missing instead of summing to 0
+    total = lambda values: values.sum(min_count=1)
+    per_run = df.groupby(["rule", "stage", "lang", "run"], sort=False).agg(
+        wall_s=("wall_s", total), cpu_s=("cpu_s", total), peak_rss_mb=("peak_rss_mb", "max"),
+        rows_in=("rows_in", total), rows_out=("rows_out", total),
+        bytes_read=("bytes_read", total), bytes_written=("bytes_written", total),
+    ).reset_index().sort_values("run", kind="stable")
+    keys = ["rule", "stage", "lang"]
+    latest = per_run.groupby(keys).tail(1).set_index(keys)
+    earlier = per_run.drop(per_run.groupby(keys).tail(1).index)
+    summary = latest.drop(columns="run")
+    summary["runs"] = per_run.groupby(keys).size()
+    summary["baseline_s"] = earlier.groupby(keys)["wall_s"].median()
+    summary["change"] = (summary["wall_s"] / summary["baseline_s"]).round(2)
+    summary["regression"] = (summary["change"] > threshold) & (summary["wall_s"] >= min_seconds)
+    counters = ["rows_in", "rows_out", "bytes_read", "bytes_written"]
+    summary[counters] = summary[counters].astype("Int64")
+    return summary.reset_index().sort_values("wall_s", ascending=False)[columns]
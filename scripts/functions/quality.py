@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+from functions.items import JUSTICE_ITEMS
+
+QUALITY_FILE = "data/response_quality.csv"
+
+DURATION = "Duration (in seconds)"
+
+# respondents in the fastest share of their country's durations are flagged
+# as speeders; 5% is the cut of the speeder robustness check, but
+# 07_robustness_checks.R takes its cut over the durations of all countries
+# pooled, so its speeders are not exactly the ones flagged here
+SPEEDER_QUANTILE = 0.05
+
+# a respondent who gave the same rating to every justice item answered is
+# flagged as straight-lining, if they answered at least this many
+STRAIGHTLINE_MIN_ITEMS = 6
+
+# questions every respondent is asked, for the item non-response rate; of the
+# WTC/WTP questions, each arm is asked its own version. planned_flights has no
+# display condition, 0 is an answer (the pre-treatment flights of every
+# respondent in the LMMs)
+ASKED_ITEMS = [
+    "gender", "age", "education", "personal_income", "income", "flying_plan", "flying_ever",
+    "planned_flights", "clim_concern_wtc", "clim_concern_wtp", "eu_clim_conc",
+] + JUSTICE_ITEMS
+CONTROL_ITEMS = ["c_wtc_fly", "c_wtp_buy"]
+TREATMENT_ITEMS = ["t_wtc_fly", "t_wtp_buy"]
+
+# questions shown only after a given answer, counted as asked only for the
+# respondents who gave it: flying_recent follows flying_ever == "yes" (see
+# the non-flyer groups of scripts/plots/11_income_flying_corr.R)
+CONDITIONAL_ITEMS = {"flying_recent": ("flying_ever", "yes")}
+
+QUALITY_COLUMNS = ["id", "country", "duration", "duration_pct", "speeder", "justice_answered", "justice_sd",
+                   "straightliner", "nonresponse_rate"]
+
+
+def quality_inputs(header):
+    """Return the columns of a clean csv with `header` that the quality scores read."""
+    wanted = {"id", DURATION, "treatment"} | set(ASKED_ITEMS) | set(CONTROL_ITEMS + TREATMENT_ITEMS)
+    wanted |= {col for item, (condition, _) in CONDITIONAL_ITEMS.items() for col in (item, condition)}
+    return [col for col in header if col in wanted]
+
+
+def _numeric(df, columns):
+    present = [col for col in columns if col in df.columns]
+    values = df[present].apply(pd.to_numeric, errors="coerce")
+    return values.to_numpy(dtype=float, na_value=np.nan)
+
+
+def _missing(df, columns):
+    present = [col for col in columns if col in df.columns]
+    return df[present].isna().to_numpy()
+
+
+def score_quality(df, country, speeder_quantile=SPEEDER_QUANTILE):
+    """Return the quality scores of the respondents in one country's clean data, one row per id.
+
+    Every score is one operation over the whole column block: the duration
+    and its percentile within the country (speeders are at or below the
+    `speeder_quantile` cut, computed as R's default `quantile`), the spread
+    of the 12 justice ratings (ddof 1, as `pandas.std`), and the share of
+    the asked questions left unanswered, where a question shown on a
+    condition counts only for the respondents shown it. Columns missing
+    from `df` give missing scores. Failed attention traps are not scored, those responses
+    are already excluded from the clean data.
+    """
+    n = len(df)
+    if DURATION in df.columns:
+        duration = _numeric(df, [DURATION])[:, 0]
+    else:
+        duration = np.full(n, np.nan)
+    valid = ~np.isnan(duration)
+    cut = np.quantile(duration[valid], speeder_quantile) if valid.any() else np.nan
+    # share of the country's durations at or below each one
+    ranked = np.sort(duration[valid])
+    duration_pct = np.where(valid, np.searchsorted(ranked, duration, side="right") / max(len(ranked), 1), np.nan)
+
+    items = _numeric(df, JUSTICE_ITEMS)
+    answered = (~np.isnan(items)).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(items, axis=1) / answered
+        sd = np.sqrt(np.nansum((items - mean[:, None]) ** 2, axis=1) / (answered - 1))
+    sd[answered < 2] = np.nan
+
+    asked = _missing(df, ASKED_ITEMS)
+    if all(col in df.columns for col in ["treatment"] + CONTROL_ITEMS + TREATMENT_ITEMS):
+        control = (df["treatment"].astype("string") == "control").fillna(False).to_numpy(dtype=bool)
+        arm = np.where(control[:, None], _missing(df, CONTROL_ITEMS), _missing(df, TREATMENT_ITEMS))
+    else:
+        arm = np.zeros((n, 0), dtype=bool)
+    n_asked = np.full(n, asked.shape[1] + arm.shape[1])
+    unanswered = asked.sum(axis=1) + arm.sum(axis=1)
+    for item, (condition, answer) in CONDITIONAL_ITEMS.items():
+        if item in df.columns and condition in df.columns:
+            shown = (df[condition].astype("string") == answer).fillna(False).to_numpy(dtype=bool)
+            n_asked += shown
+            unanswered += shown & df[item].isna().to_numpy()
+
+    return pd.DataFrame({
+        "id": df["id"].to_numpy(),
+        "country": country,
+        "duration": duration,
+        "duration_pct": np.round(duration_pct, 4),
+        "speeder": pd.Series(duration <= cut, dtype="boolean").mask(~valid).array,
+        "justice_answered": answered,
+        "justice_sd": np.round(sd, 3),
+        "straightliner": (answered >= STRAIGHTLINE_MIN_ITEMS) & (sd == 0),
+        "nonresponse_rate": np.round(np.where(n_asked > 0, unanswered / np.maximum(n_asked, 1), np.nan), 3),
+    }, columns=QUALITY_COLUMNS)
+
+
+def quality_table(files, speeder_quantile=SPEEDER_QUANTILE):
+    """Score the clean csv of every country in `files`, reading only the columns the scores use."""
+    tables = []
+    for country, path in files.items():
+        header = pd.read_csv(path, nrows=0).columns
+        df = pd.read_csv(path, usecols=quality_inputs(header), low_memory=False)
+        tables.append(score_quality(df, country, speeder_quantile))
+    return pd.concat(tables, ignore_index=True)
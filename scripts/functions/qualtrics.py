@@ -0,0 +1,86 @@
+import csv
+import re
+
+import pandas as pd
+
+from functions.schema import apply_schema, concat_typed, summarize_issues
+
+# Qualtrics exports carry the column names in the first row, followed by
+# the question text and the import id JSON in rows 1 and 2
+QUALTRICS_HEADER_ROWS = [1, 2]
+DEFAULT_CHUNKSIZE = 50_000
+
+
+def read_header(file_name):
+    """Return the column names of a Qualtrics export without reading the data."""
+    with open(file_name, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f))
+
+
+def select_columns(header, columns=None, patterns=()):
+    """Return the columns of `header` that are requested, in file order.
+
+    `columns` are exact names and `patterns` are regular expressions; columns
+    that do not exist in this export are silently skipped. If neither is
+    given, all columns are kept.
+    """
+    if columns is None and not patterns:
+        return list(header)
+    wanted = set(columns or ())
+    regexes = [re.compile(p) for p in patterns]
+    return [
+        col for col in header
+        if col in wanted or any(r.search(col) for r in regexes)
+    ]
+
+
+def iter_qualtrics(file_name, columns=None, patterns=(), chunksize=DEFAULT_CHUNKSIZE, dtype=None):
+    """Yield a Qualtrics export in chunks, reading only the requested columns."""
+    header = read_header(file_name)
+    usecols = select_columns(header, columns, patterns)
+    reader = pd.read_csv(
+        file_name,
+        skiprows=QUALTRICS_HEADER_ROWS,
+        usecols=usecols,
+        chunksize=chunksize,
+        dtype=dtype,
+        low_memory=False,
+    )
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def read_qualtrics(file_name, columns=None, patterns=(), chunksize=DEFAULT_CHUNKSIZE,
+                   dtype=None, chunk_filter=None):
+    """Read a Qualtrics export chunk by chunk, filtering each chunk as it arrives.
+
+    Only the rows kept by `chunk_filter` are held in memory, so the peak
+    footprint is one raw chunk plus the filtered result.
+    """
+    chunks = []
+    for chunk in iter_qualtrics(file_name, columns, patterns, chunksize, dtype):
+        if chunk_filter is not None:
+            chunk = chunk_filter(chunk)
+        chunks.append(chunk)
+    if not chunks:
+        header = select_columns(read_header(file_name), columns, patterns)
+        return pd.DataFrame(columns=header)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_qualtrics_typed(file_name, columns=None, patterns=(), chunksize=DEFAULT_CHUNKSIZE,
+                         chunk_filter=None):
+    """Read a Qualtrics export like `read_qualtrics`, casting each chunk to the survey schema.
+
+    Returns the typed frame and the values that fall outside the schema.
+    """
+    chunks = []
+    issues = []
+    for chunk in iter_qualtrics(file_name, columns, patterns, chunksize):
+        chunk, chunk_issues = apply_schema(chunk)
+        issues.append(chunk_issues)
+        if chunk_filter is not None:
+            chunk = chunk_filter(chunk)
+        chunks.append(chunk)
+    return concat_typed(chunks), summarize_issues(issues)
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+
+from functions.quotas import country_variables, load_state, quota_table, save_state, update_counts
+
+# Qualtrics exports as downloaded during fieldwork, e.g.
+# Aviation_Justice_US_111224_1531.csv or CH_Aviation_Justice_031224_0830.csv
+EXPORT_PATTERN = re.compile(r"^(?:Aviation_Justice_(US|CH|CN)_.*|(US|CH|CN)_Aviation_Justice_.*)\.csv$")
+
+DASHBOARD_HTML = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Quota check</title>
+<style>
+  body { font-family: sans-serif; margin: 2em; }
+  table { border-collapse: collapse; }
+  th, td { padding: 0.2em 0.8em; text-align: right; border-bottom: 1px solid #ddd; }
+  td:nth-child(-n+2), th:nth-child(-n+2) { text-align: left; }
+  .off { color: #b2182b; font-weight: bold; }
+</style>
+</head>
+<body>
+<h1>Quota check</h1>
+<p id="updated">waiting for data</p>
+<table id="quotas"></table>
+<script>
+const columns = ["Demographic Variable", "Category"];
+function cell(value) {
+  return value === null || value === undefined ? "" : value;
+}
+function render(snapshot) {
+  // "{}" until the first export has been counted
+  if (!snapshot.quotas) return;
+  document.getElementById("updated").textContent = "updated " + snapshot.updated;
+  const countries = Object.keys(snapshot.countries);
+  const head = columns.concat(...countries.map(c => [c + " quota", c + " data", c + " deviation"]));
+  const rows = snapshot.quotas.map(row => "<tr>" + head.map(col => {
+    const off = col.endsWith("deviation") && Math.abs(row[col]) >= snapshot.tolerance;
+    return "<td" + (off ? " class='off'" : "") + ">" + cell(row[col]) + "</td>";
+  }).join("") + "</tr>");
+  document.getElementById("quotas").innerHTML =
+    "<tr>" + head.map(col => "<th>" + col + "</th>").join("") + "</tr>" + rows.join("");
+}
+new EventSource("/events").onmessage = event => render(JSON.parse(event.data));
+</script>
+</body>
+</html>
+"""
+
+
+def latest_exports(directory):
+    """Return the most recently modified export of each country in `directory`."""
+    latest = {}
+    for entry in os.scandir(directory):
+        match = EXPORT_PATTERN.match(entry.name)
+        if match is None:
+            continue
+        country = match.group(1) or match.group(2)
+        if country not in latest or entry.stat().st_mtime > latest[country].stat().st_mtime:
+            latest[country] = entry
+    return {country: entry.path for country, entry in latest.items()}
+
+
+def quota_snapshot(state, files, tolerance=0.05):
+    """Return the quota comparison of all countries as a json-ready dict, with deviations from the targets."""
+    table = quota_table(state)
+    for country in state:
+        table[f"{country} deviation"] = (
+            pd.to_numeric(table[f"{country} data"], errors="coerce")
+            - pd.to_numeric(table.get(f"{country} quota"), errors="coerce")
+        ).round(2)
+    table = table.astype(object).where(table.notna(), None)
+    return {
+        "updated": datetime.now().isoformat(timespec="seconds"),
+        "tolerance": tolerance,
+        "countries": {
+            country: {"file": os.path.basename(files[country]), "n": s["n"], "excluded": s["excluded"]}
+            for country, s in state.items()
+        },
+        "quotas": table.to_dict(orient="records"),
+    }
+
+
+class QuotaDashboard:
+    """Watch an export directory and serve the quota comparison over http.
+
+    Exports are polled with `os.stat`; when one changes, only its appended
+    rows are counted (see `update_counts`) and the new comparison is pushed
+    to every browser connected to `/events`. `/quotas.json` serves the
+    latest comparison with an ETag, so pollers get a bodiless 304 while
+    nothing changed.
+    """
+
+    def __init__(self, directory, state_file, interval=10.0, tolerance=0.05):
+        self.directory = directory
+        self.state_file = state_file
+        self.interval = interval
+        self.tolerance = tolerance
+        self.state = load_state(state_file)
+        self.stamps = {}
+        self.body = b"{}"
+        self.etag = ""
+        self.clients = set()
+
+    def refresh(self):
+        """Recount the exports that changed since the last call; return whether anything did."""
+        files = latest_exports(self.directory)
+        changed = False
+        for country, path in sorted(files.items()):
+            stat = os.stat(path)
+            stamp = (path, stat.st_size, stat.st_mtime_ns)
+            if self.stamps.get(country) == stamp:
+                continue
+            self.state[country] = update_counts(path, country, self.state.get(country),
+                                                country_variables(country))
+            self.stamps[country] = stamp
+            changed = True
+        if changed:
+            save_state(self.state_file, self.state)
+            state = {country: self.state[country] for country in sorted(files)}
+            snapshot = quota_snapshot(state, files, self.tolerance)
+            self.body = json.dumps(snapshot).encode()
+            self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:16] + '"'
+        return changed
+
+    async def watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if await loop.run_in_executor(None, self.refresh):
+                for queue in self.clients:
+                    queue.put_nowait(self.body)
+            await asyncio.sleep(self.interval)
+
+    async def _respond(self, writer, status, content_type, body, headers=()):
+        lines = [f"HTTP/1.1 {status}", f"Content-Type: {content_type}",
+                 f"Content-Length: {len(body)}", "Connection: close", *headers]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    async def _events(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n")
+        queue = asyncio.Queue()
+        self.clients.add(queue)
+        try:
+            body = self.body
+            while True:
+                writer.write(b"data: " + body + b"\n\n")
+                await writer.drain()
+                body = await queue.get()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(queue)
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        lines = request.decode("latin-1").split("\r\n")
+        parts = lines[0].split()
+        path = parts[1].split("?")[0] if len(parts) > 1 else "/"
+        headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+        try:
+            if path == "/":
+                await self._respond(writer, "200 OK", "text/html; charset=utf-8", DASHBOARD_HTML.encode())
+            elif path == "/quotas.json":
+                if headers.get("If-None-Match") == self.etag:
+                    await self._respond(writer, "304 Not Modified", "application/json", b"",
+                                        [f"ETag: {self.etag}"])
+                else:
+                    await self._respond(writer, "200 OK", "application/json", self.body,
+                                        [f"ETag: {self.etag}"])
+            elif path == "/events":
+                await self._events(writer)
+            else:
+                await self._respond(writer, "404 Not Found", "text/plain", b"not found")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8050):
+        """Serve the dashboard until cancelled, counting the exports once before the first connection."""
+        await asyncio.get_running_loop().run_in_executor(None, self.refresh)
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"quota dashboard on http://{host}:{port}/ watching {self.directory}")
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.watch())
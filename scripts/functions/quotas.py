@@ -0,0 +1,190 @@
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from functions.cube import add_cells, count_cells
+from functions.exclusions import EXCLUSION_RULES, apply_exclusions
+from functions.qualtrics import read_header
+
+# demographic variables with fieldwork quotas
+QUOTA_VARIABLES = ["gender", "age", "flying_plan", "ch_region"]
+
+# target proportions of the fieldwork quotas
+QUOTA_TARGETS = {
+    "Demographic Variable": [
+        "gender", "gender",
+        "age", "age", "age", "age", "age", "age",
+        "flying_plan",
+        "ch_region", "ch_region", "ch_region", "ch_region"
+    ],
+    "Category": [
+        "male", "female",
+        "18y_24y", "25y_34y", "35y_44y", "45y_54y", "55y_64y", "65y_above",
+        "no",
+        "german", "french", "italian", "romansh"
+    ],
+    "US quota": [0.49, 0.51, 0.12, 0.18, 0.18, 0.16, 0.17, 0.19, 0.2, None, None, None, None],
+    "CH quota": [0.5, 0.5, 0.09, 0.18, 0.19, 0.18, 0.18, 0.18, 0.2, 0.73, 0.27, None, None],
+    "CN quota": [0.51, 0.49, 0.12, 0.2, 0.18, 0.16, 0.34, None, 0.3, None, None, None, None]
+}
+
+# categories reported together: for China (CN), 55y_64y and 65y_above
+QUOTA_MERGES = {"CN": {("age", "55y_64y"): ["65y_above"]}}
+
+# bytes before the resume offset that must be unchanged for a run to count
+# only the rows appended since the previous one
+TAIL_BYTES = 4096
+
+
+def _record_ends(data, start=0):
+    """Return the offsets just past every record-ending newline of csv bytes, ignoring quoted ones."""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    in_quotes = np.cumsum(buf == ord('"')) % 2 == 1
+    return np.flatnonzero((buf == ord("\n")) & ~in_quotes) + 1 + start
+
+
+def _tail_digest(f, offset):
+    f.seek(max(0, offset - TAIL_BYTES))
+    return hashlib.sha256(f.read(offset - max(0, offset - TAIL_BYTES))).hexdigest()
+
+
+def cell_frame(records, variables=QUOTA_VARIABLES):
+    """Return the cells kept in a quota state as a frame, see `functions.cube.count_cells`."""
+    frame = pd.DataFrame.from_records(records or [], columns=list(variables) + ["n"])
+    frame[list(variables)] = frame[list(variables)].astype("string")
+    frame["n"] = frame["n"].astype("int64")
+    return frame
+
+
+def marginal_counts(cells, variables=QUOTA_VARIABLES):
+    """Sum the cells over all other variables, as {variable: {category: n}} of the non-missing answers."""
+    counts = {}
+    for variable in variables:
+        totals = cells.groupby(variable)["n"].sum()
+        if len(totals):
+            counts[variable] = {str(category): int(n) for category, n in totals.items()}
+    return counts
+
+
+def update_counts(file_name, country, state=None, variables=QUOTA_VARIABLES, rules=EXCLUSION_RULES):
+    """Add the responses appended to a Qualtrics export since `state` to the running quota counts.
+
+    `state` is what the previous call returned for this country. Only the
+    bytes past its offset are parsed, after checking that the bytes before
+    it are unchanged; otherwise, e.g. when the export was re-downloaded with
+    other rows, the file is counted from scratch. The ResponseId/StartDate
+    of the last counted response is kept so it is not counted twice.
+    Excluded responses are not counted. Besides the counts per category,
+    the state keeps the joint counts of all `variables` (`cells`), so
+    cross-tabs such as gender x age x ch_region are sums over them.
+    """
+    header = read_header(file_name)
+    keep_cols = {"ResponseId", "StartDate"} | set(variables) | {rule[1] for rule in rules}
+    usecols = [col for col in header if col in keep_cols]
+
+    with open(file_name, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        resume = (
+            state is not None
+            and state.get("header") == header
+            and state.get("variables") == list(variables)
+            and state["offset"] <= size
+            and _tail_digest(f, state["offset"]) == state["tail"]
+        )
+        if not resume:
+            f.seek(0)
+            head = f.read(min(size, 1 << 20))
+            ends = _record_ends(head)
+            # the column names, question text and import id rows
+            data_start = int(ends[2]) if len(ends) >= 3 else size
+            state = {"header": header, "variables": list(variables), "offset": data_start, "n": 0,
+                     "counts": {}, "cells": [], "excluded": {}, "last": None}
+
+        f.seek(state["offset"])
+        data = f.read()
+
+    ends = _record_ends(data, state["offset"])
+    if len(ends):
+        data = data[:ends[-1] - state["offset"]]
+        new = pd.read_csv(io.BytesIO(data), header=None, names=header, usecols=usecols, low_memory=False)
+        last = new[["ResponseId", "StartDate"]].iloc[0].astype(str).to_dict()
+        if state["last"] is not None and last == state["last"]:
+            new = new.iloc[1:]
+        if len(new):
+            state["last"] = new[["ResponseId", "StartDate"]].iloc[-1].astype(str).to_dict()
+        kept, excluded = apply_exclusions(new, country, rules)
+        state["n"] += len(kept)
+        state["excluded"] = {rule: state["excluded"].get(rule, 0) + int(n) for rule, n in excluded.items()}
+        cells = add_cells([cell_frame(state["cells"], variables), count_cells(kept, variables)], variables)
+        state["cells"] = cells.astype(object).where(cells.notna(), None).to_dict("records")
+        state["counts"] = marginal_counts(cells, variables)
+        state["offset"] = int(ends[-1])
+
+    with open(file_name, "rb") as f:
+        state["tail"] = _tail_digest(f, state["offset"])
+    return state
+
+
+def load_state(path):
+    """Return the quota counts saved by a previous run, or an empty state."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    """Write the quota counts atomically, so an interrupted run keeps the previous state."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def country_variables(country, variables=QUOTA_VARIABLES):
+    """Return the quota variables asked in one country; ch_region only exists in CH."""
+    return [v for v in variables if v != "ch_region" or country == "CH"]
+
+
+def quota_table(state, quotas=QUOTA_TARGETS):
+    """Return the quota targets next to the observed shares and sample size of every country in `state`."""
+    df_quotas = pd.DataFrame(quotas)
+    for country, country_state in state.items():
+        df_quotas[f"{country} data"] = quota_proportions(
+            country_state["counts"], df_quotas, QUOTA_MERGES.get(country)
+        )
+    sample_size_row = {"Demographic Variable": "sample_size", "Category": "sample_size"}
+    sample_size_row.update({f"{country} data": country_state["n"] for country, country_state in state.items()})
+    return pd.concat([df_quotas, pd.DataFrame([sample_size_row])], ignore_index=True)
+
+
+def quota_proportions(counts, quotas, merge=None):
+    """Return the share of every quota category, aligned with the rows of `quotas`.
+
+    Shares are taken over the non-missing answers of each variable, as
+    `value_counts(normalize=True)` does. `merge` maps (variable, category)
+    to the categories whose shares are reported together under it (e.g. the
+    top age brackets in CN); the merged-away categories are left empty.
+    """
+    shares = {}
+    for variable, categories in counts.items():
+        total = sum(categories.values())
+        for category, n in categories.items():
+            shares[(variable, category)] = n / total
+    keys = list(zip(quotas["Demographic Variable"], quotas["Category"]))
+    # categories of variables without any answer (e.g. ch_region outside CH) stay empty
+    result = pd.Series([round(shares.get(key, 0), 2) if key[0] in counts else None for key in keys],
+                       index=quotas.index, dtype=object)
+    index = pd.Series(quotas.index, index=pd.MultiIndex.from_tuples(keys))
+    for (variable, category), merged in (merge or {}).items():
+        result[index[[(variable, category)]]] = round(
+            sum(shares.get((variable, c), 0) for c in [category] + merged), 2
+        )
+        result[index[[(variable, c) for c in merged]]] = None
+    return result
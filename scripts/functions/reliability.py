@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+from functions.bootstrap import DEFAULT_BLOCK, DEFAULT_RESAMPLES, bootstrap_groups, percentile_ci
+
+# the four justice principles are each rated on three items
+CONTEXTS = ["general", "tax", "subsidy"]
+PRINCIPLES = ["1", "2", "3", "4"]
+
+
+def item_arrays(df, by="country", principles=PRINCIPLES, contexts=CONTEXTS):
+    """Return the respondent x item array of every group and principle, keyed by `(group, principle)`.
+
+    Each array keeps the respondents who rated all items of the principle,
+    so an item skipped under one principle does not drop the others.
+    """
+    arrays = {}
+    for group, df_group in df.groupby(by, sort=False, observed=True):
+        for principle in principles:
+            items = [f"justice_{context}_{principle}" for context in contexts]
+            x = df_group[items].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+            arrays[(group, principle)] = x[~np.isnan(x).any(axis=1)]
+    return arrays
+
+
+def _mean_squares(x):
+    # two-way anova of a (..., n, k) batch of rating matrices
+    n, k = x.shape[-2:]
+    grand = x.mean(axis=(-2, -1), keepdims=True)
+    ss_total = ((x - grand) ** 2).sum(axis=(-2, -1))
+    ss_rows = k * ((x.mean(axis=-1, keepdims=True) - grand) ** 2).sum(axis=(-2, -1))
+    ss_cols = n * ((x.mean(axis=-2, keepdims=True) - grand) ** 2).sum(axis=(-2, -1))
+    ms_rows = ss_rows / (n - 1)
+    ms_error = (ss_total - ss_rows - ss_cols) / ((n - 1) * (k - 1))
+    return ms_rows, ms_error
+
+
+def icc3_1(x):
+    """Return ICC(3,1), two-way mixed consistency of single ratings, of a (..., n, k) batch."""
+    k = x.shape[-1]
+    ms_rows, ms_error = _mean_squares(x)
+    return (ms_rows - ms_error) / (ms_rows + (k - 1) * ms_error)
+
+
+def icc3_1_ci(x, level=0.95):
+    """Return the F-based confidence interval of ICC(3,1), as pingouin reports it."""
+    # imported here, scipy.stats is slow to import and only needed for the intervals
+    from scipy.stats import f as f_dist
+
+    n, k = x.shape[-2:]
+    ms_rows, ms_error = _mean_squares(x)
+    f_obs = ms_rows / ms_error
+    df1, df2 = n - 1, (n - 1) * (k - 1)
+    q = 1 - (1 - level) / 2
+    f_low = f_obs / f_dist.ppf(q, df1, df2)
+    f_high = f_obs * f_dist.ppf(q, df2, df1)
+    return (f_low - 1) / (f_low + k - 1), (f_high - 1) / (f_high + k - 1)
+
+
+def cronbach_alpha(x):
+    """Return Cronbach's alpha of a (..., n, k) batch of item matrices."""
+    k = x.shape[-1]
+    item_var = x.var(axis=-2, ddof=1).sum(axis=-1)
+    total_var = x.sum(axis=-1).var(axis=-1, ddof=1)
+    return k / (k - 1) * (1 - item_var / total_var)
+
+
+def reliability_replicates(counts, x):
+    """Return ICC(3,1) and alpha for resamples given as respondent counts.
+
+    `counts` is (resamples, n) and `x` a respondent x item array; both
+    statistics follow from count-weighted sums of the items, their squares,
+    the respondent totals and their squares, which are taken for all
+    resamples in one matrix product.
+    """
+    n, k = x.shape
+    totals = x.sum(axis=1, keepdims=True)
+    sums = counts @ np.hstack([x, x ** 2, totals, totals ** 2])
+    sum_x, sum_x2, sum_t, sum_t2 = sums[:, :k], sums[:, k:2 * k], sums[:, 2 * k], sums[:, 2 * k + 1]
+
+    correction = sum_t ** 2 / (n * k)
+    ss_total = sum_x2.sum(axis=-1) - correction
+    ss_rows = sum_t2 / k - correction
+    ss_cols = (sum_x ** 2).sum(axis=-1) / n - correction
+    ms_rows = ss_rows / (n - 1)
+    ms_error = (ss_total - ss_rows - ss_cols) / ((n - 1) * (k - 1))
+    icc = (ms_rows - ms_error) / (ms_rows + (k - 1) * ms_error)
+
+    item_var = ((sum_x2 - sum_x ** 2 / n) / (n - 1)).sum(axis=-1)
+    total_var = (sum_t2 - sum_t ** 2 / n) / (n - 1)
+    alpha = k / (k - 1) * (1 - item_var / total_var)
+    return np.stack([icc, alpha], axis=1)
+
+
+def reliability_table(arrays, resamples=DEFAULT_RESAMPLES, level=0.95, seed=None,
+                      workers=1, block=DEFAULT_BLOCK):
+    """Return ICC(3,1) and Cronbach's alpha with their confidence intervals for every group and principle.
+
+    `arrays` are the item arrays of `item_arrays`. Bootstrap intervals are
+    percentile intervals over respondent resamples, drawn per block and
+    shared by all groups; set `resamples` to 0 to skip them.
+    """
+    boot = {}
+    if resamples:
+        boot = bootstrap_groups(reliability_replicates, arrays, resamples, seed, workers, block)
+
+    rows = []
+    for (group, principle), x in arrays.items():
+        icc_low, icc_high = icc3_1_ci(x, level)
+        row = {
+            "group": group,
+            "principle": principle,
+            "n": len(x),
+            "icc3": icc3_1(x),
+            "icc3_ci_low": icc_low,
+            "icc3_ci_high": icc_high,
+            "alpha": cronbach_alpha(x),
+        }
+        if resamples:
+            (icc_boot_low, alpha_boot_low), (icc_boot_high, alpha_boot_high) = percentile_ci(
+                boot[(group, principle)], level
+            )
+            row.update({
+                "icc3_boot_low": icc_boot_low,
+                "icc3_boot_high": icc_boot_high,
+                "alpha_boot_low": alpha_boot_low,
+                "alpha_boot_high": alpha_boot_high,
+            })
+        rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+# columns identifying a respondent, checked in this order: the Qualtrics
+# response id and the panel id passed in the survey link (ExternalReference).
+# A key is skipped in exports that lack one of its columns, and rows with a
+# missing value are not matched on it
+DEDUP_KEYS = {
+    "response": ["ResponseId"],
+    "panel": ["ExternalReference"],
+}
+
+# a fingerprint of IP address and start day (`fingerprint: [IPAddress,
+# StartDay]` in dedup_keys) also catches re-entries under a new response id,
+# but is not a default: an IP address is shared by a household, a campus or a
+# mobile carrier. StartDay is the date part of StartDate
+
+# one row per duplicate: the response excluded, the key it matched on, and
+# the response kept in its place
+REPORT_COLUMNS = ["country", "wave", "ResponseId", "key", "matched_country", "matched_wave", "matched_ResponseId"]
+
+
+def key_columns(keys=DEDUP_KEYS):
+    """Return the export columns needed to hash `keys`."""
+    columns = {col for cols in keys.values() for col in cols}
+    if "StartDay" in columns:
+        columns = (columns - {"StartDay"}) | {"StartDate"}
+    return sorted(columns)
+
+
+def key_hashes(df, keys=DEDUP_KEYS):
+    """Return one 64-bit hash per row and key of `df`, missing where a key column is empty.
+
+    Values are compared as trimmed lower-case text, so the hashes do not
+    depend on how a column was typed; `pd.util.hash_pandas_object` uses a
+    fixed hash key, so hashes are stable across runs and can be stored.
+    """
+    text = {}
+    for col in key_columns(keys):
+        if col in df.columns:
+            text[col] = df[col].astype("string").str.strip().str.lower()
+    if "StartDate" in text:
+        text["StartDay"] = text["StartDate"].str.slice(0, 10)
+
+    hashes = pd.DataFrame(index=df.index)
+    hashes["ResponseId"] = df["ResponseId"].astype("string")
+    for key, cols in keys.items():
+        if not all(col in text for col in cols):
+            continue
+        values = pd.DataFrame({col: text[col] for col in cols})
+        missing = values.isna().any(axis=1) | (values == "").any(axis=1)
+        hashed = pd.util.hash_pandas_object(values.fillna(""), index=False).astype("UInt64")
+        hashes[key] = hashed.mask(missing)
+    return hashes
+
+
+class RespondentIndex:
+    """Hashed lookup of the respondents kept so far, across countries and waves.
+
+    Every key hash maps to the response that first claimed it, so checking a
+    response costs one dictionary lookup per key however many came before.
+    Responses are claimed in the order they are passed in (waves, then
+    countries in `COUNTRIES` order, then file order), so which copy of a
+    respondent is kept does not depend on timing or parallelism.
+    """
+
+    columns = ["key", "hash", "country", "wave", "ResponseId", "partition"]
+
+    def __init__(self, keys=DEDUP_KEYS):
+        self.keys = list(keys)
+        self.owners = {key: {} for key in self.keys}
+
+    def claim(self, hashes, country, wave=None, partition=None):
+        """Flag the rows of `hashes` (from `key_hashes`) that match an earlier response.
+
+        The keys of the other rows are claimed for later calls. Returns a
+        boolean duplicate mask in row order and a report of the duplicates
+        with the response each one matched.
+        """
+        keys = [key for key in self.keys if key in hashes.columns]
+        values = {key: hashes[key].astype(object).where(hashes[key].notna(), None).tolist() for key in keys}
+        response_ids = hashes["ResponseId"].tolist()
+        duplicate = np.zeros(len(hashes), dtype=bool)
+        report = []
+        for i, response_id in enumerate(response_ids):
+            for key in keys:
+                value = values[key][i]
+                if value is not None and value in self.owners[key]:
+                    owner = self.owners[key][value]
+                    duplicate[i] = True
+                    report.append((country, wave, response_id, key, *owner[:3]))
+                    break
+            if duplicate[i]:
+                continue
+            owner = (country, wave, response_id, partition)
+            for key in keys:
+                value = values[key][i]
+                if value is not None:
+                    self.owners[key][value] = owner
+        report = pd.DataFrame(report, columns=REPORT_COLUMNS)
+        return duplicate, report
+
+    def to_frame(self):
+        rows = [(key, value, *owner) for key, owners in self.owners.items() for value, owner in owners.items()]
+        return pd.DataFrame(rows, columns=self.columns)
+
+    def save(self, path):
+        self.to_frame().to_csv(path, index=False)
+
+    @classmethod
+    def load(cls, path, partitions=None, keys=DEDUP_KEYS):
+        """Read a saved index, keeping only the claims of `partitions` if given.
+
+        Claims of partitions missing from the store's manifest (an ingestion
+        interrupted before its commit) are dropped, so those responses are
+        not flagged as duplicates of themselves when ingested again.
+        """
+        index = cls(keys)
+        try:
+            df = pd.read_csv(path, dtype={"hash": "uint64", "wave": str, "partition": str})
+        except (OSError, pd.errors.EmptyDataError):
+            return index
+        if partitions is not None:
+            df = df[df["partition"].isin(partitions)]
+        df = df.astype(object).where(df.notna(), None)
+        for key, value, country, wave, response_id, partition in df.itertuples(index=False):
+            index.owners.setdefault(key, {})[int(value)] = (country, wave, response_id, partition)
+        return index
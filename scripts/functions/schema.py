@@ -0,0 +1,122 @@
+import re
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+AGE_LEVELS = ["18y_24y", "25y_34y", "35y_44y", "45y_54y", "55y_64y", "65y_above"]
+
+# income brackets differ by country, this is their union
+INCOME_LEVELS = [
+    "below_15k", "25k_below", "10k_below", "15k_25k", "10k_20k", "20k_30k",
+    "25k_35k", "30k_45k", "35k_45k", "45k_55k", "45k_60k", "55k_65k",
+    "55k_70k", "60k_75k", "65k_80k", "70k_90k", "75k_100k", "80k_95k",
+    "90k_115k", "95k_115k", "100k_130k", "115k_150k", "115k_175k",
+    "130k_180k", "175k_above", "above_150k", "above_180k", "prefer_not_to_say",
+]
+
+# declared dtypes of the survey columns: a list declares a categorical with
+# fixed levels, a string a pandas dtype
+SURVEY_SCHEMA = {
+    "DistributionChannel":  ["anonymous", "preview", "email", "gl", "qr", "social", "test"],
+    "Finished":             "boolean",
+    "screened_out":         ["false", "true", "true_trap1", "true_trap2", "true_trap3", "true_region"],
+    "Q_TerminateFlag":      ["QuotaMet", "Screened", "Invalid"],
+    "gender":               ["male", "female", "other", "prefer_not_to_say"],
+    "age":                  AGE_LEVELS,
+    "ch_region":            ["german", "french", "italian", "romansh"],
+    "flying_plan":          ["yes", "no"],
+    "personal_income":      INCOME_LEVELS,
+    "income":               ["low", "mid", "high"],
+    "treatment":            ["control", "egal", "limit", "prior", "prop"],
+    "red_amt":              ["15%", "30%", "45%"],
+    "route_length":         ["short", "long"],
+    "planned_flights":      "Int32",
+    "flying_recent_number": "Int32",
+    "recent_flights":       "Int32",
+    "c_wtc_fly_number":     "Int32",
+    "t_wtc_fly_number":     "Int32",
+}
+
+# dtypes of column families matched by name
+SURVEY_SCHEMA_PATTERNS = {
+    r"^justice_(general|tax|subsidy)_\d$": "Int8",
+}
+
+
+def schema_for(columns, schema=SURVEY_SCHEMA, patterns=SURVEY_SCHEMA_PATTERNS):
+    """Return the declared dtype of each of `columns` that the schema covers."""
+    regexes = [(re.compile(p), dtype) for p, dtype in patterns.items()]
+    dtypes = {}
+    for col in columns:
+        if col in schema:
+            dtypes[col] = schema[col]
+            continue
+        for regex, dtype in regexes:
+            if regex.search(col):
+                dtypes[col] = dtype
+                break
+    return dtypes
+
+
+def _issues(col, values):
+    counts = values.value_counts()
+    return pd.DataFrame({"column": col, "value": counts.index.astype(str), "n": counts.to_numpy()})
+
+
+def apply_schema(df, schema=SURVEY_SCHEMA, patterns=SURVEY_SCHEMA_PATTERNS):
+    """Cast the columns of `df` to their declared dtypes.
+
+    Returns the typed frame and a table of the values that fall outside the
+    schema. Unknown categorical answers are kept as extra levels so no
+    response is lost; non-numeric entries in numeric columns, and numbers
+    that are not whole or do not fit the integer dtype, become missing, as
+    with `pd.to_numeric(..., errors='coerce')`.
+    """
+    df = df.copy()
+    issues = []
+    for col, dtype in schema_for(df.columns, schema, patterns).items():
+        values = df[col]
+        if isinstance(dtype, list):
+            unknown = values[values.notna() & ~values.isin(dtype)]
+            if len(unknown):
+                issues.append(_issues(col, unknown))
+            levels = dtype + sorted(unknown.unique(), key=str)
+            df[col] = pd.Categorical(values, categories=levels)
+        elif dtype == "boolean":
+            if values.dtype != bool:
+                values = values.map({True: True, False: False, "True": True, "False": False})
+            df[col] = values.astype("boolean")
+        else:
+            numbers = pd.to_numeric(values, errors="coerce")
+            invalid = values[values.notna() & numbers.isna()]
+            not_integer = numbers.notna() & (numbers % 1 != 0)
+            target = pd.api.types.pandas_dtype(dtype)
+            if pd.api.types.is_integer_dtype(target):
+                bounds = np.iinfo(getattr(target, "numpy_dtype", target))
+                not_integer |= numbers.notna() & ((numbers < bounds.min) | (numbers > bounds.max))
+            if len(invalid) or not_integer.any():
+                issues.append(_issues(col, pd.concat([invalid, values[not_integer]])))
+            df[col] = numbers.where(~not_integer).astype(dtype)
+    if issues:
+        return df, pd.concat(issues, ignore_index=True)
+    return df, pd.DataFrame(columns=["column", "value", "n"])
+
+
+def concat_typed(chunks):
+    """Concatenate typed chunks, merging categoricals whose extra levels differ."""
+    if not chunks:
+        return pd.DataFrame()
+    df = pd.concat(chunks, ignore_index=True)
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = union_categoricals([c[col] for c in chunks])
+    return df
+
+
+def summarize_issues(issues):
+    """Sum out-of-schema counts collected over several chunks."""
+    if not len(issues):
+        return pd.DataFrame(columns=["column", "value", "n"])
+    issues = pd.concat(issues, ignore_index=True)
+    return issues.groupby(["column", "value"], as_index=False, sort=False)["n"].sum()
@@ -0,0 +1,103 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# python scripts of the pipeline and the data-collection tools; each must be
+# importable without running, i.e. keep its work under `if __name__ == "__main__"`
+STARTUP_SCRIPTS = [
+    "data-collection/wtp-tickets.py",
+    "scripts/preprocessing/00_preprocessing_basics.py",
+    "scripts/cjo/preprocessing.py",
+    "scripts/cjo/cjo_icc.py",
+    "scripts/cjo/justice_lpa.py",
+    "data-collection/sythetic-data.py",
+    "data-collection/synthetic-exports.py",
+    "data-collection/power-analysis.py",
+    "data-collection/wtp-tickets-sweep.py",
+    "data-collection/check-ticket-scripts.py",
+    "data-collection/quota-dashboard.py",
+    "scripts/profile-summary.py",
+    "scripts/benchmark.py",
+]
+
+# loads a script as a module named `_startup`, so its main block is skipped
+_IMPORT = (
+    "import importlib.util\n"
+    "spec = importlib.util.spec_from_file_location('_startup', {path!r})\n"
+    "spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+)
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def _run(args, cwd):
+    start = time.perf_counter()
+    result = subprocess.run(args, cwd=cwd, capture_output=True, text=True)
+    return time.perf_counter() - start, result
+
+
+def parse_importtime(stderr):
+    """Return the modules of `python -X importtime` output with their cumulative seconds and nesting depth."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append({"module": module, "depth": len(indent) // 2,
+                         "self_s": int(self_us) / 1e6, "cumulative_s": int(cumulative_us) / 1e6})
+    return pd.DataFrame(rows, columns=["module", "depth", "self_s", "cumulative_s"])
+
+
+def script_startup(script, repo=".", repeat=5):
+    """Time importing `script` in a fresh interpreter, `repeat` times; return the median and the heaviest imports.
+
+    The interpreter's own startup is timed the same way and reported
+    separately, so `import_s` is what the script's imports and module-level
+    code add to every run.
+    """
+    path = os.path.abspath(os.path.join(repo, script))
+    code = _IMPORT.format(path=path)
+    baseline = np.median([_run([sys.executable, "-c", "pass"], repo)[0] for _ in range(repeat)])
+    # modules loaded by the interpreter and the loader itself, left out of the breakdown
+    _, result = _run([sys.executable, "-X", "importtime", "-c", "import importlib.util"], repo)
+    preloaded = set(parse_importtime(result.stderr)["module"])
+    walls = []
+    for _ in range(repeat):
+        wall, result = _run([sys.executable, "-c", code], repo)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()
+            return {"script": script, "status": "error", "error": error[-1] if error else None}
+        walls.append(wall)
+    # one more run for the breakdown, importtime slows the imports down a little
+    _, result = _run([sys.executable, "-X", "importtime", "-c", code], repo)
+    modules = parse_importtime(result.stderr)
+    return {
+        "script": script,
+        "status": "ok",
+        "wall_s": float(np.median(walls)),
+        "interpreter_s": float(baseline),
+        "import_s": float(np.median(walls) - baseline),
+        "modules": modules[(modules["depth"] == 0) & ~modules["module"].isin(preloaded)],
+    }
+
+
+def startup_table(scripts=STARTUP_SCRIPTS, repo=".", repeat=5, top=3):
+    """Return the startup cost of every script, with its `top` most expensive top-level imports."""
+    rows = []
+    for script in scripts:
+        timing = script_startup(script, repo, repeat)
+        modules = timing.pop("modules", None)
+        if modules is not None and len(modules):
+            heaviest = modules.nlargest(top, "cumulative_s")
+            timing["heaviest"] = ", ".join(f"{m} {s:.2f}s" for m, s in zip(heaviest["module"],
+                                                                             heaviest["cumulative_s"]))
+        rows.append(timing)
+    table = pd.DataFrame(rows)
+    if "import_s" in table:
+        table = table.sort_values("import_s", ascending=False, na_position="last")
+    return table.reset_index(drop=True)
@@ -0,0 +1,383 @@
+import numpy as np
+import pandas as pd
+
+# per-passenger surcharge columns of the ticket tables, as (allocation rule,
+# passenger group); proportional charges every passenger the same
+GROUPS = [
+    ("proportional", "all"),
+    ("prioritarian", "tourism"),
+    ("prioritarian", "non_tourism"),
+    ("limitarian", "frequent"),
+    ("limitarian", "non_frequent"),
+    ("egalitarian", "low"),
+    ("egalitarian", "mid"),
+    ("egalitarian", "high"),
+]
+
+# column names of the wide ticket tables written by wtp-tickets.py
+WIDE_COLUMNS = ["proportional" if group == "all" else group for _, group in GROUPS]
+
+# currency conversion rates as of 04.10.24
+EUR_RATES = {"usd": 1.1, "chf": 0.94, "cny": 7.74}
+
+
+def surcharges_eur(costs, passengers, low, mid, high, tourism, frequent):
+    """Return the per-passenger surcharge in eur of every group for a batch of scenarios.
+
+    All arguments broadcast against each other; the result has one row per
+    scenario and one column per entry of `GROUPS`. `low`, `mid` and `high`
+    are the income shares of passengers, `tourism` the share flying for
+    tourism and `frequent` the share of frequent flyers.
+    """
+    costs, passengers, low, mid, high, tourism, frequent = np.broadcast_arrays(
+        *[np.asarray(a, dtype=float) for a in (costs, passengers, low, mid, high, tourism, frequent)]
+    )
+    zero = np.zeros_like(costs)
+
+    # egalitarian: each group pays in proportion to how much it flies relative
+    # to the low income group, x * (n_low + n_mid * r_mid + n_high * r_high) = 1
+    low_mid_ratio = mid / low
+    low_high_ratio = high / low
+    constant = 1 / (
+        np.round(low * passengers)
+        + np.round(mid * passengers) * low_mid_ratio
+        + np.round(high * passengers) * low_high_ratio
+    )
+
+    return np.stack([
+        costs / passengers,
+        costs / (passengers * tourism),
+        zero,
+        costs / (passengers * frequent),
+        zero,
+        costs * constant,
+        costs * constant * low_mid_ratio,
+        costs * constant * low_high_ratio,
+    ], axis=-1)
+
+
+def surcharge_table(scenarios, rates=EUR_RATES):
+    """Compute the surcharges of every scenario in one batch, as a tidy table.
+
+    `scenarios` has one row per scenario with the columns `costs`,
+    `passengers`, `low`, `mid`, `high`, `tourism` and `frequent`; any further
+    columns (e.g. flight type, stringency) identify the scenario and are
+    repeated in the output. Returns one row per scenario, group and currency,
+    with the amount rounded to whole units as shown on the ticket.
+    """
+    eur = surcharges_eur(*(scenarios[col].to_numpy() for col in
+                           ["costs", "passengers", "low", "mid", "high", "tourism", "frequent"]))
+    currencies = list(rates)
+    converted = np.round(eur[:, :, None] * np.array([rates[c] for c in currencies]))
+
+    n_scenarios, n_groups, n_currencies = converted.shape
+    keys = scenarios.drop(columns=["costs", "passengers", "low", "mid", "high", "tourism", "frequent"])
+    table = keys.iloc[np.repeat(np.arange(n_scenarios), n_groups * n_currencies)].reset_index(drop=True)
+    table["allocation"] = np.tile(np.repeat([a for a, _ in GROUPS], n_currencies), n_scenarios)
+    table["group"] = np.tile(np.repeat([g for _, g in GROUPS], n_currencies), n_scenarios)
+    table["currency"] = np.tile(currencies, n_scenarios * n_groups)
+    table["cost_eur"] = np.repeat(eur.ravel(), n_currencies)
+    table["cost"] = converted.ravel()
+    return table
+
+
+def wide_tables(table, by="flight_type"):
+    """Split a tidy surcharge table into the wide per-flight-type, per-currency tables."""
+    tables = {}
+    for (key, currency), df in table.groupby([by, "currency"], sort=False):
+        wide = df.pivot(index="stringency", columns="group", values="cost")
+        wide = wide[[g for _, g in GROUPS]]
+        wide.columns = WIDE_COLUMNS
+        wide.columns.name = None
+        tables[(key, currency)] = wide.reset_index(drop=True)
+    return tables
+
+
+# ticket prices shown in the survey, by currency and flight type (see the
+# ticket lookup in 01_preprocessing_lmm.R)
+TICKET_COSTS = {
+    "usd": {"short": 150, "long": 400},
+    "chf": {"short": 130, "long": 350},
+    "cny": {"short": 1000, "long": 2140},
+}
+
+DEFAULT_SWEEP_CHUNKSIZE = 100_000
+
+
+def sweep_dimensions(stringency_costs, nr_passengers, grid):
+    """Return the named axes of a scenario grid as lists of records.
+
+    The flight type and stringency form one axis, since each pair has its own
+    cost and passenger count; every entry of `grid` adds another axis.
+    `grid` holds `load_factor` (scaling the passenger counts), `income` as
+    [low, mid, high] shares, `tourism`, `frequent`, and one list of eur
+    exchange rates per currency. Shares are prefixed with `share_` to keep
+    them apart from the surcharge columns of the same groups.
+    """
+    flights = [
+        {"flight_type": flight_type, "stringency": stringency,
+         "costs": cost, "base_passengers": nr_passengers[flight_type]}
+        for flight_type, costs in stringency_costs.items()
+        for stringency, cost in costs.items()
+    ]
+    dims = {"flight": flights}
+    dims["load_factor"] = [{"load_factor": v} for v in grid.get("load_factor", [1.0])]
+    dims["income"] = [
+        {"share_low": low, "share_mid": mid, "share_high": high}
+        for low, mid, high in grid["income"]
+    ]
+    dims["tourism"] = [{"share_tourism": v} for v in grid["tourism"]]
+    dims["frequent"] = [{"share_frequent": v} for v in grid["frequent"]]
+    for currency in TICKET_COSTS:
+        dims[currency] = [{currency: v} for v in grid.get(currency, [EUR_RATES[currency]])]
+    return {name: pd.DataFrame(records) for name, records in dims.items()}
+
+
+def grid_size(dims):
+    """Return the number of scenarios in the Cartesian grid over `dims`."""
+    return int(np.prod([len(axis) for axis in dims.values()]))
+
+
+def sweep_chunk(dims, start, stop, query=None):
+    """Evaluate scenarios `start` to `stop` of the Cartesian grid over `dims`.
+
+    Returns one row per scenario and currency with the scenario parameters,
+    the ticket price and the rounded surcharge of every group. `query` is a
+    `DataFrame.query` expression applied before returning, e.g.
+    "high / ticket_cost < 0.1".
+    """
+    shape = [len(axis) for axis in dims.values()]
+    positions = np.unravel_index(np.arange(start, stop), shape)
+    scenarios = pd.concat(
+        [axis.iloc[pos].reset_index(drop=True) for axis, pos in zip(dims.values(), positions)],
+        axis=1
+    )
+    scenarios.insert(0, "scenario", np.arange(start, stop))
+    scenarios["passengers"] = scenarios["base_passengers"] * scenarios["load_factor"]
+
+    eur = surcharges_eur(*(scenarios[col].to_numpy() for col in
+                           ["costs", "passengers", "share_low", "share_mid", "share_high",
+                            "share_tourism", "share_frequent"]))
+
+    params = scenarios.drop(columns=list(TICKET_COSTS) + ["base_passengers"])
+    blocks = []
+    for currency in TICKET_COSTS:
+        block = params.copy()
+        block["currency"] = currency
+        block["rate"] = scenarios[currency].to_numpy()
+        block["ticket_cost"] = block["flight_type"].map(TICKET_COSTS[currency])
+        converted = np.round(eur * block["rate"].to_numpy()[:, None])
+        for i, column in enumerate(WIDE_COLUMNS):
+            block[column] = converted[:, i]
+        if query is not None:
+            block = block.query(query)
+        blocks.append(block)
+    return pd.concat(blocks, ignore_index=True)
+
+
+def sweep(dims, out_file, query=None, chunksize=DEFAULT_SWEEP_CHUNKSIZE, workers=None):
+    """Evaluate the full scenario grid in parallel chunks, streaming the rows to a parquet file.
+
+    At most two chunks per worker are in flight, so memory stays flat however
+    large the grid. Returns the number of rows written.
+    """
+    import os
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    workers = workers or os.cpu_count()
+    total = grid_size(dims)
+    writer = None
+    n_rows = 0
+
+    def write(df):
+        nonlocal writer, n_rows
+        if not len(df) and writer is not None:
+            return
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(out_file, table.schema)
+        writer.write_table(table)
+        n_rows += table.num_rows
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for start in range(0, total, chunksize):
+            pending.append(pool.submit(sweep_chunk, dims, start, min(start + chunksize, total), query))
+            if len(pending) >= 2 * workers:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+
+    if writer is None:
+        write(sweep_chunk(dims, 0, 0))
+    writer.close()
+    return n_rows
+
+
+# currency of the tickets shown in each country's survey
+COUNTRY_CURRENCIES = {"us": "usd", "ch": "chf", "cn": "cny"}
+
+# passenger group charged under each treatment arm, as (group if the
+# respondent is charged, group otherwise); egalitarian charges by income
+TREATMENT_GROUPS = {
+    "egal": None,
+    "limit": ("frequent", "non_frequent"),
+    "prior": ("tourism", "non_tourism"),
+    "prop": ("all", "all"),
+}
+
+# countries whose ticket script saved the surcharge it showed as `add_cost`;
+# the others always get the reconstructed value
+RECORDED_ADD_COST = ["us"]
+
+# the fielded ticket scripts (wtp_ticket_values_us.js, wtp_ticket_values_ch.js
+# and wtp_ticket_vlaues_cn.js) compared the planned flights with the limit as
+# text in US and CH, so 10 or more planned flights were only over a limit of 1;
+# only used when reconstructing the fielded surcharges (`fielded=True`, the
+# add_cost_fielded setting), the default compares numbers as the R
+# reconstruction did
+TEXT_LIMIT_COUNTRIES = ["us", "ch"]
+
+# `charged` is the over-limit flag: planned flights above the limit under
+# limitarian, planned tourism flights under prioritarian, False otherwise;
+# `income` only matters under egalitarian and is "all" for the other arms
+LOOKUP_KEYS = ["country", "treatment", "route_length", "red_amt", "income", "charged"]
+
+
+def add_cost_lookup(table):
+    """Return the surcharge shown on the ticket for every survey condition, indexed by `LOOKUP_KEYS`."""
+    rows = []
+    for country, currency in COUNTRY_CURRENCIES.items():
+        costs = table[table["currency"] == currency].set_index(["flight_type", "stringency", "group"])["cost"]
+        for (route_length, red_amt, group), cost in costs.items():
+            for treatment, groups in TREATMENT_GROUPS.items():
+                if groups is None:
+                    if group in ("low", "mid", "high"):
+                        rows.append((country, treatment, route_length, red_amt, group, False, cost))
+                    continue
+                for charged, charged_group in zip((True, False), groups):
+                    if charged_group == group:
+                        rows.append((country, treatment, route_length, red_amt, "all", charged, cost))
+    lookup = pd.DataFrame(rows, columns=LOOKUP_KEYS + ["add_cost"]).drop_duplicates(LOOKUP_KEYS)
+    return lookup.set_index(LOOKUP_KEYS).sort_index()
+
+
+def _numeric(df, col):
+    if col not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[col], errors="coerce")
+
+
+def lookup_keys(df, country, fielded=False):
+    """Return the `LOOKUP_KEYS` of each respondent, as used by the survey's ticket scripts.
+
+    Limits are compared as numbers, as the R reconstruction and the
+    generated scripts do; with `fielded`, as the fielded scripts did
+    (`TEXT_LIMIT_COUNTRIES`).
+    """
+    treatment = df["treatment"].astype(object)
+    red_amt = df["red_amt"].astype(object)
+
+    # limits are per reduction amount, except in CN where one limit is used
+    if "limit_high" in df.columns:
+        limit = _numeric(df, "limit_high")
+    else:
+        limit = pd.Series(np.select(
+            [red_amt == "15%", red_amt == "30%", red_amt == "45%"],
+            [_numeric(df, "limit_15_high"), _numeric(df, "limit_30_high"), _numeric(df, "limit_45_high")],
+            np.nan
+        ), index=df.index)
+    planned = _numeric(df, "planned_flight")
+    tour = _numeric(df, "flight_tour")
+
+    # as in the R reconstruction, a missing flight count or limit is not over
+    # the limit, while a missing tourism count leaves the surcharge unknown
+    if fielded and country.lower() in TEXT_LIMIT_COUNTRIES:
+        over_limit = planned.astype("Int64").astype("string") > limit.astype("Int64").astype("string")
+    else:
+        over_limit = planned > limit
+    over_limit = over_limit.fillna(False).astype("boolean")
+    tourism = (tour > 0).astype("boolean").mask(tour.isna())
+    charged = pd.Series(False, index=df.index, dtype="boolean")
+    charged = charged.mask(treatment == "limit", over_limit).mask(treatment == "prior", tourism)
+
+    return pd.DataFrame({
+        "country": country.lower(),
+        "treatment": treatment,
+        "route_length": df["route_length"].astype(object),
+        "red_amt": red_amt,
+        "income": np.where(treatment == "egal", df["income"].astype(object), "all"),
+        "charged": charged,
+    }, index=df.index)
+
+
+def reconstruct_add_cost(df, country, lookup, fielded=False):
+    """Return the surcharge shown to each respondent, joined from `lookup` in one merge.
+
+    Control respondents saw no surcharge and get 0; respondents whose
+    condition is incomplete get a missing value. With `fielded`, limits are
+    compared as the fielded scripts did (see `lookup_keys`).
+    """
+    keys = lookup_keys(df, country, fielded)
+    merged = keys.merge(lookup.reset_index(), on=LOOKUP_KEYS, how="left")
+    add_cost = pd.Series(merged["add_cost"].to_numpy(), index=df.index)
+    return add_cost.mask(keys["treatment"] == "control", 0)
+
+
+def no_surcharge_shown(df):
+    """Flag the respondents the fielded ticket scripts showed no surcharge value ("undefined").
+
+    These are the control respondents and the long-haul prioritarian
+    respondents without tourism flights, whose branch in the fielded scripts
+    assigned `flight_tour = 0` instead of comparing it. Both are counted as
+    a surcharge of 0, as in the R analyses.
+    """
+    treatment = df["treatment"].astype(object)
+    long_haul = df["route_length"].astype(object) == "long"
+    non_tourist = (_numeric(df, "flight_tour") == 0).to_numpy()
+    return pd.Series((treatment == "control") | ((treatment == "prior") & long_haul & non_tourist),
+                     index=df.index)
+
+
+def displayed_add_cost(df):
+    """Return the surcharge the survey recorded as shown, if the export has it."""
+    if "add_cost" in df.columns:
+        return _numeric(df, "add_cost")
+    if {"ticket_cost", "total_cost"} <= set(df.columns):
+        return _numeric(df, "total_cost") - _numeric(df, "ticket_cost")
+    return None
+
+
+def check_add_cost(reconstructed, displayed):
+    """Count the respondents whose reconstructed surcharge differs from the displayed one."""
+    if displayed is None:
+        return pd.DataFrame(columns=["reconstructed", "displayed", "n"])
+    both = reconstructed.notna() & displayed.notna()
+    differs = both & (reconstructed != displayed)
+    pairs = pd.DataFrame({"reconstructed": reconstructed[differs], "displayed": displayed[differs]})
+    return pairs.value_counts().rename("n").reset_index()
+
+
+def attach_add_cost(df, country, lookup, fielded=False):
+    """Add the surcharge shown to each respondent and check it against what the survey recorded.
+
+    Exports of `RECORDED_ADD_COST` countries (US) keep the recorded value;
+    the others get the reconstructed one, replacing any `add_cost` column
+    they have, as the R preprocessing did. With `fielded` the surcharges are
+    reconstructed as the fielded scripts showed them (see `lookup_keys`), and
+    US respondents without a recorded value get the reconstructed one
+    instead of a missing value. Returns the frame and the mismatches.
+    """
+    if "treatment" not in df.columns:
+        return df, check_add_cost(None, None)
+    reconstructed = reconstruct_add_cost(df, country, lookup, fielded)
+    displayed = displayed_add_cost(df)
+    if country.lower() not in RECORDED_ADD_COST or "add_cost" not in df.columns:
+        df["add_cost"] = reconstructed
+    elif fielded:
+        df["add_cost"] = displayed.fillna(reconstructed)
+    return df, check_add_cost(reconstructed, displayed)
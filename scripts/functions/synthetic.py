@@ -0,0 +1,248 @@
+import csv
+import json
+
+import numpy as np
+import pandas as pd
+
+from functions.schema import AGE_LEVELS
+from functions.surcharges import COUNTRY_CURRENCIES, TICKET_COSTS, reconstruct_add_cost
+
+DEFAULT_SYNTHETIC_CHUNKSIZE = 100_000
+
+# file names of the real exports, so `raw_dir` can point at synthetic ones
+EXPORT_NAMES = {
+    "US": "Aviation_Justice_US_111224_1531.csv",
+    "CH": "Aviation_Justice_CH_111224_1531.csv",
+    "CN": "Aviation_Justice_CN_111224_1532.csv",
+}
+
+# answer scales of the survey
+LIKELY = ["very_unlikely", "unlikely", "somewhat_unlikely", "somewhat_likely", "likely", "very_likely"]
+WILLING = ["very_unwilling", "unwilling", "somewhat_unwilling", "somewhat_willing", "willing", "very_willing"]
+FAIR = ["very_unfair", "unfair", "somewhat_unfair", "somewhat_fair", "fair", "very_fair"]
+WORRIED = ["not_at_all_worried", "not_very_worried", "somewhat_worried", "extremely_worried", "prefer_not_to_say"]
+IMPORTANT = [
+    "very_unimportant", "unimportant", "somewhat_unimportant",
+    "somewhat_important", "important", "very_important", "prefer_not_to_say",
+]
+PURPOSES = ["tourism", "family", "business", "studies", "other"]
+
+EDUCATION = {
+    "US": ["no_high_school", "high_school", "bachelor", "postgrad"],
+    "CH": ["no_matura", "matura", "bachelor", "postgrad"],
+    "CN": ["no_high_school", "high_school", "bachelor", "postgrad"],
+}
+
+# personal income brackets of each country's questionnaire, lowest first
+INCOME_BRACKETS = {
+    "US": ["below_15k", "15k_25k", "25k_35k", "35k_45k", "45k_55k", "55k_70k",
+           "70k_90k", "90k_115k", "115k_150k", "above_150k"],
+    "CH": ["25k_below", "25k_35k", "35k_45k", "45k_55k", "55k_65k", "65k_80k",
+           "80k_95k", "95k_115k", "115k_175k", "175k_above"],
+    "CN": ["10k_below", "10k_20k", "20k_30k", "30k_45k", "45k_60k", "60k_75k",
+           "75k_100k", "100k_130k", "130k_180k", "above_180k"],
+}
+
+# shares of responses caught by each screening step, so every exclusion rule
+# removes some rows downstream
+SCREENING_RATES = {
+    "preview": 0.01,
+    "unfinished": 0.08,
+    "screened_out": {"true": 0.04, "true_trap1": 0.02, "true_trap2": 0.02, "true_trap3": 0.02},
+    "quota_met": 0.03,
+    "terminated": 0.01,
+    "region": 0.01,
+}
+
+TREATMENTS = ["control", "egal", "limit", "prior", "prop"]
+MAX_FLIGHTS = 30
+
+
+def _pick(rng, levels, n, p=None):
+    return np.asarray(levels, dtype=object)[rng.choice(len(levels), size=n, p=p)]
+
+
+def _scale(rng, levels, n, shift=None):
+    """Draw answers on an ordered scale, optionally shifted up by `shift` steps."""
+    codes = rng.integers(0, len(levels), size=n)
+    if shift is not None:
+        codes = np.clip(codes + shift, 0, len(levels) - 1)
+    return np.asarray(levels, dtype=object)[codes]
+
+
+def _screening(rng, country, n):
+    channel = np.where(rng.random(n) < SCREENING_RATES["preview"], "preview", "anonymous")
+    finished = np.where(rng.random(n) < SCREENING_RATES["unfinished"], "False", "True")
+
+    screened = np.full(n, "false", dtype=object)
+    u = rng.random(n)
+    edge = 0.0
+    for value, rate in SCREENING_RATES["screened_out"].items():
+        screened[(u >= edge) & (u < edge + rate)] = value
+        edge += rate
+    if country == "CH":
+        screened[(u >= edge) & (u < edge + SCREENING_RATES["region"])] = "true_region"
+
+    flag = np.full(n, None, dtype=object)
+    u = rng.random(n)
+    flag[u < SCREENING_RATES["quota_met"]] = "QuotaMet"
+    flag[(u >= SCREENING_RATES["quota_met"])
+         & (u < SCREENING_RATES["quota_met"] + SCREENING_RATES["terminated"])] = "Screened"
+    return channel, finished, screened, flag
+
+
+def synthetic_chunk(rng, country, start, n, lookup=None, columns=None):
+    """Return `n` synthetic responses of one country, shaped like its Qualtrics export.
+
+    Every column is drawn for the whole chunk at once. With `lookup` (the
+    add_cost lookup of wtp-tickets.py) the ticket costs shown to treated
+    respondents are filled in as the survey would have displayed them. With
+    `columns`, page timers are appended until the export has that many
+    columns, as the full exports with their timing and display-order
+    columns do.
+    """
+    country = country.upper()
+    ids = np.arange(start, start + n)
+    channel, finished, screened, flag = _screening(rng, country, n)
+
+    planned = rng.integers(0, MAX_FLIGHTS + 1, size=n)
+    after = np.where(rng.random(n) < 0.6, rng.integers(0, planned + 1), rng.integers(0, MAX_FLIGHTS + 1))
+    recent = rng.poisson(3, size=n)
+    flies = recent > 0
+    treatment = _pick(rng, TREATMENTS, n)
+    treated = treatment != "control"
+    route_length = _pick(rng, ["short", "long"], n)
+    income_bracket = rng.integers(0, 10, size=n)
+
+    df = pd.DataFrame({
+        "StartDate": (pd.Timestamp("2024-11-01") + pd.to_timedelta(rng.integers(0, 40 * 86400, size=n), unit="s"))
+        .strftime("%Y-%m-%d %H:%M:%S"),
+        "Duration (in seconds)": rng.integers(120, 3600, size=n),
+        "Finished": finished,
+        "ResponseId": pd.Series(ids).astype(str).str.zfill(12).radd(f"R_{country}"),
+        "DistributionChannel": channel,
+        "screened_out": screened,
+        "Q_TerminateFlag": flag,
+        "gender": _pick(rng, ["male", "female", "other", "prefer_not_to_say"], n, [0.48, 0.48, 0.02, 0.02]),
+        "age": _pick(rng, AGE_LEVELS, n),
+        "education": _pick(rng, EDUCATION[country], n),
+        "personal_income": np.where(rng.random(n) < 0.05, "prefer_not_to_say",
+                                    np.asarray(INCOME_BRACKETS[country], dtype=object)[income_bracket]),
+        "income": np.asarray(["low", "mid", "high"], dtype=object)[np.digitize(income_bracket, [3, 7])],
+        "flying_plan": np.where(planned > 0, "yes", "no"),
+        "flying_ever": np.where(flies | (rng.random(n) < 0.8), "yes", "no"),
+        "flying_recent": np.where(flies, "yes", "no"),
+        "flying_recent_number" if country == "US" else "recent_flights": np.where(flies, recent, np.nan),
+        "flying_purpose": np.where(flies, _pick(rng, PURPOSES, n), None),
+        "planned_flights": planned,
+        "planned_flight": planned,
+        "flight_tour": rng.binomial(planned, 0.5),
+        "clim_concern_wtc": _pick(rng, WORRIED, n),
+        "clim_concern_wtp": _pick(rng, IMPORTANT, n),
+        "eu_clim_conc": _pick(rng, IMPORTANT, n),
+        "treatment": treatment,
+        "red_amt": _pick(rng, ["15%", "30%", "45%"], n),
+        "route_length": route_length,
+    })
+    if country == "CH":
+        df["ch_region"] = _pick(rng, ["german", "french", "italian"], n, [0.65, 0.25, 0.10])
+    if country == "CN":
+        df["limit_high"] = rng.integers(1, 6, size=n)
+    else:
+        for amount in ["15", "30", "45"]:
+            df[f"limit_{amount}_high"] = rng.integers(1, 6, size=n)
+
+    # the treated see the same questions again with the surcharge, and lean
+    # towards flying less
+    wtc = rng.integers(0, len(LIKELY), size=n)
+    wtp = rng.integers(0, len(WILLING), size=n)
+    lean = (rng.random(n) < 0.6).astype(int)
+    df["c_wtc_fly"] = np.where(treated, None, np.asarray(LIKELY, dtype=object)[wtc])
+    df["t_wtc_fly"] = np.where(treated, _scale(rng, LIKELY, n, -lean), None)
+    df["c_wtp_buy"] = np.where(treated, None, np.asarray(WILLING, dtype=object)[wtp])
+    df["t_wtp_buy"] = np.where(treated, _scale(rng, WILLING, n, -lean), None)
+    df["c_wtc_fly_number"] = np.where(treated, np.nan, after)
+    df["t_wtc_fly_number"] = np.where(treated, after, np.nan)
+
+    for col in ["c_wtc_fair_self", "c_wtc_fair_group", "c_wtp_fair_self", "c_wtp_fair_group"]:
+        df[col] = np.where(treated, None, _pick(rng, FAIR, n))
+    for col in ["t_wtc_fair_self", "t_wtp_fair_self", "t_wtp_fair_group"]:
+        df[col] = np.where(treated, _pick(rng, FAIR, n), None)
+    for i, arm in enumerate(TREATMENTS[1:], start=1):
+        df[f"t{i}_wtc_group_fair"] = np.where(treatment == arm, _pick(rng, FAIR, n), None)
+
+    for context in ["general", "tax", "subsidy"]:
+        for principle in range(1, 5):
+            df[f"justice_{context}_{principle}"] = rng.integers(1, 8, size=n)
+
+    ticket = TICKET_COSTS[COUNTRY_CURRENCIES[country.lower()]]
+    df["ticket_cost"] = np.where(route_length == "long", ticket["long"], ticket["short"])
+    if lookup is not None:
+        add_cost = reconstruct_add_cost(df, country, lookup).fillna(0).to_numpy()
+        df["total_cost"] = df["ticket_cost"] + add_cost
+        if country == "US":
+            df["add_cost"] = add_cost
+    if columns is not None and columns > len(df.columns):
+        timers = pd.DataFrame(rng.random((n, columns - len(df.columns))).round(3) * 60,
+                              columns=[f"Q{i}_timer_Page Submit" for i in range(columns - len(df.columns))])
+        df = pd.concat([df, timers], axis=1)
+    return df
+
+
+def qualtrics_header(columns):
+    """Return the two rows Qualtrics writes under the column names: question text and import ids."""
+    return [list(columns), [json.dumps({"ImportId": col}) for col in columns]]
+
+
+def write_synthetic_export(out_file, country, n, seed=None, chunksize=DEFAULT_SYNTHETIC_CHUNKSIZE,
+                           lookup=None, columns=None):
+    """Stream `n` synthetic responses of one country to a Qualtrics-shaped csv.
+
+    Chunks are drawn from independent generators spawned from `seed` (an
+    integer or a `SeedSequence`), so a
+    file is reproducible for a given seed and chunk size, and only one chunk
+    is in memory at a time.
+    """
+    starts = range(0, n, chunksize)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(len(starts))
+    for i, (start, chunk_seed) in enumerate(zip(starts, seeds)):
+        df = synthetic_chunk(np.random.default_rng(chunk_seed), country, start, min(chunksize, n - start),
+                             lookup, columns)
+        if i == 0:
+            with open(out_file, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(df.columns)
+                writer.writerows(qualtrics_header(df.columns))
+        df.to_csv(out_file, mode="a", header=False, index=False)
+
+
+def pilot_panel(rng, n, max_flights=MAX_FLIGHTS, max_likert=6):
+    """Return the synthetic pilot panel used for the power analysis, drawn without row loops."""
+    planned = rng.integers(0, max_flights + 1, size=n)
+    control_wtc = rng.integers(1, max_likert + 1, size=n)
+
+    # 90% of the time the control flights do not exceed planned flights by
+    # more than one, otherwise they are random
+    control_flights = np.where(rng.random(n) < 0.9,
+                               rng.integers(0, planned + 2),
+                               rng.integers(0, max_flights + 1))
+    # 60% of the time treatment flights are at most the control flights and
+    # treatment wtc at least the control wtc
+    treatment_flights = np.where(rng.random(n) < 0.6,
+                                 rng.integers(0, control_flights + 1),
+                                 rng.integers(0, max_flights + 1))
+    treatment_wtc = np.where(rng.random(n) < 0.6,
+                             rng.integers(control_wtc, max_likert + 1),
+                             rng.integers(1, max_likert + 1))
+
+    return pd.DataFrame({
+        "ID": np.arange(1, n + 1),
+        "planned_flights": planned,
+        "control_wtc": control_wtc,
+        "control_flights": control_flights,
+        "treatment_wtc": treatment_wtc,
+        "treatment_flights": treatment_flights,
+        "treatment": rng.choice([1, 2, 3, 4], size=n),
+    })
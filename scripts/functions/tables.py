@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+
+# columnar formats written next to the csv exports when `columnar_format` is set
+COLUMNAR_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def columnar_path(csv_path, fmt):
+    """Return the path of the columnar copy of a csv file."""
+    return os.path.splitext(csv_path)[0] + COLUMNAR_FORMATS[fmt]
+
+
+def to_categorical(df, max_share=0.5):
+    """Store repeated string answers as categoricals so their levels survive the round trip."""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col].dtype):
+            n_levels = df[col].nunique()
+            if n_levels <= max_share * max(len(df), 1):
+                df[col] = df[col].astype("category")
+    return df
+
+
+def write_columnar(df, path):
+    """Write a typed table as parquet or arrow ipc, depending on the file suffix."""
+    df = df.reset_index(drop=True)
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    elif path.endswith(".arrow"):
+        df.to_feather(path)
+    else:
+        raise ValueError(f"unknown columnar format: {path}")
+
+
+def read_columnar(path, columns=None):
+    """Read the requested columns of a parquet or arrow ipc file into a typed frame, without parsing csv.
+
+    The file is opened memory-mapped, but `to_pandas` still copies the
+    columns into memory; only the columns read are paid for.
+    """
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    if path.endswith(".parquet"):
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    elif path.endswith(".arrow"):
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    else:
+        raise ValueError(f"unknown columnar format: {path}")
+    return table.to_pandas()
+
+
+def read_table(path, columns=None, fmt=None):
+    """Read a pipeline table, preferring its columnar copy when `fmt` is set and it exists."""
+    if fmt is not None:
+        columnar = columnar_path(path, fmt)
+        if os.path.exists(columnar):
+            return read_columnar(columnar, columns)
+    return pd.read_csv(path, usecols=columns)
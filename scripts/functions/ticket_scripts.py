@@ -0,0 +1,217 @@
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+import pandas as pd
+
+from functions.surcharges import COUNTRY_CURRENCIES, TICKET_COSTS, no_surcharge_shown, reconstruct_add_cost
+
+# Qualtrics scripts of the WTP ticket page, generated from one template
+QUALTRICS_DIR = "data-collection/experiment-qualtrics"
+TICKET_TEMPLATE = os.path.join(QUALTRICS_DIR, "wtp_ticket_lookup.template.js")
+TICKET_TABLES = os.path.join(QUALTRICS_DIR, "wtp_ticket_tables.json")
+
+# the hand-written scripts used in the fielded survey, kept as they were run
+FIELDED_SCRIPTS = {
+    "us": "wtp_ticket_values_us.js",
+    "ch": "wtp_ticket_values_ch.js",
+    "cn": "wtp_ticket_vlaues_cn.js",
+}
+
+# how amounts are shown on the ticket, as (prefix, suffix)
+CURRENCY_LABELS = {"usd": ("$", ""), "chf": ("CHF ", ""), "cny": ("", "元")}
+
+REDUCTIONS = ["15%", "30%", "45%"]
+
+# embedded data field holding the flight limit of each reduction amount; CN
+# was asked for one limit
+LIMIT_FIELDS = {
+    "us": {r: f"limit_{r[:-1]}_high" for r in REDUCTIONS},
+    "ch": {r: f"limit_{r[:-1]}_high" for r in REDUCTIONS},
+    "cn": {r: "limit_high" for r in REDUCTIONS},
+}
+
+# embedded data values tried by `input_space`; flight counts on both sides of
+# every limit, with two digits to catch limits compared as text
+INPUT_VALUES = {
+    "treatment": ["control", "egal", "limit", "prior", "prop"],
+    "route_length": ["short", "long"],
+    "red_amt": REDUCTIONS,
+    "income": ["low", "mid", "high"],
+    "planned_flight": ["0", "1", "2", "3", "6", "10"],
+    "limit": ["0", "2", "5"],
+    "flight_tour": ["0", "1", "2"],
+}
+
+_GENERATED = ("// generated by data-collection/wtp-tickets.py --scripts from wtp_ticket_lookup.template.js,\n"
+              "// edit the template and rerun it rather than this file\n")
+
+# runs a ticket script once per case against a stub of the Qualtrics API and
+# the ticket table, and prints what it saved and displayed
+_HARNESS = r"""
+const fs = require("fs");
+const [scriptFile, casesFile] = process.argv.slice(2);
+const run = new Function("Qualtrics", "document", "console", fs.readFileSync(scriptFile, "utf8"));
+const cases = JSON.parse(fs.readFileSync(casesFile, "utf8"));
+const results = cases.map(function (embedded) {
+  let onload = null;
+  const saved = {};
+  const cells = {};
+  const Qualtrics = {SurveyEngine: {
+    addOnload: function (f) { onload = f; },
+    getEmbeddedData: function (name) { return name in embedded ? embedded[name] : ""; },
+    setEmbeddedData: function (name, value) { saved[name] = value; }
+  }};
+  const document = {getElementById: function (id) { return cells[id] = cells[id] || {}; }};
+  run(Qualtrics, document, {log: function () {}});
+  onload.call({});
+  const shown = {};
+  for (const id in cells) { shown[id] = String(cells[id].textContent); }
+  return Object.assign({}, saved, shown);
+});
+process.stdout.write(JSON.stringify(results));
+"""
+
+
+def script_path(country, directory=QUALTRICS_DIR, fielded=False):
+    """Return the generated ticket script of one country (us, ch, cn), or with `fielded` the one used in the survey."""
+    if fielded:
+        return os.path.join(directory, FIELDED_SCRIPTS[country])
+    return os.path.join(directory, f"wtp_ticket_lookup_{country}.js")
+
+
+def _amount(value):
+    return int(value) if float(value).is_integer() else float(value)
+
+
+def _label(value, missing):
+    # how javascript prints an amount, `missing` for undefined or NaN
+    return missing if pd.isna(value) else str(_amount(value))
+
+
+def ticket_table(lookup, country):
+    """Return what the ticket script of one country needs from the add_cost lookup, as a json-able dict.
+
+    The surcharges are keyed by treatment|route_length|red_amt|income|charged,
+    the `LOOKUP_KEYS` after country, so the page finds a respondent's
+    surcharge in one lookup.
+    """
+    currency = COUNTRY_CURRENCIES[country]
+    prefix, suffix = CURRENCY_LABELS[currency]
+    add_cost = {
+        "|".join([treatment, route_length, red_amt, income, str(bool(charged)).lower()]): _amount(cost)
+        for (treatment, route_length, red_amt, income, charged), cost in lookup.loc[country, "add_cost"].items()
+    }
+    return {
+        "currency_prefix": prefix,
+        "currency_suffix": suffix,
+        "ticket_cost": TICKET_COSTS[currency],
+        "limit_fields": LIMIT_FIELDS[country],
+        "add_cost": add_cost,
+    }
+
+
+def render_ticket_script(table, template=TICKET_TEMPLATE):
+    """Return the ticket script of one country: the template with its table filled in."""
+    with open(template, encoding="utf-8") as f:
+        lines = f.read().splitlines(keepends=True)
+    # the template's own header comment is replaced by the generated one
+    while lines and lines[0].startswith("//"):
+        lines.pop(0)
+    body = json.dumps(table, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+    return _GENERATED + "".join(lines).replace("__TICKET_TABLE__", body)
+
+
+def write_ticket_scripts(lookup, directory=QUALTRICS_DIR, template=TICKET_TEMPLATE):
+    """Write the ticket script of every country and the tables behind them to `directory`; return the script paths."""
+    tables = {country: ticket_table(lookup, country) for country in COUNTRY_CURRENCIES}
+    paths = {}
+    for country, table in tables.items():
+        paths[country] = script_path(country, directory)
+        with open(paths[country], "w", encoding="utf-8") as f:
+            f.write(render_ticket_script(table, template))
+    with open(os.path.join(directory, os.path.basename(TICKET_TABLES)), "w", encoding="utf-8") as f:
+        json.dump(tables, f, indent=1, ensure_ascii=False)
+        f.write("\n")
+    return paths
+
+
+def input_space(country, values=INPUT_VALUES):
+    """Return every combination of the embedded data the ticket script reads, as strings like Qualtrics passes them.
+
+    Each limit field of the country varies on its own, so a script reading
+    the limit of the wrong reduction amount is caught.
+    """
+    fields = sorted(set(LIMIT_FIELDS[country].values()))
+    axes = {name: v for name, v in values.items() if name != "limit"}
+    axes.update({field: values["limit"] for field in fields})
+    return pd.DataFrame(list(itertools.product(*axes.values())), columns=list(axes))
+
+
+def evaluate_script(path, cases, node="node"):
+    """Run a ticket script on every row of `cases` under node; return what it saved and displayed per case."""
+    if shutil.which(node) is None:
+        raise RuntimeError(f"{node} not found, it is needed to run the ticket scripts")
+    with tempfile.TemporaryDirectory() as tmp:
+        harness = os.path.join(tmp, "harness.js")
+        cases_file = os.path.join(tmp, "cases.json")
+        with open(harness, "w") as f:
+            f.write(_HARNESS)
+        cases.to_json(cases_file, orient="records")
+        result = subprocess.run([node, harness, os.path.abspath(path), cases_file],
+                                capture_output=True, text=True, check=True)
+    return pd.DataFrame(json.loads(result.stdout), index=cases.index)
+
+
+def expected_tickets(cases, country, lookup, fielded=False):
+    """Return the ticket price and surcharge of every case as preprocessing reconstructs them, with their labels.
+
+    With `fielded`, as the fielded scripts showed them: limits compared as
+    they did, and no surcharge value for the respondents flagged by
+    `no_surcharge_shown`.
+    """
+    currency = COUNTRY_CURRENCIES[country]
+    prefix, suffix = CURRENCY_LABELS[currency]
+    expected = pd.DataFrame(index=cases.index)
+    expected["ticket_cost"] = cases["route_length"].map(TICKET_COSTS[currency])
+    expected["add_cost"] = reconstruct_add_cost(cases, country, lookup, fielded)
+    if fielded:
+        expected["add_cost"] = expected["add_cost"].mask(no_surcharge_shown(cases))
+    expected["total_cost"] = expected["ticket_cost"] + expected["add_cost"]
+    for cell, column, missing in [("ticketPriceCell", "ticket_cost", "undefined"),
+                                  ("additionalCostCell", "add_cost", "undefined"),
+                                  ("totalCostCell", "total_cost", "NaN")]:
+        expected[cell] = prefix + expected[column].map(lambda v: _label(v, missing)) + suffix
+    return expected
+
+
+def verify_ticket_script(path, country, lookup, node="node", fielded=False):
+    """Run a ticket script over the full input space and return the cases where it disagrees with Python.
+
+    Scripts that do not save `add_cost` (the fielded CH and CN ones) are
+    checked on the total minus the ticket price instead. With `fielded`,
+    the script is compared with what the fielded scripts showed (see
+    `expected_tickets`).
+    """
+    cases = input_space(country)
+    got = evaluate_script(path, cases, node)
+    if "add_cost" not in got.columns:
+        got["add_cost"] = pd.to_numeric(got["total_cost"], errors="coerce") - got["ticket_cost"]
+    expected = expected_tickets(cases, country, lookup, fielded)
+    differs = pd.Series(False, index=cases.index)
+    for column in expected.columns:
+        value = got[column] if column in got.columns else pd.Series(None, index=cases.index, dtype=object)
+        if column.endswith("Cell"):
+            differs |= value.astype(str) != expected[column]
+        else:
+            value = pd.to_numeric(value, errors="coerce")
+            # both missing is a match, a script may show no value on purpose
+            differs |= ~(value.eq(expected[column]) | (value.isna() & expected[column].isna()))
+    mismatches = cases[differs].copy()
+    for column in ["ticket_cost", "add_cost", "total_cost"]:
+        mismatches[f"expected_{column}"] = expected.loc[differs, column]
+        mismatches[column] = got.loc[differs, column] if column in got.columns else None
+    return mismatches
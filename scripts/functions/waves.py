@@ -0,0 +1,286 @@
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from functions.cube import CUBE_DIMENSIONS, PARTITION_CUBE, DemographicCube, add_cells, count_file
+from functions.preprocessing import COUNTRIES, add_duplicates, assign_ids, flag_duplicates, preprocess_country
+from functions.qualtrics import DEFAULT_CHUNKSIZE, QUALTRICS_HEADER_ROWS
+from functions.respondents import DEDUP_KEYS, REPORT_COLUMNS, RespondentIndex
+
+# Qualtrics exports of one fieldwork wave, stamped with the download time, e.g.
+# Aviation_Justice_US_111224_1531.csv or CH_Aviation_Justice_031224_0830.csv
+WAVE_PATTERN = re.compile(
+    r"^(?:Aviation_Justice_(US|CH|CN)_|(US|CH|CN)_Aviation_Justice_)(\d{6})_(\d{4})\.csv$"
+)
+
+STORE_DIR = "data/clean_store"
+# key hashes of every respondent kept in the store, see functions/respondents.py
+INDEX_FILE = "respondent_index.csv"
+
+
+def export_wave(name):
+    """Return the country and wave label (YYYYMMDD_HHMM) of an export file name, or None if it does not match."""
+    match = WAVE_PATTERN.match(os.path.basename(name))
+    if match is None:
+        return None
+    country = match.group(1) or match.group(2)
+    return country, datetime.strptime(match.group(3) + match.group(4), "%d%m%y%H%M").strftime("%Y%m%d_%H%M")
+
+
+def discover_exports(raw_dir):
+    """Return the exports in `raw_dir` as a frame of country, wave and path, oldest wave first.
+
+    Waves are labelled by the download time in the file name (YYYYMMDD_HHMM),
+    so the labels sort chronologically.
+    """
+    rows = []
+    for name in os.listdir(raw_dir):
+        parsed = export_wave(name)
+        if parsed is None:
+            continue
+        country, wave = parsed
+        rows.append({"country": country, "wave": wave, "path": os.path.join(raw_dir, name)})
+    exports = pd.DataFrame(rows, columns=["country", "wave", "path"])
+    order = exports["country"].map(COUNTRIES.index)
+    return exports.assign(order=order).sort_values(["wave", "order"]).drop(columns="order").reset_index(drop=True)
+
+
+def load_manifest(store=STORE_DIR):
+    """Return the manifest of the clean store, or an empty one.
+
+    Partitions are listed in the order they were appended; a partition is
+    only part of the store once it is in the manifest, so files left by an
+    interrupted ingestion are ignored and overwritten.
+    """
+    try:
+        with open(os.path.join(store, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"next_id": 1, "sources": {}, "partitions": [], "views": {}}
+
+
+def save_manifest(manifest, store=STORE_DIR):
+    """Write the manifest atomically, the commit point of an ingestion."""
+    os.makedirs(store, exist_ok=True)
+    path = os.path.join(store, "manifest.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def seen_ids(manifest, country, store=STORE_DIR):
+    """Return the ResponseIds of one country already in the store, kept or excluded."""
+    ids = [
+        pd.read_csv(os.path.join(store, p["dir"], "seen_ids.csv"), dtype=str)["ResponseId"]
+        for p in manifest["partitions"] if p["country"] == country
+    ]
+    return set(pd.concat(ids)) if ids else set()
+
+
+def _read_response_ids(path):
+    return pd.read_csv(path, skiprows=QUALTRICS_HEADER_ROWS, usecols=["ResponseId"], dtype=str)["ResponseId"]
+
+
+def _preprocess_export(args):
+    # runs in a worker: filter the unseen responses of one export into its
+    # partition directory, still without ids, with the key hashes next to them
+    country, path, out_dir, skip, columns, patterns, chunksize, lookup_file, keys, fielded = args
+    counts, issues = preprocess_country(country, path, os.path.join(out_dir, "filtered.csv"),
+                                        columns, patterns, chunksize, lookup_file, skip_ids=skip,
+                                        key_file=os.path.join(out_dir, "keys.csv"), keys=keys,
+                                        fielded=fielded)
+    return counts, issues
+
+
+def ingest_waves(raw_dir, file_digest, store=STORE_DIR, columns=None, patterns=(),
+                 chunksize=DEFAULT_CHUNKSIZE, lookup_file=None, workers=None, keys=DEDUP_KEYS,
+                 fielded=False):
+    """Append the responses of unseen exports in `raw_dir` to the partitioned clean store.
+
+    Exports whose bytes were already ingested (by `file_digest`) are skipped
+    without being read; in new or changed exports only the responses whose
+    ResponseId is not in the store yet are preprocessed, so re-downloaded
+    cumulative exports cost only their new rows. Each export becomes one
+    partition (`country=XX/wave=YYYYMMDD_HHMM`), and partitions are numbered
+    in wave and country order from the store's next id, so ids already
+    handed out never change. Kept responses matching a respondent already
+    in the store (see `RespondentIndex`) are excluded as duplicates, in the
+    same order, and reported in the partition's `duplicates.csv`. `fielded`
+    is passed on to `attach_add_cost`. Returns
+    the partitions added and the schema issues per country.
+    """
+    manifest = load_manifest(store)
+    exports = discover_exports(raw_dir)
+    digests = {path: file_digest(path) for path in exports["path"]}
+    new = exports[[
+        manifest["sources"].get(os.path.basename(path), {}).get("digest") != digests[path]
+        for path in exports["path"]
+    ]]
+    if new.empty:
+        return [], {}
+
+    jobs = []
+    for row in new.itertuples(index=False):
+        part_dir = f"country={row.country}/wave={row.wave}"
+        # an export re-downloaded within the same wave gets its own partition
+        existing = {p["dir"] for p in manifest["partitions"]}
+        suffix = 1
+        while part_dir in existing or any(job[2] == part_dir for job in jobs):
+            suffix += 1
+            part_dir = f"country={row.country}/wave={row.wave}-{suffix}"
+        jobs.append((row.country, row.path, part_dir))
+
+    # responses already stored, growing export by export so that two new
+    # cumulative exports of one country do not both claim the same responses
+    seen = {country: seen_ids(manifest, country, store) for country in set(new["country"])}
+    args = []
+    n_responses = []
+    for country, path, part_dir in jobs:
+        out_dir = os.path.join(store, part_dir)
+        os.makedirs(out_dir, exist_ok=True)
+        ids = _read_response_ids(path)
+        new_ids = ids[~ids.isin(seen[country])].drop_duplicates()
+        new_ids.to_frame().to_csv(os.path.join(out_dir, "seen_ids.csv"), index=False)
+        n_responses.append(len(new_ids))
+        args.append((country, path, out_dir, frozenset(seen[country]), columns, patterns, chunksize, lookup_file,
+                     keys, fielded))
+        seen[country] |= set(new_ids)
+    if workers == 1:
+        results = list(map(_preprocess_export, args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_preprocess_export, args))
+
+    # claims of partitions that never made it into the manifest are dropped
+    index = RespondentIndex.load(os.path.join(store, INDEX_FILE), [p["dir"] for p in manifest["partitions"]], keys)
+    added = []
+    issues = {}
+    for (country, path, part_dir), (counts, country_issues), n_seen in zip(jobs, results, n_responses):
+        out_dir = os.path.join(store, part_dir)
+        filtered = os.path.join(out_dir, "filtered.csv")
+        key_file = os.path.join(out_dir, "keys.csv")
+        duplicate = None
+        if int(counts["kept"]):
+            duplicate, report = flag_duplicates(index, key_file, country, part_dir.split("wave=")[1], part_dir)
+            report.to_csv(os.path.join(out_dir, "duplicates.csv"), index=False)
+        counts = add_duplicates(counts, 0 if duplicate is None else int(duplicate.sum()))
+        n_kept = int(counts["kept"])
+        if n_kept:
+            assign_ids(filtered, os.path.join(out_dir, "part.csv"), manifest["next_id"], chunksize, drop=duplicate)
+        for scratch in [filtered, key_file]:
+            if os.path.exists(scratch):
+                os.remove(scratch)
+        partition = {
+            "dir": part_dir, "country": country, "wave": part_dir.split("wave=")[1],
+            "source": os.path.basename(path), "first_id": manifest["next_id"] if n_kept else None,
+            "n": n_kept, "responses": n_seen,
+            "exclusions": {rule: int(n) for rule, n in counts.items() if rule != "kept"},
+        }
+        manifest["next_id"] += n_kept
+        manifest["partitions"].append(partition)
+        manifest["sources"][os.path.basename(path)] = {"digest": digests[path], "country": country,
+                                                      "partition": part_dir}
+        added.append(partition)
+        issues.setdefault(country, []).append(country_issues)
+    index.save(os.path.join(store, INDEX_FILE))
+    save_manifest(manifest, store)
+    return added, {country: pd.concat(frames, ignore_index=True) for country, frames in issues.items()}
+
+
+def _header(path):
+    with open(path, "rb") as f:
+        return f.readline()
+
+
+def update_view(manifest, country, out_file, store=STORE_DIR):
+    """Write the clean data of one country as the concatenation of its partitions.
+
+    Partition files are copied byte for byte. When `out_file` still holds
+    exactly the partitions it was last built from, only the new ones are
+    appended; otherwise (e.g. snakemake removed it before the job) it is
+    rebuilt. Partitions with other columns than the first, e.g. after
+    `preprocess_columns` changed, are aligned with pandas instead.
+    """
+    parts = [p for p in manifest["partitions"] if p["country"] == country and p["n"]]
+    files = [os.path.join(store, p["dir"], "part.csv") for p in parts]
+    view = manifest["views"].get(out_file)
+    if not files:
+        pd.DataFrame(columns=["id"]).to_csv(out_file, index=False)
+        manifest["views"][out_file] = {"partitions": [], "size": os.path.getsize(out_file)}
+        return
+
+    headers = {_header(path) for path in files}
+    if len(headers) > 1:
+        pd.concat([pd.read_csv(path, dtype=str, na_filter=False) for path in files]).to_csv(out_file, index=False)
+        manifest["views"][out_file] = {"partitions": [p["dir"] for p in parts], "size": os.path.getsize(out_file)}
+        return
+
+    built = view["partitions"] if view else []
+    intact = (
+        view is not None
+        and os.path.exists(out_file)
+        and os.path.getsize(out_file) == view["size"]
+        and built == [p["dir"] for p in parts][:len(built)]
+        and len(built) > 0
+    )
+    if not intact:
+        built = []
+        with open(out_file, "wb") as out:
+            out.write(next(iter(headers)))
+    with open(out_file, "ab") as out:
+        for partition, path in zip(parts, files):
+            if partition["dir"] in built:
+                continue
+            with open(path, "rb") as f:
+                f.readline()
+                shutil.copyfileobj(f, out)
+    manifest["views"][out_file] = {"partitions": [p["dir"] for p in parts], "size": os.path.getsize(out_file)}
+
+
+def store_exclusions(manifest):
+    """Return the exclusion counts per rule and country summed over all partitions, as preprocessing reports them."""
+    counts = {}
+    for p in manifest["partitions"]:
+        column = counts.setdefault(p["country"], {})
+        for rule, n in {**p["exclusions"], "kept": p["n"]}.items():
+            column[rule] = column.get(rule, 0) + n
+    exclusions = pd.DataFrame({country: counts.get(country, {}) for country in COUNTRIES}).fillna(0).astype(int)
+    exclusions.index.name = "rule"
+    # duplicate and kept last, as in the exclusions of a single export
+    rules = [rule for rule in exclusions.index if rule not in ("duplicate", "kept")]
+    return exclusions.loc[rules + [rule for rule in ("duplicate", "kept") if rule in exclusions.index]]
+
+
+def store_duplicates(manifest, store=STORE_DIR):
+    """Return the duplicate reports of all partitions, in the order they were ingested."""
+    reports = [
+        pd.read_csv(os.path.join(store, p["dir"], "duplicates.csv"), dtype=str)
+        for p in manifest["partitions"] if p["exclusions"].get("duplicate")
+    ]
+    return pd.concat(reports, ignore_index=True) if reports else pd.DataFrame(columns=REPORT_COLUMNS)
+
+
+def store_cube(manifest, store=STORE_DIR, dimensions=CUBE_DIMENSIONS, chunksize=DEFAULT_CHUNKSIZE):
+    """Return the demographic cube of all partitions, counting each partition's respondents only once.
+
+    The cells of a partition are kept next to it in `cube.csv`; they are
+    counted from `part.csv` when missing, e.g. in stores ingested before the
+    cube existed, or when `dimensions` changed.
+    """
+    parts = []
+    for p in manifest["partitions"]:
+        if not p["n"]:
+            continue
+        path = os.path.join(store, p["dir"], PARTITION_CUBE)
+        part = DemographicCube.load(path) if os.path.exists(path) else None
+        if part is None or part.dimensions != list(dimensions):
+            cells = count_file(os.path.join(store, p["dir"], "part.csv"), dimensions, chunksize)
+            part = DemographicCube.from_cells(p["country"], p["wave"], cells, dimensions)
+            part.save(path)
+        parts.append(part.cells)
+    return DemographicCube(add_cells(parts, ["country", "wave"] + list(dimensions)), dimensions)
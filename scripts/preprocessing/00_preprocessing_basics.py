@@ -1,71 +1,291 @@
 import pandas as pd
+import yaml
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.qualtrics import DEFAULT_CHUNKSIZE
+from functions.preprocessing import (COUNTRIES, add_duplicates, assign_ids, flag_duplicates, id_offsets,
+                                     preprocess_country, preprocessing_settings, report_issues)
+from functions.cube import CUBE_FILE, DemographicCube, count_file
+from functions.quality import QUALITY_FILE, quality_table
+from functions.respondents import RespondentIndex
+from functions.schema import SURVEY_SCHEMA, apply_schema
+from functions.tables import columnar_path, to_categorical, write_columnar
+from functions.cache import cache_key, file_digest, restore_outputs, store_outputs
+from functions.waves import (STORE_DIR, export_wave, ingest_waves, load_manifest, save_manifest, store_cube,
+                             store_duplicates, store_exclusions, update_view)
+from functions.profiling import PROFILE_LOG, stage
 
 # ----------------------------
 # Snakemake / local paths
 # ----------------------------
+# Snakemake runs this script once per country in `preprocess_country`
+# (load, filter, fix typos, type, attach the displayed surcharge, hash the
+# respondent keys) and once in `preprocess_basics` (drop duplicates, assign ids);
+# run locally, the countries are processed in a process pool instead.
+# With `preprocess_waves`, every export in raw_dir is discovered by name and
+# only unseen ones are appended to the clean store (`ingest_waves`)
 if 'snakemake' in dir():
-    file_us = snakemake.input['us']
-    file_ch = snakemake.input['ch']
-    file_cn = snakemake.input['cn']
-    out_us  = snakemake.output['us']
-    out_ch  = snakemake.output['ch']
-    out_cn  = snakemake.output['cn']
+    rule   = snakemake.rule
+    config = snakemake.config
+    waves  = rule == "ingest_waves"
+    if rule == "preprocess_country":
+        country        = snakemake.wildcards['country'].upper()
+        file_raw       = snakemake.input['raw']
+        file_lookup    = snakemake.input['add_cost_lookup']
+        out_filtered   = snakemake.output['filtered']
+        out_country_ex = snakemake.output['exclusions']
+        out_keys       = snakemake.output['keys']
+    elif waves:
+        raw_dir        = snakemake.params['raw_dir']
+        file_lookup    = snakemake.input['add_cost_lookup']
+        outputs        = {c: snakemake.output[c.lower()] for c in COUNTRIES}
+        out_exclusions = snakemake.output['exclusions']
+        out_duplicates = snakemake.output['duplicates']
+        out_cube       = snakemake.output['cube']
+        out_quality    = snakemake.output['quality']
+    else:
+        filtered       = {c: snakemake.input[f'filtered_{c.lower()}'] for c in COUNTRIES}
+        country_ex     = {c: snakemake.input[f'exclusions_{c.lower()}'] for c in COUNTRIES}
+        key_files      = {c: snakemake.input[f'keys_{c.lower()}'] for c in COUNTRIES}
+        # only their names are used, to label the wave in the demographic cube
+        files          = {c: snakemake.params['exports'][c.lower()] for c in COUNTRIES}
+        outputs        = {c: snakemake.output[c.lower()] for c in COUNTRIES}
+        out_exclusions = snakemake.output['exclusions']
+        out_duplicates = snakemake.output['duplicates']
+        out_cube       = snakemake.output['cube']
+        out_quality    = snakemake.output['quality']
 else:
-    file_us = "raw-data/Aviation_Justice_US_111224_1531.csv"
-    file_ch = "raw-data/Aviation_Justice_CH_111224_1531.csv"
-    file_cn = "raw-data/Aviation_Justice_CN_111224_1532.csv"
-    out_us  = "data/data_clean_us.csv"
-    out_ch  = "data/data_clean_ch.csv"
-    out_cn  = "data/data_clean_cn.csv"
+    rule = None
+    with open("config.yaml") as f:
+        config = yaml.safe_load(f)
+    raw_dir = config.get("raw_dir", "raw-data")
+    waves   = config.get("preprocess_waves", False)
+    files = {
+        "US": f"{raw_dir}/Aviation_Justice_US_111224_1531.csv",
+        "CH": f"{raw_dir}/Aviation_Justice_CH_111224_1531.csv",
+        "CN": f"{raw_dir}/Aviation_Justice_CN_111224_1532.csv",
+    }
+    # written by data-collection/wtp-tickets.py
+    file_lookup    = "data/add_cost_lookup.csv"
+    filtered       = {c: f"data/interim/data_filtered_{c.lower()}.csv" for c in COUNTRIES}
+    key_files      = {c: f"data/interim/keys_{c.lower()}.csv" for c in COUNTRIES}
+    outputs        = {c: f"data/data_clean_{c.lower()}.csv" for c in COUNTRIES}
+    out_exclusions = "data/exclusions.csv"
+    out_duplicates = "data/duplicates.csv"
+    out_cube       = CUBE_FILE
+    out_quality    = QUALITY_FILE
+
+# settings that change the clean data, part of the cache key with the input
+# bytes and the preprocessing code (the Snakefile's raw digest uses the same)
+settings  = preprocessing_settings(config)
+# columns requested by the downstream rules, None keeps every column
+columns   = settings["columns"]
+patterns  = settings["patterns"]
+keys      = settings["keys"]
+cube_dims = settings["cube"]
+speeders  = settings["speeders"]
+columnar  = settings["columnar"]
+fielded   = settings["fielded"]
+chunksize = config.get("preprocess_chunksize", DEFAULT_CHUNKSIZE)
+workers   = snakemake.threads if waves and rule is not None else config.get("preprocess_workers", len(COUNTRIES))
+store     = config.get("clean_store", STORE_DIR)
+use_cache = config.get("preprocess_cache", True)
+# per-stage timings appended to output/profile/stages.jsonl
+profile   = PROFILE_LOG if config.get("profile_stages", True) else None
 
 # ----------------------------
-# Import data
+# Save clean data with response IDs
 # ----------------------------
-files = {"US": file_us, "CH": file_ch, "CN": file_cn}
+def save_clean(exclusions):
+    """Drop duplicate respondents, number the responses across countries from the kept row counts and save them.
 
-dataframes = {}
-for country, file_name in files.items():
-    df = pd.read_csv(file_name, skiprows=[1, 2])
-    dataframes[country] = df
+    Countries are checked against the respondent index in `COUNTRIES` order,
+    so the first copy of a respondent is kept whatever order the countries
+    were processed in.
+    """
+    index = RespondentIndex(keys)
+    duplicates = {}
+    reports = []
+    with stage("deduplicate", rule, profile) as timing:
+        for country in COUNTRIES:
+            duplicates[country], report = flag_duplicates(index, key_files[country], country)
+            reports.append(report)
+        timing.rows_in = sum(len(duplicates[c]) for c in COUNTRIES)
+        timing.rows_out = timing.rows_in - sum(int(duplicates[c].sum()) for c in COUNTRIES)
+    exclusions = pd.concat(
+        [add_duplicates(exclusions[c], int(duplicates[c].sum())) for c in COUNTRIES],
+        axis=1
+    )
 
-# ----------------------------
-# Filter previews, incompletes, screened out, failed traps
-# ----------------------------
-for country, df in dataframes.items():
-    df = df[(df['DistributionChannel'] != 'preview') & (df['Finished'] != False)]
-    df = df[(df['screened_out'] != "true")]
-    df = df[(df['screened_out'] != "true_trap1")]
-    df = df[(df['screened_out'] != "true_trap2")]
-    df = df[(df['screened_out'] != "true_trap3")]
-    df = df[(df['Q_TerminateFlag'] != "QuotaMet")]
-    df = df[(df['Q_TerminateFlag'] != "Screened")]
+    offsets = id_offsets(exclusions.loc["kept"])
+    for country in COUNTRIES:
+        with stage(f"assign ids {country}", rule, profile) as timing:
+            assign_ids(filtered[country], outputs[country], offsets[country], chunksize, drop=duplicates[country])
+            timing.rows_in = len(duplicates[country])
+            timing.rows_out = int(exclusions.loc["kept", country])
 
-    if country == "CH":
-        df = df[(df['screened_out'] != "true_region")]
+        write_columnar_copy(country)
 
-    dataframes[country] = df
+    exclusions.index.name = "rule"
+    exclusions.to_csv(out_exclusions)
+    pd.concat(reports, ignore_index=True).to_csv(out_duplicates, index=False)
+    save_cube()
+    save_quality()
 
-# ----------------------------
-# Fix typos
-# ----------------------------
-dataframes["US"]["personal_income"] = dataframes["US"]["personal_income"].replace("15k_35k", "15k_25k")
-dataframes["CH"] = dataframes["CH"].rename(columns={"recent_flights": "flying_recent_number"})
-dataframes["CN"] = dataframes["CN"].rename(columns={"recent_flights": "flying_recent_number"})
 
-# ----------------------------
-# Add response IDs
-# ----------------------------
-id_counter = 1
-for country, df in dataframes.items():
-    df['id'] = range(id_counter, id_counter + len(df))
-    id_counter += len(df)
-    dataframes[country] = df
+def save_cube():
+    """Count the clean respondents of every country by the cube dimensions, one wave per export."""
+    with stage("cube", rule, profile) as timing:
+        cube = None
+        for country in COUNTRIES:
+            # exports named otherwise are labelled by their file name
+            _, wave = export_wave(files[country]) or (country, os.path.splitext(os.path.basename(files[country]))[0])
+            part = DemographicCube.from_cells(country, wave, count_file(outputs[country], cube_dims, chunksize),
+                                              cube_dims)
+            cube = part if cube is None else cube.add(part)
+        cube.save(out_cube)
+        timing.rows_in, timing.rows_out = len(cube), len(cube.cells)
 
-# ----------------------------
-# Save clean data
-# ----------------------------
-dataframes["US"].to_csv(out_us, index=False)
-dataframes["CH"].to_csv(out_ch, index=False)
-dataframes["CN"].to_csv(out_cn, index=False)
\ No newline at end of file
+
+def save_quality():
+    """Score the quality of every clean response into one table keyed by id, for the downstream rules to join."""
+    with stage("quality scores", rule, profile) as timing:
+        quality = quality_table(outputs, speeders)
+        quality.to_csv(out_quality, index=False)
+        timing.rows_in = timing.rows_out = len(quality)
+
+
+def write_columnar_copy(country):
+    """Write the typed copy of one country's clean data for the downstream python steps; the csv stays the export."""
+    if columnar is None:
+        return
+    with stage(f"{columnar} copy {country}", rule, profile) as timing:
+        # categorical answers are read as text, otherwise pandas parses the
+        # screened_out levels "false"/"true" as booleans outside the schema
+        text = {col: "string" for col, dtype in SURVEY_SCHEMA.items() if isinstance(dtype, list)}
+        df, _ = apply_schema(pd.read_csv(outputs[country], dtype=text, low_memory=False))
+        df = to_categorical(df)
+        write_columnar(df, columnar_path(outputs[country], columnar))
+        timing.rows_in = timing.rows_out = len(df)
+
+
+def clean_outputs():
+    """Return the files written by `save_clean`, keyed by a stable name."""
+    named = {c.lower(): outputs[c] for c in COUNTRIES}
+    if columnar is not None:
+        named.update({f"{c.lower()}_columnar": columnar_path(outputs[c], columnar) for c in COUNTRIES})
+    named["exclusions"] = out_exclusions
+    named["duplicates"] = out_duplicates
+    named["cube"] = out_cube
+    named["quality"] = out_quality
+    return named
+
+
+def cached(inputs, named_outputs, run, **extra):
+    """Restore the outputs from the content-addressed cache, or run and cache them.
+
+    A re-downloaded but identical export maps to the same key, so the outputs
+    are reused and keep their mtimes.
+    """
+    if not use_cache:
+        run()
+        return
+    with stage("cache lookup", rule, profile):
+        key = cache_key(inputs, {"rule": rule, **settings, **extra})
+        restored = restore_outputs(key, named_outputs)
+    if restored:
+        print(f"{rule or 'preprocessing'}: inputs unchanged, reusing cached outputs", file=sys.stderr)
+        return
+    run()
+    store_outputs(key, named_outputs)
+
+
+def run_country():
+    """Filter previews, incompletes, screened out, failed traps, fix typos, cast to the schema, and attach add_cost."""
+    with stage(f"preprocess {country}", rule, profile) as timing:
+        counts, issues = preprocess_country(country, file_raw, out_filtered,
+                                            columns, patterns, chunksize, file_lookup,
+                                            key_file=out_keys, keys=keys, fielded=fielded)
+        timing.rows_in, timing.rows_out = int(counts.sum()), int(counts["kept"])
+    report_issues(issues, country)
+    counts.to_frame().to_csv(out_country_ex, index_label="rule")
+
+
+def run_basics():
+    """Assign ids from the per-country results of `preprocess_country`."""
+    exclusions = pd.concat(
+        [pd.read_csv(country_ex[c], index_col="rule")[c] for c in COUNTRIES],
+        axis=1
+    )
+    save_clean(exclusions)
+
+
+def run_waves():
+    """Append the unseen exports to the clean store, then update the clean data as views over it."""
+    with stage("ingest waves", rule, profile) as timing:
+        added, issues = ingest_waves(raw_dir, file_digest, store, columns, patterns, chunksize,
+                                     file_lookup, workers, keys, fielded)
+        timing.rows_in = sum(p["responses"] for p in added)
+        timing.rows_out = sum(p["n"] for p in added)
+    for country, country_issues in issues.items():
+        report_issues(country_issues, country)
+    for p in added:
+        print(f"{p['country']} wave {p['wave']}: {p['responses']} new responses, "
+              f"{p['exclusions']['duplicate']} duplicates, {p['n']} kept", file=sys.stderr)
+
+    manifest = load_manifest(store)
+    for country in COUNTRIES:
+        with stage(f"view {country}", rule, profile):
+            update_view(manifest, country, outputs[country], store)
+        write_columnar_copy(country)
+    save_manifest(manifest, store)
+    store_exclusions(manifest).to_csv(out_exclusions)
+    store_duplicates(manifest, store).to_csv(out_duplicates, index=False)
+    # only partitions without their cells yet are read
+    with stage("cube", rule, profile) as timing:
+        cube = store_cube(manifest, store, cube_dims, chunksize)
+        cube.save(out_cube)
+        timing.rows_in, timing.rows_out = len(cube), len(cube.cells)
+    # percentiles are within a country, so all its waves are scored again
+    save_quality()
+
+
+def run_local():
+    """Process the countries in a process pool, then assign ids."""
+    os.makedirs("data/interim", exist_ok=True)
+    # cpu time and bytes of the pool workers are not counted, only wall time
+    with stage("preprocess countries", rule, profile) as timing, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            c: pool.submit(preprocess_country, c, files[c], filtered[c],
+                           columns, patterns, chunksize, file_lookup, key_file=key_files[c], keys=keys,
+                           fielded=fielded)
+            for c in COUNTRIES
+        }
+        results = {c: futures[c].result() for c in COUNTRIES}
+        timing.rows_in = sum(int(results[c][0].sum()) for c in COUNTRIES)
+        timing.rows_out = sum(int(results[c][0]["kept"]) for c in COUNTRIES)
+    for country, (_, issues) in results.items():
+        report_issues(issues, country)
+    exclusions = pd.concat([results[c][0] for c in COUNTRIES], axis=1)
+    save_clean(exclusions)
+
+    for country in COUNTRIES:
+        os.remove(filtered[country])
+        os.remove(key_files[country])
+
+
+if __name__ == "__main__":
+    if rule == "preprocess_country":
+        cached([file_raw, file_lookup], {"filtered": out_filtered, "exclusions": out_country_ex, "keys": out_keys},
+               run_country, country=country)
+    elif waves:
+        # the store is incremental by itself, the output cache is not needed
+        run_waves()
+    elif rule is not None:
+        inputs = [filtered[c] for c in COUNTRIES] + [country_ex[c] for c in COUNTRIES] + [key_files[c] for c in COUNTRIES]
+        cached(inputs, clean_outputs(), run_basics)
+    else:
+        cached([files[c] for c in COUNTRIES] + [file_lookup], clean_outputs(), run_local)
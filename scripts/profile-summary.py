@@ -0,0 +1,41 @@
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.profiling import PROFILE_LOG, RULE_LOG, profile_summary, read_log
+
+# rank the snakemake rules and the profiled stages of the python and R scripts
+# by their cost in the latest run, next to their median over earlier runs
+#
+#   python scripts/profile-summary.py --top 20
+#   python scripts/profile-summary.py --check   # exit 1 on a regression
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank pipeline rules and stages by cost across runs.")
+    parser.add_argument("--stages", default=PROFILE_LOG, help="stage log of the scripts")
+    parser.add_argument("--rules", default=RULE_LOG, help="benchmark log of the snakemake rules")
+    parser.add_argument("--top", type=int, help="only show the most expensive entries")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="flag entries slower than this multiple of their earlier median")
+    parser.add_argument("--min-seconds", type=float, default=1.0,
+                        help="do not flag entries faster than this")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 when a regression is flagged")
+    parser.add_argument("--out", help="also write the summary to this csv")
+    args = parser.parse_args()
+
+    records = read_log(args.rules) + read_log(args.stages)
+    if not records:
+        sys.exit(f"no profile records in {args.rules} or {args.stages}, run the pipeline first")
+    summary = profile_summary(records, args.threshold, args.min_seconds)
+    if args.out:
+        summary.to_csv(args.out, index=False)
+    shown = summary.head(args.top) if args.top else summary
+    print(shown.to_string(index=False))
+
+    regressions = summary[summary["regression"]]
+    for row in regressions.itertuples(index=False):
+        print(f"{row.rule} / {row.stage}: {row.wall_s:.1f}s, {row.change}x its median of {row.baseline_s:.1f}s",
+              file=sys.stderr)
+    if args.check and len(regressions):
+        sys.exit(1)
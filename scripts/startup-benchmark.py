@@ -0,0 +1,36 @@
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.getcwd(), "scripts"))
+from functions.startup import STARTUP_SCRIPTS, startup_table
+
+# time how long each python script takes to start, i.e. to import its
+# dependencies and run its module-level code, in a fresh interpreter, with
+# its most expensive imports; run from the repo root
+#
+#   python scripts/startup-benchmark.py
+#   python scripts/startup-benchmark.py --max-seconds 1.0   # exit 1 above this
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the import cost of the python pipeline scripts.")
+    parser.add_argument("scripts", nargs="*", default=STARTUP_SCRIPTS, help="scripts to time, all by default")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per script, the median is reported")
+    parser.add_argument("--top", type=int, default=3, help="heaviest imports listed per script")
+    parser.add_argument("--max-seconds", type=float,
+                        help="exit with status 1 when a script takes longer than this to import")
+    parser.add_argument("--out", help="also write the table to this csv")
+    args = parser.parse_args()
+
+    table = startup_table(args.scripts, os.getcwd(), args.repeat, args.top)
+    print(table.round(3).to_string(index=False))
+    if args.out:
+        table.to_csv(args.out, index=False)
+
+    failed = table[table["status"] != "ok"]
+    for row in failed.itertuples(index=False):
+        print(f"{row.script} could not be imported: {row.error}", file=sys.stderr)
+    if args.max_seconds is not None and (table["import_s"] > args.max_seconds).any():
+        sys.exit(1)
+    if len(failed):
+        sys.exit(1)